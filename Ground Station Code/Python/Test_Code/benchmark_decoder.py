@@ -0,0 +1,137 @@
+####################################################################################
+#       Author: Nicolas Blanchard | nickyblanch@arizona.edu | (520) 834-3191
+#      Purpose: Compare the throughput of the FastMavlinkDecoder in triple.py with
+#               pymavlink's own decoding (what recv_match does for every packet).
+# Dependencies: pymavlink, triple.py
+#        Usage: python "Ground Station Code/Python/Test_Code/benchmark_decoder.py"
+####################################################################################
+# Libraries
+####################################################################################
+
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pymavlink import mavutil
+import triple
+
+
+####################################################################################
+# Global variables
+####################################################################################
+
+
+PACKETS = 20000             # Packets decoded per in-memory run
+UDP_BATCH = 500             # Packets sent per loopback batch (must fit in the socket buffer)
+UDP_BATCHES = 20            # Loopback batches per run
+UDP_PORT = 14650            # Loopback port used for the recv_match comparison
+
+
+####################################################################################
+# Function definitions
+####################################################################################
+
+
+def make_packets(count):
+
+    ################################################
+    # count: number of packets to build [input]
+    # packets: list of encoded LOCAL_POSITION_NED
+    #          datagrams [output]
+    ################################################
+
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    packets = []
+    for i in range(count):
+        msg = mavutil.mavlink.MAVLink_local_position_ned_message(i, i * 0.01, 1.0, -1.0, 0.1, 0.2, 0.3)
+        packets.append(bytes(msg.pack(mav)))
+    return packets
+
+
+def benchmark_in_memory(packets):
+
+    ################################################
+    # packets: list of datagrams [input]
+    ################################################
+
+    # pymavlink: parse and build a full message object per packet
+    connection = mavutil.mavlink_connection('udpin:127.0.0.1:' + str(UDP_PORT + 1))
+    start = time.perf_counter()
+    for data in packets:
+        for msg in connection.mav.parse_buffer(data) or []:
+            x = msg.x
+    pymavlink_rate = len(packets) / (time.perf_counter() - start)
+    connection.close()
+
+    # Fast path: header + CRC check, unpack into a preallocated record
+    decoder = triple.FastMavlinkDecoder()
+    start = time.perf_counter()
+    for data in packets:
+        for msg in decoder.decode(1, data, None):
+            x = msg.x
+    fast_rate = len(packets) / (time.perf_counter() - start)
+
+    print(f"In-memory decode   pymavlink: {pymavlink_rate:10.0f} msg/s   fast: {fast_rate:10.0f} msg/s   ({fast_rate / pymavlink_rate:.1f}x)")
+
+
+def benchmark_udp(packets):
+
+    ################################################
+    # packets: list of datagrams [input]
+    ################################################
+
+    sender = mavutil.mavlink_connection('udpout:127.0.0.1:' + str(UDP_PORT))
+    listener = mavutil.mavlink_connection('udpin:127.0.0.1:' + str(UDP_PORT))
+    decoder = triple.FastMavlinkDecoder()
+    batch = packets[:UDP_BATCH]
+
+    # recv_match, as the original telemetry thread used it
+    elapsed = 0.0
+    received = 0
+    for _ in range(UDP_BATCHES):
+        for data in batch:
+            sender.write(data)
+        start = time.perf_counter()
+        while True:
+            msg = listener.recv_match(type='LOCAL_POSITION_NED', blocking=False)
+            if msg is None:
+                break
+            received += 1
+        elapsed += time.perf_counter() - start
+    recv_match_rate = received / elapsed
+
+    # Fast path, as TelemetryReceiver.drain_fast reads it
+    elapsed = 0.0
+    received = 0
+    for _ in range(UDP_BATCHES):
+        for data in batch:
+            sender.write(data)
+        start = time.perf_counter()
+        while True:
+            data = listener.recv()
+            if not data:
+                break
+            received += len(decoder.decode(1, data, listener))
+        elapsed += time.perf_counter() - start
+    fast_rate = received / elapsed
+
+    sender.close()
+    listener.close()
+
+    print(f"UDP loopback  recv_match:     {recv_match_rate:10.0f} msg/s   fast: {fast_rate:10.0f} msg/s   ({fast_rate / recv_match_rate:.1f}x)")
+
+
+def main():
+    packets = make_packets(PACKETS)
+    benchmark_in_memory(packets)
+    benchmark_udp(packets)
+
+
+####################################################################################
+
+
+if __name__ == "__main__":
+    main()
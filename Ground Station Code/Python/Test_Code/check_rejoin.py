@@ -0,0 +1,109 @@
+####################################################################################
+#       Author: Nicolas Blanchard | nickyblanch@arizona.edu | (520) 834-3191
+#      Purpose: Check that followers far from their breadcrumb rejoin the path
+#               without skipping ahead along it (stop-at-breadcrumb mode).
+# Dependencies: numpy, pymavlink, triple.py
+#        Usage: python "Ground Station Code/Python/Test_Code/check_rejoin.py"
+####################################################################################
+# Libraries
+####################################################################################
+
+
+import contextlib
+import io
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import triple
+
+
+####################################################################################
+# Global variables
+####################################################################################
+
+
+TICKS = 40                  # Flight loop iterations per case
+
+
+####################################################################################
+# Function definitions
+####################################################################################
+
+
+def run(path, position):
+
+    ################################################
+    # path: np.array (k, 3), leader breadcrumbs [input]
+    # position: (x, y, z), follower position, held
+    #           still for every tick [input]
+    # cursors: list of the follower's cursor after
+    #          every tick [output]
+    # targets: np.array (TICKS, 3), the follower's
+    #          target after every tick [output]
+    ################################################
+
+    triple.fleet = triple.Fleet([("Leader", "0.0.0.0", 0), ("Follower", "0.0.0.0", 0)])
+    triple.state = triple.DroneState(2)
+    triple.waypoints = triple.BreadcrumbBuffer([2])
+    triple.TRAIN_SPACING = (0, 'waypoints')
+    triple.PURE_PURSUIT = 0
+    triple.HISTORY_FOLLOW = 0
+    for point in path:
+        triple.waypoints.append(tuple(point))
+
+    cursors = []
+    targets = []
+    for tick in range(TICKS):
+        triple.state.set_position(2, *position, 0, 0, 0, tick * 100, 1.0 + tick * 0.1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            triple.follow_train(triple.state.snapshot())
+        cursors.append(triple.waypoints.cursor(2))
+        targets.append(triple.state.get(2)[triple.TARGET_X:triple.TARGET_Z + 1].copy())
+
+    return cursors, np.array(targets)
+
+
+def check(name, passed, detail):
+
+    ################################################
+    # name: string, case name [input]
+    # passed: bool [input]
+    # detail: string printed with the result [input]
+    ################################################
+
+    print(("PASS" if passed else "FAIL") + "  " + name + ": " + detail)
+    return passed
+
+
+def main():
+    results = []
+
+    # Resting 2 m behind the first breadcrumb of a straight path: keep heading for breadcrumb 0
+    straight = np.array([(i * triple.BREADCRUMB_SPACING, 0.0, -1.0) for i in range(30)])
+    cursors, targets = run(straight, (-2.0, 0.0, -1.0))
+    results.append(check("behind the path", max(cursors) == 0 and np.allclose(targets[-1], straight[0]),
+                         "cursor " + str(cursors[-1]) + ", target " + str(targets[-1].tolist())))
+
+    # Sitting on the first breadcrumb of an L-shaped path whose breadcrumbs are further
+    # apart than REJOIN_DISTANCE (SIMPLIFY_PATH): step to breadcrumb 1, never cut the corner
+    corner = np.array([(x, 0.0, -1.0) for x in range(0, 12, 2)] + [(10.0, y, -1.0) for y in range(2, 16, 2)])
+    cursors, targets = run(corner, tuple(corner[0]))
+    results.append(check("L-shaped path", max(cursors) <= 1 and all(target[1] == 0 for target in targets),
+                         "cursor " + str(cursors[-1]) + " of " + str(len(corner)) + ", target " + str(targets[-1].tolist())))
+
+    # Beside the middle of a later segment: rejoin there and fly to its end
+    cursors, targets = run(corner, (5.0, 0.5, -1.0))
+    results.append(check("beside a later segment", cursors[-1] == 3 and np.allclose(targets[-1], corner[3]),
+                         "cursor " + str(cursors[-1]) + ", target " + str(targets[-1].tolist())))
+
+    sys.exit(0 if all(results) else 1)
+
+
+####################################################################################
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+####################################################################################
+#       Author: Nicolas Blanchard | nickyblanch@arizona.edu | (520) 834-3191
+#      Purpose: Replay recorded leader waypoints through triple.py's train logic
+#               and compare how long a simulated follower takes to fly the path
+#               when it stops at every breadcrumb versus pure pursuit.
+# Dependencies: numpy, pymavlink, triple.py
+#        Usage: python "Ground Station Code/Python/Test_Code/simulate_following.py" [waypoints.csv ...]
+####################################################################################
+# Libraries
+####################################################################################
+
+
+import contextlib
+import glob
+import io
+import os
+import sys
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import triple
+
+
+####################################################################################
+# Global variables
+####################################################################################
+
+
+RECORDED = os.path.join(HERE, "..", "..", "..", "Exports", "Recorded Data For Paper", "Leader_Follower_*", "waypoints*.csv")
+
+DT = 0.05                   # Simulation step (s); one flight loop iteration per step
+POSITION_GAIN = 0.95        # Follower position controller gain (1/s), as PX4's MPC_XY_P
+MAX_SPEED = 0.5             # Follower speed limit (m/s)
+MAX_ACCEL = 1.0             # Follower acceleration limit (m/s^2)
+TIME_LIMIT = 600            # Give up after this many simulated seconds
+START = 1.0                 # Receive time (s) of the first simulated position
+
+
+####################################################################################
+# Function definitions
+####################################################################################
+
+
+def fly(path, pure_pursuit):
+
+    ################################################
+    # path: np.array (k, 3), leader breadcrumbs [input]
+    # pure_pursuit: 0 or 1, triple.PURE_PURSUIT [input]
+    # time: float, seconds until the follower is within
+    #       WAYPOINT_RADIUS of the last breadcrumb [output]
+    ################################################
+
+    # One leader and one follower; the whole leader path is already known
+    triple.fleet = triple.Fleet([("Leader", "0.0.0.0", 0), ("Follower", "0.0.0.0", 0)])
+    triple.state = triple.DroneState(2)
+    triple.waypoints = triple.BreadcrumbBuffer([2])
+    triple.TRAIN_SPACING = (0, 'waypoints')
+    triple.PURE_PURSUIT = pure_pursuit
+    for point in path:
+        triple.waypoints.append(tuple(point))
+
+    position = path[0].copy()
+    velocity = np.zeros(3)
+    # Positions carry receive times so follow_train treats them as live telemetry (and may rejoin)
+    triple.state.set_position(2, *position, 0, 0, 0, 0, START)
+    triple.state.set_target(2, *position)
+
+    t = 0.0
+    while t < TIME_LIMIT:
+        with contextlib.redirect_stdout(io.StringIO()):
+            triple.follow_train(triple.state.snapshot())
+        target = triple.state.get(2)[triple.TARGET_X:triple.TARGET_Z + 1]
+
+        # Point-mass follower under a P position controller with speed and acceleration limits
+        wanted = POSITION_GAIN * (target - position)
+        speed = np.linalg.norm(wanted)
+        if speed > MAX_SPEED:
+            wanted *= MAX_SPEED / speed
+        change = wanted - velocity
+        limit = MAX_ACCEL * DT
+        if np.linalg.norm(change) > limit:
+            change *= limit / np.linalg.norm(change)
+        velocity += change
+        position += velocity * DT
+        t += DT
+        triple.state.set_position(2, *position, *velocity, t * 1000, START + t)
+        if np.linalg.norm(position - path[-1]) < triple.WAYPOINT_RADIUS:
+            return t
+
+    return float('inf')
+
+
+def main():
+    files = sys.argv[1:] or sorted(glob.glob(RECORDED))
+
+    for file_name in files:
+        path = np.loadtxt(file_name, delimiter=',', ndmin=2)[:, 0:3]
+        waypoint_time = fly(path, 0)
+        pursuit_time = fly(path, 1)
+        print(f"{os.path.basename(file_name):50s} {len(path):3d} waypoints   stop-at-waypoint: {waypoint_time:6.1f} s   pure pursuit: {pursuit_time:6.1f} s")
+
+
+####################################################################################
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+###################################################################################################
+# Author: Nicolas Blanchard
+#         Contact: nickyblanch@arizona.edu | (520) 834-3191
+#         Purpose: Compact binary flight-log format for the cave drone ground station.
+#    Introduction: triple.py can record telemetry as fixed-size float64 records instead of CSV
+#                  text. A log file is an 8 byte magic string, a 4 byte little-endian header
+#                  length, a JSON header (padded to a multiple of 8 bytes) describing the
+#                  drones and record fields, and then one record per sample. The first field of
+#                  every record is 't', monotonic seconds since the log was created.
+#
+#                  Because records are fixed-size, a log can be read back as a zero-copy NumPy
+#                  structured array with read_flight_log(). Existing Recorded_Telemetry CSVs can
+#                  be converted with convert_csv().
+#    Dependencies: numpy, json, struct, os, sys
+#
+# Usage:
+#
+# python flight_log.py convert <coordinates|waypoints>.csv <output>.bin
+# python flight_log.py info <log>.bin
+#
+###################################################################################################
+
+
+import json
+import os
+import struct
+import sys
+import numpy as np
+
+
+###################################################################################################
+
+
+MAGIC = b'CAVELOG1'         # First 8 bytes of every binary flight log
+VERSION = 1                 # Header format version
+
+COORDINATE_FIELDS = ['x', 'y', 'z', 'vx', 'vy', 'vz']
+WAYPOINT_FIELDS = ['x', 'y', 'z']
+
+
+###################################################################################################
+
+
+def record_fields(drones, fields):
+
+    ################################################
+    # drones: list of drone numbers [input]
+    # fields: list of per-drone field names [input]
+    # names: list of record field names [output]
+    ################################################
+
+    names = ['t']
+    for number in drones:
+        names += [field + '_' + str(number) for field in fields]
+    return names
+
+
+def header_bytes(kind, drones, fields, created=""):
+
+    ################################################
+    # kind: string, 'coordinates' or 'waypoints' [input]
+    # drones: list of drone numbers [input]
+    # fields: list of per-drone field names [input]
+    # created: string, wall-clock creation time [input]
+    # header: bytes to write at the start of the file [output]
+    ################################################
+
+    header = {
+        'version': VERSION,
+        'kind': kind,
+        'drones': list(drones),
+        'fields': record_fields(drones, fields),
+        'dtype': '<f8',
+        'created': created,
+    }
+    text = json.dumps(header).encode()
+
+    # Pad so that records start 8-byte aligned
+    length = len(MAGIC) + 4 + len(text)
+    text += b' ' * (-length % 8)
+
+    return MAGIC + struct.pack('<I', len(text)) + text
+
+
+def record_struct(field_count):
+
+    ################################################
+    # field_count: number of fields in a record [input]
+    # packer: struct.Struct for one record [output]
+    ################################################
+
+    return struct.Struct('<' + str(field_count) + 'd')
+
+
+def read_header(path):
+
+    ################################################
+    # path: string, binary log file [input]
+    # header: dict, decoded JSON header [output]
+    # offset: int, byte offset of the first record [output]
+    ################################################
+
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(path + " is not a binary flight log")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length).decode())
+
+    return header, len(MAGIC) + 4 + length
+
+
+def read_flight_log(path):
+
+    ################################################
+    # path: string, binary log file [input]
+    # header: dict, decoded JSON header [output]
+    # records: np.memmap structured array, one entry
+    #          per record, fields named as in the
+    #          header (e.g. records['x_1']) [output]
+    ################################################
+
+    header, offset = read_header(path)
+    dtype = np.dtype([(name, header['dtype']) for name in header['fields']])
+
+    # A partially written final record (e.g. after a crash) is ignored
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        count = (f.tell() - offset) // dtype.itemsize
+
+    if count == 0:
+        return header, np.zeros(0, dtype=dtype)
+
+    return header, np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+
+def convert_csv(csv_path, out_path, kind=None):
+
+    ################################################
+    # csv_path: string, Recorded_Telemetry CSV [input]
+    # out_path: string, binary log to create [input]
+    # kind: 'coordinates' or 'waypoints'; guessed from
+    #       the file name if None [input]
+    # count: int, number of records written [output]
+    #
+    # The CSVs carry no timing, so 't' is NaN.
+    ################################################
+
+    if kind is None:
+        kind = 'waypoints' if 'waypoints' in os.path.basename(csv_path) else 'coordinates'
+
+    rows = np.loadtxt(csv_path, delimiter=',', ndmin=2)
+
+    if kind == 'waypoints':
+        # x, y, z of the leader
+        drones = [1]
+        fields = WAYPOINT_FIELDS
+        columns = rows[:, 0:3]
+    else:
+        # x1, y1, z1, x2, y2, z2, vx1, vy1, vz1, vx2, vy2, vz2
+        # (older logs stop after z2 and have no velocities)
+        drones = [1, 2]
+        fields = COORDINATE_FIELDS
+        if rows.shape[1] < 12:
+            rows = np.hstack((rows[:, 0:6], np.full((len(rows), 6), np.nan)))
+        columns = np.hstack((rows[:, 0:3], rows[:, 6:9], rows[:, 3:6], rows[:, 9:12]))
+
+    records = np.empty((len(rows), columns.shape[1] + 1), dtype='<f8')
+    records[:, 0] = np.nan
+    records[:, 1:] = columns
+
+    with open(out_path, 'wb') as f:
+        f.write(header_bytes(kind, drones, fields, created="converted from " + csv_path))
+        f.write(records.tobytes())
+
+    return len(records)
+
+
+###################################################################################################
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == 'convert':
+        count = convert_csv(sys.argv[2], sys.argv[3])
+        print("Wrote " + str(count) + " records to " + sys.argv[3])
+    elif len(sys.argv) == 3 and sys.argv[1] == 'info':
+        header, records = read_flight_log(sys.argv[2])
+        print(json.dumps(header, indent=2))
+        print(str(len(records)) + " records")
+    else:
+        print("Usage: python flight_log.py convert <file>.csv <file>.bin")
+        print("       python flight_log.py info <file>.bin")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@
 #                  stack. It is specifically tailored to test custom code, GPS-denied
 #                  navigation, and 'train' (swarm) operation. Created as a part of my MS
 #                  thesis in Electrical & Computer Engineering at the University of Arizona.
-#    Dependencies: pymavlink, time, threading, os, tkinter
+#    Dependencies: pymavlink, numpy, time, threading, collections, concurrent.futures, selectors, heapq, struct, queue, os,
+#                  tkinter, flight_log.py
 # Reproducibility: Tested to work on Windows 11 and Ubunutu 22.xx as of 9/25/2023. Please install
 #                  the pymavlink and tkinter libraries before proceeding.
 #
@@ -50,8 +51,17 @@
 
 
 from pymavlink import mavutil
+from pymavlink.generator.mavcrc import x25crc
 import time
 import threading
+import selectors
+import heapq
+import struct
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+import flight_log
+import numpy as np
 import os
 import tkinter as tk
 from tkinter import ttk
@@ -79,56 +89,170 @@ SEND_TELEMETRY = 1          # 1 = send telemtry
 LAND = 0                    # 1 = landing
                             # 0 = normal operation
 
-TARGET_X_1 = 0              # target x coordinate
-TARGET_Y_1 = 0              # target y coordinate
-TARGET_Z_1 = -1             # target z coordinate
-TARGET_X_2 = 0              # target x coordinate
-TARGET_Y_2 = 0              # target y coordinate
-TARGET_Z_2 = -1             # target z coordinate
-TARGET_X_3 = 0              # target x coordinate
-TARGET_Y_3 = 0              # target y coordinate
-TARGET_Z_3 = -1             # target z coordinate
-
-CURRENT_X_1 = 0             # current x coordinate
-CURRENT_Y_1 = 0             # current y coordinate
-CURRENT_Z_1 = 0             # current z coordinate
-CURRENT_X_2 = 0             # current x coordinate
-CURRENT_Y_2 = 0             # current y coordinate
-CURRENT_Z_2 = 0             # current z coordinate
-CURRENT_X_3 = 0             # current x coordinate
-CURRENT_Y_3 = 0             # current y coordinate
-CURRENT_Z_3 = 0             # current z coordinate
-CURRENT_VELOCITY_X_1 = 0    # current x velocity drone 1-Amber Added 2/4/2023
-CURRENT_VELOCITY_Y_1 = 0    # current x velocity drone 2-Amber Added 2/4/2023
-CURRENT_VELOCITY_Z_1 = 0    # current x velocity drone 3-Amber Added 2/4/2023 
-CURRENT_VELOCITY_X_2 = 0    # current x velocity drone 1-Amber Added 2/4/2023
-CURRENT_VELOCITY_Y_2 = 0    # current x velocity drone 2-Amber Added 2/4/2023
-CURRENT_VELOCITY_Z_2 = 0    # current x velocity drone 3-Amber Added 2/4/2023 
+state = 0                   # Current and target state of every drone (see DroneState)
+
+# Columns of a DroneState row
+X = 0                       # current x coordinate
+Y = 1                       # current y coordinate
+Z = 2                       # current z coordinate
+VX = 3                      # current x velocity
+VY = 4                      # current y velocity
+VZ = 5                      # current z velocity
+TIME_BOOT_MS = 6            # autopilot time of the current position
+RECEIVED = 7                # time.monotonic() when the current position arrived
+TARGET_X = 8                # target x coordinate
+TARGET_Y = 9                # target y coordinate
+TARGET_Z = 10               # target z coordinate
+TARGET_YAW = 11             # target yaw
+TARGET_VX = 12              # target x velocity feed-forward (NaN = not sent)
+TARGET_VY = 13              # target y velocity feed-forward
+TARGET_VZ = 14              # target z velocity feed-forward
+TARGET_AX = 15              # target x acceleration feed-forward (NaN = not sent)
+TARGET_AY = 16              # target y acceleration feed-forward
+TARGET_AZ = 17              # target z acceleration feed-forward
+STATE_FIELDS = 18           # Number of columns
+DEFAULT_TARGET_Z = -1       # Target z coordinate before any target is set
+
 PREV_LEADER_X = 0           # Previous leader waypoint (x)
 PREV_LEADER_Y = 0           # Previous leader waypoint (y)
 PREV_LEADER_Z = 0           # Previous leader waypoint (z)
-waypoints = []              # List of waypoints for follower; acts as FIFO
-
-drone_1_IP = "0.0.0.0"      # IP address of Drone 1
-drone_2_IP = "0.0.0.0"      # IP address of Drone 2
-drone_3_IP = "0.0.0.0"      # IP address of Drone 3
-drone_1_UDP = 14548         # UDP port of Drone 1
-drone_2_UDP = 14550         # UDP port of Drone 2
-drone_3_UDP = 14549         # UDP port of Drone 3
-
-window_width = 1125         # Width of GUI window
-window_height = 450         # Length of GUI window
-
-drone1 = 0                  # Drone 1 variable
-drone2 = 0                  # Drone 2 variable
-drone3 = 0                  # Drone 2 variable
+waypoints = 0               # Leader breadcrumbs shared by the followers (see BreadcrumbBuffer)
+BREADCRUMB_LIMIT = 100000   # Max breadcrumbs kept; the oldest are dropped beyond this
+BREADCRUMB_SPACING = .35    # Distance (m) the leader travels between breadcrumbs
+SIMPLIFY_PATH = 0           # 1 = drop a breadcrumb only where the leader's path bends (see PathSimplifier)
+                            # 0 = drop a breadcrumb every BREADCRUMB_SPACING
+SIMPLIFY_TOLERANCE = .1     # Max distance (m) the path may stray from the straight line between breadcrumbs
+SIMPLIFY_MAX_SPACING = 2.0  # Max distance (m) between breadcrumbs on straight paths
+SIMPLIFY_SETTLE = 1.0       # Time (s) the leader must hover before its position becomes a breadcrumb
+simplifier = 0              # Online leader path simplifier (see PathSimplifier)
+WAYPOINT_RADIUS = .15       # Distance (m) at which a follower has reached its breadcrumb
+TRAIN_SPACING = (7, 'waypoints')    # Gap each follower keeps to the drone ahead of it: (value, 'waypoints', 'm' or 's')
+                                    # ('s' only with HISTORY_FOLLOW)
+FOLLOWER_SPACING = {}       # Per-follower overrides of TRAIN_SPACING, e.g. {3: (2.5, 'm')}
+PURE_PURSUIT = 0            # 1 = followers chase a point LOOKAHEAD metres ahead of them on the path
+                            # 0 = followers stop at every breadcrumb (WAYPOINT_RADIUS)
+LOOKAHEAD = 0.7             # Lookahead distance (m) along the path (PURE_PURSUIT only)
+PURSUIT_WINDOW = 20         # Path segments past a follower's cursor searched for its closest point
+GRID_CELL = 1.0             # Cell size (m) of the spatial index over the breadcrumbs (see SegmentGrid)
+
+missions = 0                # DEMO mode mission runner (see MissionEngine)
+MISSION_FILE = "Ground Station Code/Python/Missions/demo.txt"  # Mission run in DEMO mode (relative to the working directory)
+MISSION_TOLERANCE = .15     # Distance (m) at which a mission goto, land or takeoff is done
+MISSION_TIMEOUT = 30        # Time (s) after which an unfinished mission step is abandoned
+
+separation = 0              # Inter-drone separation monitor (see SeparationMonitor)
+SEPARATION_RADIUS = 1.0     # Drones closer than this (m) are too close
+SEPARATION_BACKOFF = 1      # 1 = the trailing drone backs off to SEPARATION_RADIUS
+                            # 0 = the trailing drone holds where it is
+SEPARATION_GROUND = 0.3     # Drones lower than this (m), or disarmed, are never pushed away
+SEPARATION_HASH_SIZE = 64   # Fleets larger than this are checked with a spatial hash instead of all pairs
+REJOIN_DISTANCE = 1.5       # A follower this far (m) from its breadcrumb rejoins the path at the closest point
+HISTORY_FOLLOW = 0          # 1 = followers target the leader's interpolated past position (see LeaderHistory)
+                            # 0 = followers use the breadcrumbs
+HISTORY_LENGTH = 6000       # Leader samples kept for HISTORY_FOLLOW (5 minutes at 20 Hz)
+PATH_RESOLUTION = .05       # Leader movement (m) below which hovering noise isn't counted as path length
+leader_history = 0          # Timestamped leader positions (see LeaderHistory)
+FEED_FORWARD = 0            # 0 = position-only setpoints
+                            # 1 = followers also get velocity and acceleration along the breadcrumb path
+                            # 2 = followers also get the leader's current velocity
+
+DRONES = [                  # Fleet: (GUI name, default IP, default UDP port). Drone 1 is the leader;
+    ("Leader Drone", "0.0.0.0", 14548),         # add a line here to add a follower.
+    ("Follower Drone 1", "0.0.0.0", 14550),
+    ("Follower Drone 2", "0.0.0.0", 14549),
+]
+fleet = 0                   # Drone registry (see Fleet)
+FLEET_WORKERS = 8           # Worker threads for per-drone jobs that wait (at least one per drone)
+
+HEARTBEAT_TIMEOUT = 10      # Max time (s) to wait for a drone's first heartbeat
+POSITION_TIMEOUT = 5        # Max time (s) to wait for a drone's first LOCAL_POSITION_NED
+CONNECT_ATTEMPTS = 3        # Connection attempts per drone before giving up
+CONNECT_BACKOFF = 1.0       # Wait (s) before the first retry; doubles after every failed attempt
+connection_status = queue.Queue()   # (drone number, status text) from connection workers to the GUI
+
+column_width = 375          # Width of each drone's GUI column
+visible_columns = 3         # Drone columns shown before the GUI scrolls sideways
+window_height = 560         # Length of GUI window
+
+router = 0                  # MAVLink message router (see MavlinkRouter)
+receiver = 0                # Telemetry receiver for all drones (see TelemetryReceiver)
+RECEIVER_TIMEOUT = 0.1      # Max time (s) the receiver waits on the sockets before re-checking
+RATE_WINDOW = 2.0           # Window (s) over which per-drone update rates are measured
+LINK_WINDOW = 5.0           # Window (s) over which per-link loss, message rates and throughput are measured
+LINK_BUCKETS = 10           # Buckets per LINK_WINDOW (each rolling counter keeps only this many values)
+LINK_REORDER = 128          # Sequence gaps this large are late or duplicate packets, not loss...
+LINK_DROPOUT = 0.5          # ...unless the link was silent this long (s) before them
+LINK_RESYNC = 3             # ...or this many packets in a row have such a gap (a dropout of LINK_REORDER or more)
+TAKEOFF_TIMEOUT = 1.0       # Max time (s) takeoff waits for a fresh position before using the last one
+watchdog = 0                # Stale-telemetry failsafe (see TelemetryWatchdog)
+WATCHDOG_INTERVAL = 0.1     # Time (s) between watchdog checks
+STALE_LIMITS = {            # Age (s) of a stream at which the watchdog warns, holds and lands the drone
+    'LOCAL_POSITION_NED': (0.5, 1.0, 5.0),
+    'HEARTBEAT': (3.0, 5.0, 10.0),
+}
+commands = 0                # Outstanding MAVLink commands awaiting COMMAND_ACK (see CommandTracker)
+COMMAND_TIMEOUT = 1.0       # Time (s) to wait for a COMMAND_ACK before sending a command again
+COMMAND_RETRIES = 3         # Times a command is re-sent before it times out
+target_monitor = 0          # Matches echoed POSITION_TARGET_LOCAL_NED to sent setpoints (see TargetMonitor)
+TARGET_MATCH = .01          # Max difference (m) between an echoed target and the setpoint it echoes
+TARGET_HISTORY = 200        # Distinct setpoints remembered per drone while waiting for their echo
+TARGET_OBSERVE = 1.0        # A setpoint held this long (s) must be echoed, or it counts as dropped
+                            # (keep above the slowest POSITION_TARGET_LOCAL_NED interval, see STREAM_MIN)
+LATENCY_BINS = (0.025, 0.05, 0.1, 0.2, 0.5, 1.0)   # Upper edges (s) of the setpoint latency histogram
+DROP_BINS = (0.01, 0.05, 0.1, 0.25, 0.5)           # Upper edges of the per-RATE_WINDOW drop rate histogram
+DIVERGENCE_LIMIT = 0.5      # Distance (m) between the autopilot's and our target that counts as diverged
+DIVERGENCE_TIME = 1.0       # Time (s) the targets must stay diverged before the drone is flagged
+stream_control = 0          # Per-drone telemetry stream rates (see StreamRateController)
+STREAM_RATES = {            # (LOCAL_POSITION_NED, POSITION_TARGET_LOCAL_NED) rates (Hz) per flight mode,
+    0: ((10, 5), (10, 5)),  # for the leader and for the followers
+    1: ((10, 5), (10, 5)),
+    2: ((20, 5), (10, 5)),
+    3: ((10, 5), (10, 5)),
+    4: ((4, 2), (4, 2)),
+}
+STREAM_IDLE = (4, 2)        # Rates (Hz) for drones that are not armed
+STREAM_MIN = (4, 2)         # Rates (Hz) the loss back-off never goes below (position must beat STALE_LIMITS)
+STREAM_INTERVAL = 0.5       # Time (s) between stream rate checks
+STREAM_LOSS_HIGH = .1       # Link loss above which a drone's rates are halved (at most once per LINK_WINDOW)
+STREAM_LOSS_LOW = .02       # Link loss below which they recover by STREAM_RECOVERY per LINK_WINDOW
+STREAM_RECOVERY = .1        # Fraction of the flight mode's rates regained per quiet LINK_WINDOW
+STREAM_RETRY = 5.0          # Time (s) before a rejected or unacknowledged rate change is tried again
+FAST_DECODE = 0             # 1 = decode the messages we consume straight from the datagram (see FastMavlinkDecoder)
+                            # 0 = let pymavlink decode every message
+
+scheduler = 0               # Setpoint scheduler for all drones (see SetpointScheduler)
+SETPOINT_RATE = 20          # Rate (Hz) at which target setpoints are sent to each drone
+SETPOINT_RATES = {}         # Per-drone overrides of SETPOINT_RATE, e.g. {2: 50}
+OFFBOARD_MIN_RATE = 2       # PX4 leaves offboard mode if setpoints arrive slower than this (Hz)
+
+estimator = 0               # Per-drone position/velocity Kalman filters (see StateEstimator)
+PREDICT = 0                 # 1 = the flight loop acts on positions predicted to setpoint-send time
+                            # 0 = the flight loop acts on the last received positions
+LINK_LATENCY = 0.03         # Delay (s) of the fastest-delivered position (WiFi + MAVProxy), added to predictions
+ACCEL_NOISE = 2.0           # Kalman process noise: unmodelled acceleration ((m/s^2)^2 per Hz)
+POSITION_NOISE = .05        # Kalman measurement noise: LOCAL_POSITION_NED position (m, 1 sigma)
+VELOCITY_NOISE = .1         # Kalman measurement noise: LOCAL_POSITION_NED velocity (m/s, 1 sigma)
+
+flight_clock = 0            # Wakes the flight loop on new telemetry (see FlightClock)
+FLIGHT_TICK = 0.1           # Max time (s) the flight loop waits for new telemetry before running anyway
+                            # (None = run only when new telemetry arrives)
 
 coordinates_file_name = ""
 waypoints_file_name = ""
-
-TARGET_YAW_1 = 0
-TARGET_YAW_2 = 0
-TARGET_YAW_3 = 0
+link_file_name = ""         # Per-link statistics CSV, appended every RATE_WINDOW
+targets_file_name = ""      # Setpoint latency/drop histograms CSV, appended every RATE_WINDOW
+BINARY_LOG = 0              # 1 = also record fixed-size binary logs (see flight_log.py)
+                            # 0 = CSV logs only
+coordinates_log_name = ""   # Binary coordinates log (BINARY_LOG only)
+waypoints_log_name = ""     # Binary waypoints log (BINARY_LOG only)
+coordinates_record = 0      # struct for one binary coordinates record (all drones)
+waypoints_record = flight_log.record_struct(1 + len(flight_log.WAYPOINT_FIELDS))
+log_start = 0               # time.monotonic() when the logs were created
+
+logger = 0                  # Background file writer (see LogWriter)
+LOG_QUEUE_SIZE = 10000      # Max lines waiting to be written; further lines are dropped, never waited on
+LOG_FLUSH_INTERVAL = 0.5    # Time (s) between batched writes to disk
+LOG_FSYNC_INTERVAL = 5.0    # Time (s) between fsyncs of the log files
 
 
 ###################################################################################################
@@ -139,8 +263,82 @@ def main():
     # Main!
     ################################################
 
+    global router
+    global receiver
+    global scheduler
+    global logger
+    global state
+    global fleet
+    global waypoints
+    global flight_clock
+    global estimator
+    global leader_history
+    global simplifier
+    global separation
+    global missions
+    global commands
+    global watchdog
+    global target_monitor
+    global stream_control
+    global coordinates_record
+
+    # Drone registry and shared vehicle state
+    fleet = Fleet(DRONES)
+    state = DroneState(len(fleet))
+    coordinates_record = flight_log.record_struct(1 + len(fleet) * len(flight_log.COORDINATE_FIELDS))
+    followers = [drone.number for drone in fleet if not drone.is_leader()]
+    waypoints = BreadcrumbBuffer(followers)
+
+    # Refuse to start with a train spacing the follow mode can't keep
+    train_spacing(followers)
+
+    estimator = StateEstimator(len(fleet))
+    leader_history = LeaderHistory(HISTORY_LENGTH)
+    simplifier = PathSimplifier()
+    separation = SeparationMonitor()
+    missions = MissionEngine()
+    target_monitor = TargetMonitor(fleet.numbers())
+
+    # Log files are written in the background so telemetry never waits on the disk
+    logger = LogWriter()
+    t_log = threading.Thread(target=logger.run, args=(), daemon=True)
+    t_log.start()
+
+    # The flight loop sleeps until new positions arrive
+    flight_clock = FlightClock()
+
+    # Commands are matched with their COMMAND_ACK
+    commands = CommandTracker()
+
+    # Every decoded message is fanned out to these handlers
+    router = MavlinkRouter()
+    router.register('LOCAL_POSITION_NED', handle_local_position)
+    router.register('COMMAND_ACK', handle_command_ack)
+    router.register('POSITION_TARGET_LOCAL_NED', handle_position_target)
+
+    # Telemetry receiver must be running before any drone is connected
+    receiver = TelemetryReceiver(router)
+    if FAST_DECODE:
+        receiver.decoder = FastMavlinkDecoder()
+    t_rx = threading.Thread(target=telemetry_local_position_thread, args=(), daemon=True)
+    t_rx.start()
+
+    # Failsafe for drones whose telemetry stops
+    watchdog = TelemetryWatchdog()
+    t_watchdog = threading.Thread(target=watchdog.run, args=(), daemon=True)
+    t_watchdog.start()
+
+    # Telemetry rates follow the flight mode and each drone's link quality
+    stream_control = StreamRateController()
+    t_streams = threading.Thread(target=stream_control.run, args=(), daemon=True)
+    t_streams.start()
+
+    # Setpoints are sent at a fixed rate per drone once setup() starts the sender
+    scheduler = SetpointScheduler(fleet.numbers(), send_setpoint)
+
     # Setup GUI
     setup_GUI()
+    window.protocol("WM_DELETE_WINDOW", close_GUI)
 
     # Setup
 
@@ -149,6 +347,16 @@ def main():
     window.mainloop()
     
 
+def close_GUI():
+    ################################################
+    # [no inputs or outputs]
+    ################################################
+
+    # Make sure everything logged so far reaches the disk
+    logger.close()
+    window.destroy()
+
+
 ###################################################################################################
 
 
@@ -159,374 +367,161 @@ def setup_GUI():
 
     # Use global window function
     global window
-    global drone_1_IP_entry
-    global drone_2_IP_entry
-    global drone_3_IP_entry
-    global drone_1_UDP_entry
-    global drone_2_UDP_entry
-    global drone_3_UDP_entry
-    global drone_1_x_entry
-    global drone_1_y_entry
-    global drone_1_z_entry
-    global drone_2_x_entry
-    global drone_2_y_entry
-    global drone_2_z_entry
-    global drone_3_x_entry
-    global drone_3_y_entry
-    global drone_3_z_entry
-    global drone_1_x_coord
-    global drone_1_y_coord
-    global drone_1_z_coord
-    global drone_2_x_coord
-    global drone_2_y_coord
-    global drone_2_z_coord
-    global drone_3_x_coord
-    global drone_3_y_coord
-    global drone_3_z_coord
-    global drone_1_x_target
-    global drone_1_y_target
-    global drone_1_z_target
-    global drone_2_x_target
-    global drone_2_y_target
-    global drone_2_z_target
-    global drone_3_x_target
-    global drone_3_y_target
-    global drone_3_z_target
+    global loop_rate_label
 
     # Create window
     window = Tk()
     window.configure(background="black")
+    columns = min(len(fleet), visible_columns)
+
+    # Title
+    top_frame = Frame(window, width=column_width * columns, height=window_height/5, background="ivory4")
+    top_frame.grid(row=0, column=0, sticky='ew')
+    top_frame.pack_propagate(False)
+    title = Label(top_frame, text='CAVE DRONE GCS', font=('Arial 26'))
+    title.pack()
+    buttons_frame = Frame(top_frame, background="ivory4")
+    buttons_frame.pack()
+    connect_all_button = Button(buttons_frame, text="Connect All", width=12, command=connect_all)
+    connect_all_button.pack(side=LEFT, padx=4)
+    arm_all_button = Button(buttons_frame, text="Arm All", width=12, command=lambda: command_fleet(arm, "Arm"))
+    arm_all_button.pack(side=LEFT, padx=4)
+    land_all_button = Button(buttons_frame, text="Land All", width=12, command=lambda: command_fleet(land, "Land"))
+    land_all_button.pack(side=LEFT, padx=4)
+    loop_rate_label = Label(top_frame, text='', font=('Arial 10'), background="ivory4")
+    loop_rate_label.pack()
+
+    # One column per drone in the fleet; scroll sideways when they don't all fit
+    canvas = Canvas(window, width=column_width * columns, height=window_height*4/5, background="black", highlightthickness=0)
+    canvas.grid(row=1, column=0, sticky='nsew')
+    columns_frame = Frame(canvas, background="black")
+    canvas.create_window((0, 0), window=columns_frame, anchor='nw')
+    columns_frame.bind('<Configure>', lambda event: canvas.configure(scrollregion=canvas.bbox('all')))
+    if len(fleet) > columns:
+        scrollbar = Scrollbar(window, orient=HORIZONTAL, command=canvas.xview)
+        scrollbar.grid(row=2, column=0, sticky='ew')
+        canvas.configure(xscrollcommand=scrollbar.set)
+
+    # Button images
+    cwd = os.getcwd()
+    photo = PhotoImage(file = cwd+"/Ground Station Code/Python/GUI_Images/wifi_small.png")
+    setup_photo = PhotoImage(file = cwd+"/Ground Station Code/Python/GUI_Images/setup.png")
+
+    for column, drone in enumerate(fleet):
+        setup_drone_column(columns_frame, column, drone, photo, setup_photo)
+
+    # Configure grid
+    window.resizable(False, False)
+    window.title("MAV Lab")
+
+
+def setup_drone_column(parent, column, drone, photo, setup_photo):
+    ################################################
+    # parent: frame holding all drone columns [input]
+    # column: int, grid column [input]
+    # drone: Drone the column controls [input]
+    # photo, setup_photo: button images [input]
+    ################################################
 
-    # Set size of window
-    window.geometry(str(window_width) + "x" +  str(window_height))
+    number = drone.number
+    widgets = drone.widgets
 
     # Create frames
-    top_frame = Frame(window, width=window_width, height=window_height/5)
-    left_frame = Frame(window, width=window_width/3, height=window_height*2/5)
-    left_frame_bottom = Frame(window, width=window_width/3, height=window_height*1/10)
-    left_frame_bottom_coords = Frame(window, width=window_width/3, height=window_height*1/10)
-    middle_frame = Frame(window, width=window_width/3, height=window_height*2/5)
-    middle_frame_bottom = Frame(window, width=window_width/3, height=window_height*1/10)
-    middle_frame_bottom_coords = Frame(window, width=window_width/3, height=window_height*1/10)
-    right_frame = Frame(window, width=window_width/3, height=window_height*2/5)
-    right_frame_bottom = Frame(window, width=window_width/3, height=window_height*1/10)
-    right_frame_bottom_coords = Frame(window, width=window_width/3, height=window_height*1/10)
-    bottom_frame = Frame(window, width=window_width, height=window_height/5)
-    
+    frame = Frame(parent, width=column_width, height=window_height*2/5, background="ivory4")
+    frame_bottom = Frame(parent, width=column_width, height=window_height*1/10, background="ivory4")
+    frame_bottom_coords = Frame(parent, width=column_width, height=window_height*1/10, background="ivory4")
+    frame_feedback = Frame(parent, width=column_width, height=window_height*1/5, background="ivory4")
+
     # Organize frames
-    top_frame.grid(row=0, columnspan=3)
-    left_frame.grid(row=1, column=0, sticky='nsew')
-    left_frame_bottom.grid(row=2, column=0, sticky='nsew')
-    left_frame_bottom_coords.grid(row=3, column=0, sticky='nsew')
-    middle_frame.grid(row=1, column=1, sticky='nsew')
-    middle_frame_bottom.grid(row=2, column=1, sticky='nsew')
-    middle_frame_bottom_coords.grid(row=3, column=1, sticky='nsew')
-    right_frame.grid(row=1, column=2, sticky="nsew")
-    right_frame_bottom.grid(row=2, column=2, sticky='nsew')
-    right_frame_bottom_coords.grid(row=3, column=2, sticky='nsew')
-    bottom_frame.grid(row=4, columnspan=3, sticky="ew")
+    frame.grid(row=0, column=column, sticky='nsew')
+    frame_bottom.grid(row=1, column=column, sticky='nsew')
+    frame_bottom_coords.grid(row=2, column=column, sticky='nsew')
+    frame_feedback.grid(row=3, column=column, sticky='nsew')
 
     # Formatting frames
-    top_frame.grid_propagate(False)
-    top_frame.pack_propagate(False)
-    left_frame.grid_propagate(False)
-    left_frame.pack_propagate(False)
-    left_frame.columnconfigure(0, weight=2)
-    left_frame.columnconfigure(1, weight=0)
-    left_frame.columnconfigure(2, weight=1)
-    left_frame_bottom.grid_propagate(False)
-    left_frame_bottom.pack_propagate(False)
-    left_frame_bottom.columnconfigure(0, weight=1)
-    left_frame_bottom.columnconfigure(1, weight=0)
-    left_frame_bottom.columnconfigure(2, weight=0)
-    left_frame_bottom.columnconfigure(3, weight=0)
-    left_frame_bottom.columnconfigure(4, weight=1)
-    left_frame_bottom_coords.grid_propagate(False)
-    left_frame_bottom_coords.pack_propagate(False)
-    left_frame_bottom_coords.columnconfigure(0, weight=1)
-    left_frame_bottom_coords.columnconfigure(3, weight=1)
-    middle_frame.grid_propagate(False)
-    middle_frame.pack_propagate(False)
-    middle_frame.columnconfigure(0, weight=2)
-    middle_frame.columnconfigure(1, weight=0)
-    middle_frame.columnconfigure(2, weight=1)
-    middle_frame_bottom.grid_propagate(False)
-    middle_frame_bottom.pack_propagate(False)
-    middle_frame_bottom.columnconfigure(0, weight=1)
-    middle_frame_bottom.columnconfigure(1, weight=0)
-    middle_frame_bottom.columnconfigure(2, weight=0)
-    middle_frame_bottom.columnconfigure(3, weight=0)
-    middle_frame_bottom.columnconfigure(4, weight=1)
-    middle_frame_bottom_coords.grid_propagate(False)
-    middle_frame_bottom_coords.pack_propagate(False)
-    middle_frame_bottom_coords.columnconfigure(0, weight=1)
-    middle_frame_bottom_coords.columnconfigure(3, weight=1)
-    right_frame.grid_propagate(False)
-    right_frame.pack_propagate(False)
-    right_frame.columnconfigure(0, weight=2)
-    right_frame.columnconfigure(1, weight=0)
-    right_frame.columnconfigure(2, weight=1)
-    right_frame_bottom.grid_propagate(False)
-    right_frame_bottom.pack_propagate(False)
-    right_frame_bottom.columnconfigure(0, weight=1)
-    right_frame_bottom.columnconfigure(1, weight=0)
-    right_frame_bottom.columnconfigure(2, weight=0)
-    right_frame_bottom.columnconfigure(3, weight=0)
-    right_frame_bottom.columnconfigure(4, weight=1)
-    right_frame_bottom_coords.grid_propagate(False)
-    right_frame_bottom_coords.pack_propagate(False)
-    right_frame_bottom_coords.columnconfigure(0, weight=1)
-    right_frame_bottom_coords.columnconfigure(3, weight=1)
-    bottom_frame.grid_propagate(False)
-    bottom_frame.pack_propagate(False)
-    bottom_frame.columnconfigure(0, weight=1)
-    bottom_frame.columnconfigure(1, weight=1)
-    bottom_frame.columnconfigure(2, weight=1)
-    bottom_frame.columnconfigure(3, weight=1)
-    bottom_frame.columnconfigure(4, weight=1)
-    bottom_frame.columnconfigure(5, weight=1)
-    bottom_frame.columnconfigure(6, weight=1)
-    bottom_frame.columnconfigure(7, weight=1)
-    bottom_frame.columnconfigure(8, weight=1)
-    bottom_frame.rowconfigure(0, weight=1)
-
-    # Set backgrounds
-    cwd = os.getcwd()
-    # mars_top = PhotoImage(file = cwd+"/Follower/Python/GUI_Images/mars_top.png", master=window)
-    # background_label_top = Label(top_frame, image=mars_top)
-    # background_label_top.img = mars_top
-    # background_label_top.place(x=0, y=0, relwidth=1, relheight=1)
-    # mars_left = PhotoImage(file = cwd+"/Follower/Python/GUI_Images/mars_left.png", master=window)
-    # background_label_left = Label(left_frame, image=mars_left)
-    # background_label_left.img = mars_left
-    # background_label_left.place(x=0, y=0, relwidth=1, relheight=1)
-    # mars_left_bottom = PhotoImage(file = cwd+"/Follower/Python/GUI_Images/mars_left_bottom.png", master=window)
-    # background_label_left_bottom = Label(left_frame_bottom, image=mars_left_bottom)
-    # background_label_left_bottom.img = mars_left_bottom
-    # background_label_left_bottom.place(x=0, y=0, relwidth=1, relheight=1)
-    # mars_left_bottom_coords = PhotoImage(file = cwd+"/Follower/Python/GUI_Images/mars_left_bottom_coords.png", master=window)
-    # background_label_left_bottom_coords = Label(left_frame_bottom_coords, image=mars_left_bottom_coords)
-    # background_label_left_bottom_coords.img = mars_left_bottom_coords
-    # background_label_left_bottom_coords.place(x=0, y=0, relwidth=1, relheight=1)
-    # mars_right = PhotoImage(file = cwd+"/Follower/Python/GUI_Images/mars_right.png", master=window)
-    # background_label_right = Label(right_frame, image=mars_right)
-    # background_label_right.img = mars_right
-    # background_label_right.place(x=0, y=0, relwidth=1, relheight=1)
-    # mars_right_bottom = PhotoImage(file =cwd+"/Follower/Python/GUI_Images/mars_right_bottom.png", master=window)
-    # background_label_right_bottom = Label(right_frame_bottom, image=mars_right_bottom)
-    # background_label_right_bottom.img = mars_right_bottom
-    # background_label_right_bottom.place(x=0, y=0, relwidth=1, relheight=1)
-    # mars_right_bottom_coords = PhotoImage(file = cwd+"/Follower/Python/GUI_Images/mars_right_bottom_coords.png", master=window)
-    # background_label_right_bottom_coords = Label(right_frame_bottom_coords, image=mars_right_bottom_coords)
-    # background_label_right_bottom_coords.img = mars_right_bottom_coords
-    # background_label_right_bottom_coords.place(x=0, y=0, relwidth=1, relheight=1)
-    # mars_bottom = PhotoImage(file = cwd+"/Follower/Python/GUI_Images/mars_bottom.png", master=window)
-    # background_label_bottom = Label(bottom_frame, image=mars_bottom)
-    # background_label_bottom.img = mars_bottom
-    # background_label_bottom.place(x=0, y=0, relwidth=1, relheight=1)
-    top_frame.configure(background="ivory4")
-    left_frame.configure(background="ivory4")
-    middle_frame.configure(background="ivory4")
-    right_frame.configure(background="ivory4")
-    left_frame_bottom.configure(background="ivory4")
-    middle_frame_bottom.configure(background="ivory4")
-    right_frame_bottom.configure(background="ivory4")
-    left_frame_bottom_coords.configure(background="ivory4")
-    middle_frame_bottom_coords.configure(background="ivory4")
-    right_frame_bottom_coords.configure(background="ivory4")
-    bottom_frame.configure(background="ivory4")
+    for f in (frame, frame_bottom, frame_bottom_coords, frame_feedback):
+        f.grid_propagate(False)
+        f.pack_propagate(False)
+    frame.columnconfigure(0, weight=2)
+    frame.columnconfigure(1, weight=0)
+    frame.columnconfigure(2, weight=1)
+    frame_bottom.columnconfigure(0, weight=1)
+    frame_bottom.columnconfigure(4, weight=1)
+    frame_bottom_coords.columnconfigure(0, weight=1)
+    frame_bottom_coords.columnconfigure(3, weight=1)
+    for i in range(3):
+        frame_feedback.columnconfigure(i, weight=1)
 
     # Title
-    title = Label(top_frame, text='CAVE DRONE GCS', font=('Arial 26'))
-    title.pack()
-
-    # Titles
-    drone_1_title = Label(left_frame, text="Leader Drone", font=('Arial 20'))
-    drone_1_title.grid(row=0, column=0, sticky='w')
-    drone_2_title = Label(middle_frame, text="Follower Drone 1", font=('Arial 20'))
-    drone_2_title.grid(row=0, column=0, sticky='w', columnspan=2)
-    drone_3_title = Label(right_frame, text="Follower Drone 2", font=('Arial 20'))
-    drone_3_title.grid(row=0, column=0, sticky='w', columnspan=2)
-
-    # IP Entry Widgets
-    drone_1_IP_entry = Entry(left_frame, width=12, font=('Arial 16'))
-    drone_1_IP_entry.grid(row=1, column=0, padx=5, pady=10, sticky='e')
-    drone_2_IP_entry = Entry(middle_frame, width=12, font=('Arial 16'))
-    drone_2_IP_entry.grid(row=1, column=0, padx=5, pady=10, sticky='e')
-    drone_3_IP_entry = Entry(right_frame, width=12, font=('Arial 16'))
-    drone_3_IP_entry.grid(row=1, column=0, padx=5, pady=10, sticky='e')
-
-    # UDP Entry Widgets
-    drone_1_UDP_entry = Entry(left_frame, width=5, font=('Arial 16'))
-    drone_1_UDP_entry.grid(row=1, column=1, pady=10, sticky='w')
-    drone_2_UDP_entry = Entry(middle_frame, width=5, font=('Arial 16'))
-    drone_2_UDP_entry.grid(row=1, column=1, pady=10, sticky='w')
-    drone_3_UDP_entry = Entry(right_frame, width=5, font=('Arial 16'))
-    drone_3_UDP_entry.grid(row=1, column=1, pady=10, sticky='w')
-
-    # IP Buttons
-    photo = PhotoImage(file = cwd+"/Ground Station Code/Python/GUI_Images/wifi_small.png")
-    setup_photo = PhotoImage(file = cwd+"/Ground Station Code/Python/GUI_Images/setup.png")
-
-    drone_1_IP_button = Button(left_frame, image=photo, command=update_drone_1_IP)
-    drone_1_IP_button.image = photo
-    drone_1_IP_button.grid(row=1, column=2, padx=5, pady=10, sticky='w')
-    drone_1_setup = Button(left_frame, image=setup_photo, command=setup)
-    drone_1_setup.image = setup_photo
-    drone_1_setup.grid(row=1, column=3, pady=10, sticky='w')
-    drone_2_IP_button = Button(middle_frame, image=photo, command=update_drone_2_IP)
-    drone_2_IP_button.image = photo
-    drone_2_IP_button.grid(row=1, column=2, padx=5, pady=10, sticky='w')
-    drone_3_IP_button = Button(right_frame, image=photo, command=update_drone_3_IP)
-    drone_3_IP_button.image = photo
-    drone_3_IP_button.grid(row=1, column=2, padx=5, pady=10, sticky='w')
-
-    # Arm buttons
-    drone_1_arm_button = Button(left_frame, text="Arm Leader", width=20, command=lambda: arm(drone1))
-    drone_1_arm_button.grid(row=2, column=0, padx=4, pady=2, sticky='e')
-    drone_2_arm_button = Button(middle_frame, text="Arm Follower", width=20, command=lambda: arm(drone2))
-    drone_2_arm_button.grid(row=2, column=0, padx=4, pady=2, sticky='e')
-    drone_3_arm_button = Button(right_frame, text="Arm Follower", width=20, command=lambda: arm(drone3))
-    drone_3_arm_button.grid(row=2, column=0, padx=4, pady=2, sticky='e')
-
-    # Disarm buttons
-    drone_1_disarm_button = Button(left_frame, text="Disarm Leader", width=20, command=lambda: disarm(drone1))
-    drone_1_disarm_button.grid(row=2, column=1, columnspan=2, padx=4, pady=2, sticky='w')
-    drone_2_disarm_button = Button(middle_frame, text="Disarm Follower", width=20, command=lambda: disarm(drone2))
-    drone_2_disarm_button.grid(row=2, column=1, columnspan=2, padx=4, pady=2, sticky='w')
-    drone_3_disarm_button = Button(right_frame, text="Disarm Follower", width=20, command=lambda: disarm(drone3))
-    drone_3_disarm_button.grid(row=2, column=1, columnspan=2, padx=4, pady=2, sticky='w')
-
-    # Takeoff buttons
-    drone_1_takeoff_button = Button(left_frame, text="Takeoff Leader", width=20, command=lambda: takeoff_CUSTOM(drone1, -.75, 1))
-    drone_1_takeoff_button.grid(row=3, column=0, padx=4, pady=2, sticky='e')
-    drone_2_takeoff_button = Button(middle_frame, text="Takeoff Follower", width=20, command=lambda: takeoff_CUSTOM(drone2, -.75, 2))
-    drone_2_takeoff_button.grid(row=3, column=0, padx=4, pady=2, sticky='e')
-    drone_3_takeoff_button = Button(right_frame, text="Takeoff Follower", width=20, command=lambda: takeoff_CUSTOM(drone3, -.75, 3))
-    drone_3_takeoff_button.grid(row=3, column=0, padx=4, pady=2, sticky='e')
-
-    # Land buttons
-    drone_1_land_button = Button(left_frame, text="Land Leader", width=20, command=lambda: land(drone1))
-    drone_1_land_button.grid(row=3, column=1, columnspan=2, padx=4, pady=2, sticky='w')
-    drone_2_land_button = Button(middle_frame, text="Land Follower", width=20, command=lambda: land(drone2))
-    drone_2_land_button.grid(row=3, column=1, columnspan=2, padx=4, pady=2, sticky='w')
-    drone_3_land_button = Button(right_frame, text="Land Follower", width=20, command=lambda: land(drone3))
-    drone_3_land_button.grid(row=3, column=1, columnspan=2, padx=4, pady=2, sticky='w')
-
-    # Mode buttons
-    drone_1_off_button = Button(left_frame_bottom, text="OFF", width=7, command=lambda: update_flight_mode(1, 4))
-    drone_1_off_button.grid(row=1, column=0, padx=4, pady=2, sticky='e')
-    drone_1_test_button = Button(left_frame_bottom, text="TEST", width=7, command=lambda: update_flight_mode(1, 0))
-    drone_1_test_button.grid(row=1, column=1, padx=4, pady=2, sticky='w')
-    drone_1_manual_button = Button(left_frame_bottom, text="MANUAL", width=7, command=lambda: update_flight_mode(1, 1))
-    drone_1_manual_button.grid(row=1, column=2, padx=4, pady=2, sticky='w')
-    drone_1_demo_button = Button(left_frame_bottom, text="DEMO", width=7, command=lambda: update_flight_mode(1, 3))
-    drone_1_demo_button.grid(row=1, column=3, padx=4, pady=2, sticky='w')
-    drone_1_autonomous_button = Button(left_frame_bottom, text="AUTO", width=7, command=lambda: update_flight_mode(1, 2))
-    drone_1_autonomous_button.grid(row=1, column=4, padx=4, pady=2, sticky='w')
-    # drone_2_off_button = Button(right_frame_bottom, text="OFF", width=7, command=lambda: update_flight_mode(2, 4))
-    # drone_2_off_button.grid(row=1, column=0, padx=4, pady=2, sticky='e')
-    # drone_2_test_button = Button(right_frame_bottom, text="TEST", width=7, command=lambda: update_flight_mode(2, 0))
-    # drone_2_test_button.grid(row=1, column=1, padx=4, pady=2, sticky='w')
-    # drone_2_manual_button = Button(right_frame_bottom, text="MANUAL", width=7, command=lambda: update_flight_mode(2, 1))
-    # drone_2_manual_button.grid(row=1, column=2, padx=4, pady=2, sticky='w')
-    # drone_2_demo_button = Button(right_frame_bottom, text="DEMO", width=7, command=lambda: update_flight_mode(2, 3))
-    # drone_2_demo_button.grid(row=1, column=3, padx=4, pady=2, sticky='w')
-    # drone_2_autonomous_button = Button(right_frame_bottom, text="AUTO", width=7, command=lambda: update_flight_mode(2, 2))
-    # drone_2_autonomous_button.grid(row=1, column=4,padx=4, pady=2, sticky='w')
+    title = Label(frame, text=drone.name, font=('Arial 20'))
+    title.grid(row=0, column=0, sticky='w', columnspan=2)
+
+    # IP and UDP Entry Widgets
+    widgets['IP_entry'] = Entry(frame, width=12, font=('Arial 16'))
+    widgets['IP_entry'].grid(row=1, column=0, padx=5, pady=10, sticky='e')
+    widgets['UDP_entry'] = Entry(frame, width=5, font=('Arial 16'))
+    widgets['UDP_entry'].grid(row=1, column=1, pady=10, sticky='w')
+
+    # IP Button
+    IP_button = Button(frame, image=photo, command=lambda: update_drone_IP(number))
+    IP_button.image = photo
+    IP_button.grid(row=1, column=2, padx=5, pady=10, sticky='w')
+    if drone.is_leader():
+        setup_button = Button(frame, image=setup_photo, command=setup)
+        setup_button.image = setup_photo
+        setup_button.grid(row=1, column=3, pady=10, sticky='w')
+
+    # Arm, disarm, takeoff and land buttons
+    role = "Leader" if drone.is_leader() else "Follower"
+    arm_button = Button(frame, text="Arm " + role, width=20, command=lambda: command_drone(number, arm, "Arm"))
+    arm_button.grid(row=2, column=0, padx=4, pady=2, sticky='e')
+    disarm_button = Button(frame, text="Disarm " + role, width=20, command=lambda: command_drone(number, disarm, "Disarm"))
+    disarm_button.grid(row=2, column=1, columnspan=2, padx=4, pady=2, sticky='w')
+    takeoff_button = Button(frame, text="Takeoff " + role, width=20, command=lambda: takeoff_drone(number, -.75))
+    takeoff_button.grid(row=3, column=0, padx=4, pady=2, sticky='e')
+    land_button = Button(frame, text="Land " + role, width=20, command=lambda: command_drone(number, land, "Land"))
+    land_button.grid(row=3, column=1, columnspan=2, padx=4, pady=2, sticky='w')
+
+    # Connection status and telemetry age
+    widgets['status'] = Label(frame, text='Not connected', font=('Arial 10'))
+    widgets['status'].grid(row=4, column=0, columnspan=2, padx=4, pady=2, sticky='w')
+    widgets['staleness'] = Label(frame, text='no data', font=('Arial 10'))
+    widgets['staleness'].grid(row=4, column=2, columnspan=2, padx=4, pady=2, sticky='e')
+
+    # Mode buttons (flight mode applies to the whole fleet, so only the leader has them)
+    if drone.is_leader():
+        for i, (text, mode) in enumerate((("OFF", 4), ("TEST", 0), ("MANUAL", 1), ("DEMO", 3), ("AUTO", 2))):
+            mode_button = Button(frame_bottom, text=text, width=7, command=lambda mode=mode: update_flight_mode(number, mode))
+            mode_button.grid(row=1, column=i, padx=4, pady=2, sticky='e' if i == 0 else 'w')
 
     # Manual coordinate entries
-    drone_1_x_entry = Entry(left_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_1_x_entry.grid(row=1, column=0, pady=10, sticky='e')
-    drone_1_y_entry = Entry(left_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_1_y_entry.grid(row=1, column=1, pady=10)
-    drone_1_z_entry = Entry(left_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_1_z_entry.grid(row=1, column=2, pady=10)
-    drone_2_x_entry = Entry(middle_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_2_x_entry.grid(row=1, column=0, pady=10, sticky='e')
-    drone_2_y_entry = Entry(middle_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_2_y_entry.grid(row=1, column=1, pady=10)
-    drone_2_z_entry = Entry(middle_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_2_z_entry.grid(row=1, column=2, pady=10)
-    drone_3_x_entry = Entry(right_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_3_x_entry.grid(row=1, column=0, pady=10, sticky='e')
-    drone_3_y_entry = Entry(right_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_3_y_entry.grid(row=1, column=1, pady=10)
-    drone_3_z_entry = Entry(right_frame_bottom_coords, width=5, font=('Arial 16'))
-    drone_3_z_entry.grid(row=1, column=2, pady=10)
+    widgets['x_entry'] = Entry(frame_bottom_coords, width=5, font=('Arial 16'))
+    widgets['x_entry'].grid(row=1, column=0, pady=10, sticky='e')
+    widgets['y_entry'] = Entry(frame_bottom_coords, width=5, font=('Arial 16'))
+    widgets['y_entry'].grid(row=1, column=1, pady=10)
+    widgets['z_entry'] = Entry(frame_bottom_coords, width=5, font=('Arial 16'))
+    widgets['z_entry'].grid(row=1, column=2, pady=10)
 
     # Manual coordinate entry button
-    drone_1_coords_button = Button(left_frame_bottom_coords, text='✓', width=5, command=update_coords_drone_1)
-    drone_1_coords_button.grid(row=1, column=3, columnspan=2, padx=4, pady=2, sticky='w')
-    drone_2_coords_button = Button(middle_frame_bottom_coords, text='✓', width=5, command=update_coords_drone_2)
-    drone_2_coords_button.grid(row=1, column=3, columnspan=2, padx=4, pady=2, sticky='w')
-    drone_3_coords_button = Button(right_frame_bottom_coords, text='✓', width=5, command=update_coords_drone_3)
-    drone_3_coords_button.grid(row=1, column=3, columnspan=2, padx=4, pady=2, sticky='w')
-
-    # Current coordinate feedback
-    drone_1_x_coord = Label(bottom_frame, text='1.01', font=('Arial 12'))
-    drone_1_x_coord.grid(row = 3, column = 0)
-    drone_1_y_coord = Label(bottom_frame, text='0.75', font=('Arial 12'))
-    drone_1_y_coord.grid(row = 3, column = 1)
-    drone_1_z_coord = Label(bottom_frame, text='-0.88', font=('Arial 12'))
-    drone_1_z_coord.grid(row = 3, column = 2)
-    drone_2_x_coord = Label(bottom_frame, text='1.01', font=('Arial 12'))
-    drone_2_x_coord.grid(row = 3, column = 3)
-    drone_2_y_coord = Label(bottom_frame, text='0.75', font=('Arial 12'))
-    drone_2_y_coord.grid(row = 3, column = 4)
-    drone_2_z_coord = Label(bottom_frame, text='-0.88', font=('Arial 12'))
-    drone_2_z_coord.grid(row = 3, column = 5)
-    drone_3_x_coord = Label(bottom_frame, text='1.01', font=('Arial 12'))
-    drone_3_x_coord.grid(row = 3, column = 6)
-    drone_3_y_coord = Label(bottom_frame, text='0.75', font=('Arial 12'))
-    drone_3_y_coord.grid(row = 3, column = 7)
-    drone_3_z_coord = Label(bottom_frame, text='-0.88', font=('Arial 12'))
-    drone_3_z_coord.grid(row = 3, column = 8)
-    drone_1_x_lab = Label(bottom_frame, text='X', font=('Arial 16'))
-    drone_1_x_lab.grid(row = 0, column = 0)
-    drone_1_y_lab = Label(bottom_frame, text='Y', font=('Arial 16'))
-    drone_1_y_lab.grid(row = 0, column = 1)
-    drone_1_z_lab = Label(bottom_frame, text='Z', font=('Arial 16'))
-    drone_1_z_lab.grid(row = 0, column = 2)
-    drone_2_x_lab = Label(bottom_frame, text='X', font=('Arial 16'))
-    drone_2_x_lab.grid(row = 0, column = 3)
-    drone_2_y_lab = Label(bottom_frame, text='Y', font=('Arial 16'))
-    drone_2_y_lab.grid(row = 0, column = 4)
-    drone_2_z_lab = Label(bottom_frame, text='Z', font=('Arial 16'))
-    drone_2_z_lab.grid(row = 0, column = 5)
-    drone_3_x_lab = Label(bottom_frame, text='X', font=('Arial 16'))
-    drone_3_x_lab.grid(row = 0, column = 6)
-    drone_3_y_lab = Label(bottom_frame, text='Y', font=('Arial 16'))
-    drone_3_y_lab.grid(row = 0, column = 7)
-    drone_3_z_lab = Label(bottom_frame, text='Z', font=('Arial 16'))
-    drone_3_z_lab.grid(row = 0, column = 8)
-    drone_1_x_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_1_x_target.grid(row = 2, column = 0)
-    drone_1_y_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_1_y_target.grid(row = 2, column = 1)
-    drone_1_z_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_1_z_target.grid(row = 2, column = 2)
-    drone_2_x_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_2_x_target.grid(row = 2, column = 3)
-    drone_2_y_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_2_y_target.grid(row = 2, column = 4)
-    drone_2_z_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_2_z_target.grid(row = 2, column = 5)
-    drone_3_x_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_3_x_target.grid(row = 2, column = 6)
-    drone_3_y_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_3_y_target.grid(row = 2, column = 7)
-    drone_3_z_target = Label(bottom_frame, text='-10', font=('Arial 12'))
-    drone_3_z_target.grid(row = 2, column = 8)
-
-    # TODO:
-    # Add current x,y,z coordinates in bottom frame
-
-    # Configure grid
-    window.resizable(False, False)
-    window.title("MAV Lab")
-    window.rowconfigure(9)
-    window.columnconfigure((0, 1), weight = 1, uniform="column")
+    coords_button = Button(frame_bottom_coords, text='✓', width=5, command=lambda: update_coords(number, widgets['x_entry'], widgets['y_entry'], widgets['z_entry']))
+    coords_button.grid(row=1, column=3, columnspan=2, padx=4, pady=2, sticky='w')
+
+    # Target (row 1) and current (row 2) coordinate feedback
+    for i, axis in enumerate(('x', 'y', 'z')):
+        label = Label(frame_feedback, text=axis.upper(), font=('Arial 16'))
+        label.grid(row=0, column=i)
+        widgets[axis + '_target'] = Label(frame_feedback, text='-10', font=('Arial 12'))
+        widgets[axis + '_target'].grid(row=1, column=i)
+        widgets[axis + '_coord'] = Label(frame_feedback, text='0.00', font=('Arial 12'))
+        widgets[axis + '_coord'].grid(row=2, column=i)
+
+    # Telemetry update rate feedback
+    widgets['rate'] = Label(frame_feedback, text='0.0 Hz', font=('Arial 10'))
+    widgets['rate'].grid(row=3, column=0, columnspan=3)
+    widgets['link'] = Label(frame_feedback, text='', font=('Arial 10'))
+    widgets['link'].grid(row=4, column=0, columnspan=3)
+    widgets['targets'] = Label(frame_feedback, text='', font=('Arial 10'))
+    widgets['targets'].grid(row=5, column=0, columnspan=3)
 
 
 def update_current_coords():
@@ -534,177 +529,160 @@ def update_current_coords():
     # [no inputs or outputs]
     ################################################
 
-    # TODO: FIX BUG
-    # When button is pressed with no text in the XYZ boxes, an empty string is parsed to a float and the following error arises:
-    # ValueError: could not convert string to float: ''
+    # Connection results arrive from the connection workers
+    while True:
+        try:
+            number, text = connection_status.get_nowait()
+        except queue.Empty:
+            break
+        fleet.get(number).widgets['status'].config(text=text)
 
-    drone_1_x_coord.config(text=f'{float(CURRENT_X_1):.2f}')
-    drone_1_y_coord.config(text=f'{float(CURRENT_Y_1):.2f}')
-    drone_1_z_coord.config(text=f'{float(CURRENT_Z_1):.2f}')
+    # One consistent copy of every drone
+    snapshot = state.snapshot()
+    now = time.monotonic()
+    predicted = estimator.predict(now)
+    rates = receiver.get_update_rates()
+    statistics = scheduler.get_statistics()
 
-    drone_2_x_coord.config(text=f'{float(CURRENT_X_2):.2f}')
-    drone_2_y_coord.config(text=f'{float(CURRENT_Y_2):.2f}')
-    drone_2_z_coord.config(text=f'{float(CURRENT_Z_2):.2f}')
+    for drone in fleet:
+        row = snapshot[drone.number - 1]
+        widgets = drone.widgets
 
-    drone_3_x_coord.config(text=f'{float(CURRENT_X_3):.2f}')
-    drone_3_y_coord.config(text=f'{float(CURRENT_Y_3):.2f}')
-    drone_3_z_coord.config(text=f'{float(CURRENT_Z_3):.2f}')
+        # Current position, and where the estimator thinks the drone is now
+        estimate = predicted[drone.number - 1]
+        widgets['x_coord'].config(text=f'{row[X]:.2f} ({estimate[X]:.2f})')
+        widgets['y_coord'].config(text=f'{row[Y]:.2f} ({estimate[Y]:.2f})')
+        widgets['z_coord'].config(text=f'{row[Z]:.2f} ({estimate[Z]:.2f})')
 
-    drone_1_x_target.config(text=f'{float(TARGET_X_1):.2f}')
-    drone_1_y_target.config(text=f'{float(TARGET_Y_1):.2f}')
-    drone_1_z_target.config(text=f'{float(TARGET_Z_1):.2f}')
+        widgets['x_target'].config(text=f'{row[TARGET_X]:.2f}')
+        widgets['y_target'].config(text=f'{row[TARGET_Y]:.2f}')
+        widgets['z_target'].config(text=f'{row[TARGET_Z]:.2f}')
 
-    drone_2_x_target.config(text=f'{float(TARGET_X_2):.2f}')
-    drone_2_y_target.config(text=f'{float(TARGET_Y_2):.2f}')
-    drone_2_z_target.config(text=f'{float(TARGET_Z_2):.2f}')
+        widgets['rate'].config(text=link_summary(rates.get(drone.number, 0.0), statistics[drone.number]))
+        widgets['link'].config(text=link_quality(drone.number, now))
 
-    drone_3_x_target.config(text=f'{float(TARGET_X_3):.2f}')
-    drone_3_y_target.config(text=f'{float(TARGET_Y_3):.2f}')
-    drone_3_z_target.config(text=f'{float(TARGET_Z_3):.2f}')
+        # Setpoint round trip, red while the autopilot is chasing a different target
+        latency, drop_rate, diverged = target_monitor.summary(drone.number)
+        text = f'Setpoint latency {latency * 1000:.0f} ms, {drop_rate * 100:.0f}% dropped' + (' (DIVERGED)' if diverged else '')
+        widgets['targets'].config(text=text, foreground='red' if diverged else 'black')
+
+        # Telemetry age, red once the watchdog is worried
+        widgets['staleness'].config(text=watchdog.status(drone.number), foreground='red' if watchdog.level(drone.number) else 'black')
+
+    loop_rate_label.config(text=f'Flight loop {flight_clock.get_rate():.1f} Hz')
 
     window.after(500, update_current_coords)
 
 
-def update_drone_1_IP():
+def link_summary(rate, statistics):
+
     ################################################
-    # [no inputs or outputs]
+    # rate: float, received position rate in Hz [input]
+    # statistics: SetpointStatistics [input]
+    # text: string for the GUI [output]
     ################################################
-   
-    global drone_1_IP
-    global drone_1_IP_entry
-    global drone_1_UDP
-    global drone_1_UDP_entry
 
-    temp = drone_1_IP_entry.get()
+    return f'RX {rate:.1f} Hz | TX jitter {statistics.mean_jitter() * 1000:.1f} ms, {statistics.overruns} overruns'
 
-    if temp != "":
-        drone_1_IP = temp
 
-    temp = drone_1_UDP_entry.get()
+def link_quality(number, now):
 
-    if temp != "":
-        drone_1_UDP = temp
+    ################################################
+    # number: drone number [input]
+    # now: float, time.monotonic() [input]
+    # text: string for the GUI [output]
+    ################################################
 
-    print(str(drone_1_IP) + ":" + str(drone_1_UDP))
-    establish_connection(1, drone_1_IP, drone_1_UDP)
+    rate, loss, throughput = receiver.links.link(number, now)
+    jitter = receiver.links.stream(number, 'LOCAL_POSITION_NED', now)[1]
+    text = f'Link {loss * 100:.1f}% loss, {throughput / 1000:.1f} kB/s, position jitter {jitter * 1000:.1f} ms'
 
+    # Corrupted frames: BAD_DATA from pymavlink plus CRC failures in the fast decoder
+    errors = receiver.crc_errors(number)
+    if errors:
+        text += f', {errors} bad CRC'
+    return text
 
-def update_drone_2_IP():
+
+def update_drone_IP(number):
     ################################################
-    # [no inputs or outputs]
+    # number: drone number [input]
     ################################################
-   
-    global drone_2_IP
-    global drone_2_IP_entry
-    global drone_2_UDP
-    global drone_2_UDP_entry
 
-    temp = drone_2_IP_entry.get()
+    drone = fleet.get(number)
+
+    temp = drone.widgets['IP_entry'].get()
 
     if temp != "":
-        drone_2_IP = temp
+        drone.IP = temp
 
-    temp = drone_2_UDP_entry.get()
+    temp = drone.widgets['UDP_entry'].get()
 
     if temp != "":
-        drone_2_UDP = temp
-        
-    print(str(drone_2_IP) + ":" + str(drone_2_UDP))
-    establish_connection(2, drone_2_IP, drone_2_UDP)
+        drone.UDP = temp
 
+    print(str(drone.IP) + ":" + str(drone.UDP))
+    connect_drone(number)
 
-def update_drone_3_IP():
+
+def connect_all():
     ################################################
     # [no inputs or outputs]
     ################################################
-   
-    global drone_3_IP
-    global drone_3_IP_entry
-    global drone_3_UDP
-    global drone_3_UDP_entry
-
-    temp = drone_3_IP_entry.get()
-
-    if temp != "":
-        drone_3_IP = temp
 
-    temp = drone_3_UDP_entry.get()
-
-    if temp != "":
-        drone_3_UDP = temp
-        
-    print(str(drone_3_IP) + ":" + str(drone_3_UDP))
-    establish_connection(3, drone_3_IP, drone_3_UDP)
+    # All drones connect at the same time, so this takes one timeout, not one per drone
+    for drone in fleet:
+        if not drone.connection:
+            update_drone_IP(drone.number)
 
 
 def update_flight_mode(number, mode):
     ################################################
-    # number: 1 or 2, drone [input]
+    # number: drone number that requested it [input]
     # mode: 0-4, flight mode [input]
     ################################################
 
     global FLIGHT_MODE
-    global waypoints
 
-    
     FLIGHT_MODE = mode
     print("Flight Mode Updated: " + str(mode))
 
+    # Command every connected drone at once
     if mode == 4:
-        if drone1:
-            land(drone1)
-        if drone2:
-            land(drone2)
-        if drone3:
-            land(drone3)
+        command_fleet(land, "Land")
     else:
-        if drone1:
-            offboard(drone1)
-        if drone2:
-            offboard(drone2)
-        if drone3:
-            offboard(drone3)
-
-    waypoints = []
-
-
-def update_coords_drone_1():
-    ################################################
-    # [no inputs or outputs]
-    ################################################
-
-    global TARGET_X_1
-    global TARGET_Y_1
-    global TARGET_Z_1
-    TARGET_X_1=drone_1_x_entry.get()
-    TARGET_Y_1=drone_1_y_entry.get()
-    TARGET_Z_1=drone_1_z_entry.get()
+        command_fleet(offboard, "Offboard")
+
+    # Start a fresh path (this also rewinds every follower)
+    waypoints.clear()
+    simplifier.clear()
+
+    # DEMO mode flies the mission file; any other mode stops it
+    if mode == 3:
+        try:
+            missions.load(load_mission(os.path.join(os.getcwd(), MISSION_FILE)))
+        except (OSError, ValueError) as e:
+            print("Could not load mission (" + str(e) + ")")
+            missions.load({})
+    else:
+        missions.load({})
 
 
-def update_coords_drone_2():
+def update_coords(number, x_entry, y_entry, z_entry):
     ################################################
-    # [no inputs or outputs]
+    # number: drone number [input]
+    # x_entry, y_entry, z_entry: tkinter entries [input]
     ################################################
 
-    global TARGET_X_2
-    global TARGET_Y_2
-    global TARGET_Z_2
-    TARGET_X_2=drone_2_x_entry.get()
-    TARGET_Y_2=drone_2_y_entry.get()
-    TARGET_Z_2=drone_2_z_entry.get()
-
-
-def update_coords_drone_3():
-    ################################################
-    # [no inputs or outputs]
-    ################################################
+    try:
+        x = float(x_entry.get())
+        y = float(y_entry.get())
+        z = float(z_entry.get())
+    except ValueError:
+        print("Invalid target coordinates for drone " + str(number) + ".")
+        return
 
-    global TARGET_X_3
-    global TARGET_Y_3
-    global TARGET_Z_3
-    TARGET_X_3=drone_3_x_entry.get()
-    TARGET_Y_3=drone_3_y_entry.get()
-    TARGET_Z_3=drone_3_z_entry.get()
+    state.set_target(number, x, y, z)
 
 
 ###################################################################################################
@@ -717,128 +695,181 @@ def setup():
 
     global coordinates_file_name
     global waypoints_file_name
+    global coordinates_log_name
+    global waypoints_log_name
+    global link_file_name
+    global targets_file_name
+    global log_start
     
     # Initialize file names
     curr_time = datetime.now()
     coordinates_file_name = "./Recorded_Telemetry/" + "coordinates" + str(curr_time.year) + "_" + str(curr_time.month) + "_" + str(curr_time.day) + "_" + str(curr_time.hour) + "_" + str(curr_time.minute) + "_" + str(curr_time.second) + ".csv"
     waypoints_file_name = "./Recorded_Telemetry/" + "waypoints" + str(curr_time.year) + "_" + str(curr_time.month) + "_" + str(curr_time.day) + "_" + str(curr_time.hour) +  "_" + str(curr_time.minute) + "_" + str(curr_time.second) + ".csv"
 
+    # Link statistics: one row per drone link and message type every RATE_WINDOW
+    log_start = time.monotonic()
+    name = "./Recorded_Telemetry/" + "link" + str(curr_time.year) + "_" + str(curr_time.month) + "_" + str(curr_time.day) + "_" + str(curr_time.hour) + "_" + str(curr_time.minute) + "_" + str(curr_time.second) + ".csv"
+    logger.write(name, "t,drone,type,rate_hz,loss,jitter_ms,bytes_per_s,crc_errors\n")
+    link_file_name = name
+
+    # Setpoint latency and drop rate histograms, cumulative per drone every RATE_WINDOW
+    name = "./Recorded_Telemetry/" + "targets" + str(curr_time.year) + "_" + str(curr_time.month) + "_" + str(curr_time.day) + "_" + str(curr_time.hour) + "_" + str(curr_time.minute) + "_" + str(curr_time.second) + ".csv"
+    logger.write(name, target_monitor.csv_header())
+    targets_file_name = name
+
+    # Binary logs: header first, then one float64 record per sample
+    if BINARY_LOG:
+        coordinates_log_name = coordinates_file_name[:-len(".csv")] + ".bin"
+        waypoints_log_name = waypoints_file_name[:-len(".csv")] + ".bin"
+        logger.write(coordinates_log_name, flight_log.header_bytes('coordinates', fleet.numbers(), flight_log.COORDINATE_FIELDS, created=str(curr_time)))
+        logger.write(waypoints_log_name, flight_log.header_bytes('waypoints', [1], flight_log.WAYPOINT_FIELDS, created=str(curr_time)))
+
     # Begin our threads
     t1 = threading.Thread(target=telemetry_loop_thread, args=())
     t1.start()
-    t2 = threading.Thread(target=telemetry_local_position_thread, args=())
-    t2.start()
     t3 = threading.Thread(target=flight_loop_thread, args=())
     t3.start()
 
 
+def connect_drone(number):
+
+    ################################################
+    # number: drone number [input]
+    #
+    # Connects in the background; progress and the
+    # result are reported through connection_status.
+    ################################################
+
+    drone = fleet.get(number)
+    if drone.connecting:
+        return
+
+    drone.connecting = True
+    future = fleet.pool.submit(establish_connection, number, drone.IP, drone.UDP)
+    future.add_done_callback(lambda future: setattr(drone, 'connecting', False))
+
+
+def report_status(number, text):
+
+    ################################################
+    # number: drone number [input]
+    # text: string, connection status [input]
+    ################################################
+
+    print("[" + str(number) + "] " + text)
+    connection_status.put((number, text))
+
+
 def establish_connection(number, IP, UDP):
 
     ################################################
-    # drone1: mavlink connection [output] (via global)
-    # drone1: mavlink connection [output] (via global)
+    # number: drone number [input]
+    # IP: string, IP address to listen on [input]
+    # UDP: UDP port to listen on [input]
+    # connected: bool [output]
+    # fleet.get(number).connection: mavlink
+    #     connection [output]
     ################################################
 
-    global drone1
-    global drone2
-    global drone3
+    delay = CONNECT_BACKOFF
 
-    global CURRENT_X_1
-    global CURRENT_Y_1
-    global CURRENT_Z_1
-    global CURRENT_X_2
-    global CURRENT_Y_2
-    global CURRENT_Z_2
-    global CURRENT_X_3
-    global CURRENT_Y_3
-    global CURRENT_Z_3
+    for attempt in range(1, CONNECT_ATTEMPTS + 1):
+        report_status(number, "Connecting (attempt " + str(attempt) + " of " + str(CONNECT_ATTEMPTS) + ")")
 
-    if number == 1:
-        # Start a connection listening on a UDP port
-        drone1 = mavutil.mavlink_connection('udp:' + str(IP) + ':' + str(UDP))
+        try:
+            problem = try_connection(number, IP, UDP)
+        except Exception as e:
+            problem = str(e)
 
-        # Wait for the first heartbeat 
-        drone1.wait_heartbeat()
-        print("Heartbeat from system (system %u component %u)" % (drone1.target_system, drone1.target_component))
+        if problem is None:
+            report_status(number, "Connected")
+            return True
 
-        # Request target and local positions
-        request_local_NED(drone1)
-        request_target_pos_NED(drone1)
+        if attempt < CONNECT_ATTEMPTS:
+            report_status(number, problem + "; retrying in " + str(delay) + " s")
+            time.sleep(delay)
+            delay = delay * 2
 
-        # # Initialize current position
-        msg = drone1.recv_match(type='LOCAL_POSITION_NED', blocking=True).to_dict()
-        CURRENT_X_1 = msg["x"]
-        CURRENT_Y_1 = msg["y"]
-        CURRENT_Z_1 = msg["z"]
+    report_status(number, "Not connected: " + problem)
+    return False
 
 
-    elif number == 2:
-        # Start a connection listening on a UDP port
-        drone2 = mavutil.mavlink_connection('udp:' + str(IP) + ':' + str(UDP))
+def try_connection(number, IP, UDP):
 
-        # Wait for the first heartbeat 
-        drone2.wait_heartbeat()
-        print("Heartbeat from system (system %u component %u)" % (drone2.target_system, drone2.target_component))
-    
-        # Request target and local position
-        request_local_NED(drone2)
-        request_target_pos_NED(drone2)
+    ################################################
+    # number: drone number [input]
+    # IP: string, IP address to listen on [input]
+    # UDP: UDP port to listen on [input]
+    # problem: None if connected, otherwise a
+    #          string saying what went wrong [output]
+    ################################################
 
-        # Initialize current position
-        msg = drone2.recv_match(type='LOCAL_POSITION_NED', blocking=True).to_dict()
-        CURRENT_X_2 = msg["x"]
-        CURRENT_Y_2 = msg["y"]
-        CURRENT_Z_2 = msg["z"]
+    drone = fleet.get(number)
 
-    elif number == 3:
-        # Start a connection listening on a UDP port
-        drone3 = mavutil.mavlink_connection('udp:' + str(IP) + ':' + str(UDP))
+    # Start a connection listening on a UDP port
+    the_connection = mavutil.mavlink_connection('udp:' + str(IP) + ':' + str(UDP))
 
-        # Wait for the first heartbeat 
-        drone3.wait_heartbeat()
-        print("Heartbeat from system (system %u component %u)" % (drone3.target_system, drone3.target_component))
+    # Wait for the first heartbeat 
+    if the_connection.wait_heartbeat(timeout=HEARTBEAT_TIMEOUT) is None:
+        the_connection.close()
+        return "No heartbeat"
+    print("Heartbeat from system (system %u component %u)" % (the_connection.target_system, the_connection.target_component))
 
-        # Request target and local position
-        request_local_NED(drone3)
-        request_target_pos_NED(drone3)
+    # Request target and local positions at the rates this drone needs now
+    stream_control.reset(number)
+    stream_control.request(number, the_connection, time.monotonic())
 
-        # Initialize current position
-        msg = drone3.recv_match(type='LOCAL_POSITION_NED', blocking=True).to_dict()
-        CURRENT_X_3 = msg["x"]
-        CURRENT_Y_3 = msg["y"]
-        CURRENT_Z_3 = msg["z"]
+    # Hand the connection to the telemetry receiver
+    drone.connection = the_connection
+    receiver.add(number, the_connection)
 
+    # Initialize current position (set by handle_local_position)
+    if router.wait_for(number, 'LOCAL_POSITION_NED', timeout=POSITION_TIMEOUT) is None:
+        drone.connection = 0
+        receiver.remove(number)
+        return "No local position"
+
+    return None
 
-def arm(the_connection):
+
+def send_command(the_connection, command, *params):
 
     ################################################
     # the_connection: mavlink connection [input]
+    # command: MAV_CMD id [input]
+    # params: up to 7 float command parameters [input]
+    # future: Future resolved with the MAV_RESULT of
+    #         the matching COMMAND_ACK, or None if not
+    #         connected (see CommandTracker) [output]
     ################################################
 
-    # Arm the system
-    if the_connection:
-        the_connection.mav.command_long_send(the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0, 1, 0, 0, 0, 0, 0, 0)
+    if not the_connection:
+        return None
 
-        # Wait until arming confirmed (can manually check with the_connection.motors_armed())
-        # print("Waiting for the vehicle to arm")
-        # the_connection.motors_armed_wait()
-        # print('Armed!')
+    params = tuple(params) + (0,) * (7 - len(params))
+    return commands.send(the_connection, command, params)
 
 
-def disarm(the_connection):
+def arm(the_connection):
 
     ################################################
     # the_connection: mavlink connection [input]
+    # future: resolved by the COMMAND_ACK [output]
     ################################################
 
-    # Arm the system
-    if the_connection:
-        the_connection.mav.command_long_send(the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0, 0, 0, 0, 0, 0, 0, 0)
+    # Arm the system (check the_connection.motors_armed() for the result)
+    return send_command(the_connection, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 1)
+
+
+def disarm(the_connection):
+
+    ################################################
+    # the_connection: mavlink connection [input]
+    # future: resolved by the COMMAND_ACK [output]
+    ################################################
 
-        # Wait until arming confirmed (can manually check with the_connection.motors_armed())
-        print("Waiting for the vehicle to disarm")
-        the_connection.motors_disarmed_wait()
-        print('Disarmed!')
+    # Disarm the system
+    return send_command(the_connection, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0)
 
 
 def takeoff(the_connection, alt):
@@ -846,15 +877,23 @@ def takeoff(the_connection, alt):
     ################################################
     # the_connection: mavlink connection [input]
     # alt: float, target altitude [input] UNUSED
+    # future: resolved by the COMMAND_ACK [output]
     ################################################
 
     # Takeoff command
-    if the_connection:
-        the_connection.mav.command_long_send(the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, 0, 0, 0, 0, 0, 0, 0, alt)
+    return send_command(the_connection, mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, 0, 0, 0, 0, 0, 0, alt)
+
+
+def takeoff_drone(number, alt):
+
+    ################################################
+    # number: drone number [input]
+    # alt: float, target altitude [input]
+    # future: Future of the takeoff job [output]
+    ################################################
 
-    # Wait for acknowledge
-    # msg = the_connection.recv_match(type='COMMAND<ACK', blocking=True)
-    # print(msg)
+    # takeoff_CUSTOM waits for a fresh position, so it runs on the fleet pool
+    return fleet.pool.submit(takeoff_CUSTOM, fleet.connection(number), alt, number)
 
 
 def takeoff_CUSTOM(the_connection, alt, num):
@@ -865,89 +904,50 @@ def takeoff_CUSTOM(the_connection, alt, num):
     # num: drone number
     ################################################
 
-    global TARGET_X_1
-    global TARGET_Y_1
-    global TARGET_Z_1
-    global TARGET_X_2
-    global TARGET_Y_2
-    global TARGET_Z_2
-    global TARGET_X_3
-    global TARGET_Y_3
-    global TARGET_Z_3
-
     # Make sure we go up
     if alt > 0:
         alt = alt * -1
 
     # Initialize X, Y, Z
     if the_connection:
-        msg = the_connection.recv_match(type='LOCAL_POSITION_NED', blocking=True).to_dict()
-        x = msg["x"]
-        y = msg["y"]
-
-        if num == 1:
-            # Set initial target
-            TARGET_X_1 = x
-            TARGET_Y_1 = y
-            TARGET_Z_1 = alt
-        if num == 2:
-            # Set initial target
-            TARGET_X_2 = x
-            TARGET_Y_2 = y
-            TARGET_Z_2 = alt
-        if num == 3:
-            # Set initial target
-            TARGET_X_3 = x
-            TARGET_Y_3 = y
-            TARGET_Z_3 = alt
-
-        offboard(the_connection)
+        msg = router.wait_for(num, 'LOCAL_POSITION_NED', timeout=TAKEOFF_TIMEOUT)
+        if msg is None:
+            msg = router.latest(num, 'LOCAL_POSITION_NED')
+        if msg is None:
+            print("No local position from drone " + str(num) + ", not taking off.")
+            return
+        x = msg.x
+        y = msg.y
+
+        # Set initial target
+        state.set_target(num, x, y, alt)
+
+        return offboard(the_connection)
 
 
 def land(the_connection):
 
     ################################################
     # the_connection: mavlink connection [input]
+    # future: resolved by the COMMAND_ACK [output]
     ################################################
 
-    # Takeoff command
-    if the_connection:
-        the_connection.mav.command_long_send(the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_CMD_NAV_LAND, 0, 0, 0, 0, 0, 0, 0, 0)
-
-    # Wait for acknowledge
-    # msg = the_connection.recv_match(type='COMMAND<ACK', blocking=True)
-    # print(msg)
+    # Land command
+    return send_command(the_connection, mavutil.mavlink.MAV_CMD_NAV_LAND)
 
 
 def offboard(the_connection):
 
     ################################################
     # the_connection: mavlink connection [input]
-    # mode: int, id of the desired px4 mode [input]
+    # future: resolved by the COMMAND_ACK [output]
     ################################################
 
-    # master.mav.command_long_send( master.target_system, master.target_component, mavutil.mavlink.MAV_CMD_DO_SET_MODE, 0, 0, mode_id, 0, 0, 0, 0, 0)
+    # PX4 custom main mode 6 (offboard), with the custom mode flag set
+    return send_command(the_connection, mavutil.mavlink.MAV_CMD_DO_SET_MODE, 209, 6)
 
-    if (the_connection):
-        the_connection.mav.command_long_send(the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_CMD_DO_SET_MODE, 0, 209, 6, 0, 0, 0, 0, 0)
 
-    # while True:
-    #     # Wait for ACK command
-    #     # Would be good to add mechanism to avoid endlessly blocking
-    #     # if the autopilot sends a NACK or never receives the message
-    #     ack_msg = the_connection.recv_match(type='COMMAND_ACK', blocking=True)
-    #     ack_msg = ack_msg.to_dict()
-
-    #     # Continue waiting if the acknowledged command is not `set_mode`
-    #     if ack_msg['command'] != mavutil.mavlink.MAV_CMD_DO_SET_MODE:
-    #         continue
-
-    #     # Print the ACK result !
-    #     print(mavutil.mavlink.enums['MAV_RESULT'][ack_msg['result']].description)
-    #     break
-
-
-def update_target_ned(the_connection, x_val, y_val, z_val, yaw_in):
+def update_target_ned(the_connection, x_val, y_val, z_val, yaw_in, velocity=None, acceleration=None):
 
     ################################################
     # the_connection: mavlink connection [input]
@@ -955,341 +955,3517 @@ def update_target_ned(the_connection, x_val, y_val, z_val, yaw_in):
     # y_val: float, desired y target [input]
     # z_val: float, desired z target [input]
     # yaw_in:   float, desired yaw target [input]
+    # velocity: (vx, vy, vz) feed-forward, or None [input]
+    # acceleration: (ax, ay, az) feed-forward, or None [input]
     ################################################
 
+    type_mask = (
+        # mavutil.mavlink.POSITION_TARGET_TYPEMASK_X_IGNORE |
+        # mavutil.mavlink.POSITION_TARGET_TYPEMASK_Y_IGNORE |
+        # mavutil.mavlink.POSITION_TARGET_TYPEMASK_Z_IGNORE |
+        # DON'T mavutil.mavlink.POSITION_TARGET_TYPEMASK_FORCE_SET |
+        # mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_IGNORE |
+        mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_RATE_IGNORE)
+
+    # Feed-forward terms are only used by PX4 when their ignore bits are clear
+    if velocity is None:
+        velocity = (0, 0, 0)
+        type_mask |= (mavutil.mavlink.POSITION_TARGET_TYPEMASK_VX_IGNORE |
+                      mavutil.mavlink.POSITION_TARGET_TYPEMASK_VY_IGNORE |
+                      mavutil.mavlink.POSITION_TARGET_TYPEMASK_VZ_IGNORE)
+    if acceleration is None:
+        acceleration = (0, 0, 0)
+        type_mask |= (mavutil.mavlink.POSITION_TARGET_TYPEMASK_AX_IGNORE |
+                      mavutil.mavlink.POSITION_TARGET_TYPEMASK_AY_IGNORE |
+                      mavutil.mavlink.POSITION_TARGET_TYPEMASK_AZ_IGNORE)
+
     if the_connection:
-        the_connection.mav.set_position_target_local_ned_send(0, the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_FRAME_LOCAL_NED, type_mask=(
-                    # mavutil.mavlink.POSITION_TARGET_TYPEMASK_X_IGNORE |
-                    # mavutil.mavlink.POSITION_TARGET_TYPEMASK_Y_IGNORE |
-                    # mavutil.mavlink.POSITION_TARGET_TYPEMASK_Z_IGNORE |
-                    mavutil.mavlink.POSITION_TARGET_TYPEMASK_VX_IGNORE |
-                    mavutil.mavlink.POSITION_TARGET_TYPEMASK_VY_IGNORE |
-                    mavutil.mavlink.POSITION_TARGET_TYPEMASK_VZ_IGNORE |
-                    mavutil.mavlink.POSITION_TARGET_TYPEMASK_AX_IGNORE |
-                    mavutil.mavlink.POSITION_TARGET_TYPEMASK_AY_IGNORE |
-                    mavutil.mavlink.POSITION_TARGET_TYPEMASK_AZ_IGNORE |
-                    # DON'T mavutil.mavlink.POSITION_TARGET_TYPEMASK_FORCE_SET |
-                    # mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_IGNORE |
-                    mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_RATE_IGNORE), x=float(x_val), y=float(y_val), z=float(z_val), vx=0, vy=0, vz=0, afx=0, afy=0, afz=0, yaw=yaw_in, yaw_rate=0)
+        the_connection.mav.set_position_target_local_ned_send(0, the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_FRAME_LOCAL_NED, type_mask=type_mask,
+                    x=float(x_val), y=float(y_val), z=float(z_val), vx=float(velocity[0]), vy=float(velocity[1]), vz=float(velocity[2]),
+                    afx=float(acceleration[0]), afy=float(acceleration[1]), afz=float(acceleration[2]), yaw=yaw_in, yaw_rate=0)
 
     # if (FLIGHT_MODE != 1):
     #     print("TARGET: [" + str(x_val) + ", " + str(y_val) + ", " + str(z_val) + "]")
 
 
-def request_local_NED(the_connection):
+def request_local_NED(the_connection, rate):
 
     ################################################
     # the_connection: mavlink connection [input]
+    # rate: float, LOCAL_POSITION_NED messages per
+    #       second [input]
     ################################################
 
-    if the_connection:
-        the_connection.mav.command_long_send(the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, 0, mavutil.mavlink.MAVLINK_MSG_ID_LOCAL_POSITION_NED, 5e6/20, 0, 0, 0, 0, 0)
+    return send_command(the_connection, mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, mavutil.mavlink.MAVLINK_MSG_ID_LOCAL_POSITION_NED, 1e6 / rate)
 
 
-def request_target_pos_NED(the_connection):
+def request_target_pos_NED(the_connection, rate):
 
     ################################################
     # the_connection: mavlink connection [input]
+    # rate: float, POSITION_TARGET_LOCAL_NED messages
+    #       per second [input]
     ################################################
 
-    if the_connection:
-        the_connection.mav.command_long_send(the_connection.target_system, the_connection.target_component, mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, 0, mavutil.mavlink.MAVLINK_MSG_ID_POSITION_TARGET_LOCAL_NED, 4e6/20, 0, 0, 0, 0, 0)
+    return send_command(the_connection, mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, mavutil.mavlink.MAVLINK_MSG_ID_POSITION_TARGET_LOCAL_NED, 1e6 / rate)
 
 
-# def telemetry_loop_thread(the_connection_1, the_connection_2, the_connection_3):
-def telemetry_loop_thread():
+class Drone:
 
     ################################################
-    # SUMMARY: telemtry_loop_thread continually sends
-    #          target coordinates for the drones
-    #          to navigate towards in offboard mode.
-    #
-    # the_connection: mavlink connection [input]
+    # One vehicle in the fleet: its number, GUI
+    # name, address, mavlink connection (0 until
+    # connected), connection state and GUI widgets.
     ################################################
 
-    global TARGET_X_1
-    global TARGET_Y_1
-    global TARGET_Z_1
-    global TARGET_X_2
-    global TARGET_Y_2
-    global TARGET_Z_2
-    global TARGET_X_3
-    global TARGET_Y_3
-    global TARGET_Z_3
+    def __init__(self, number, name, IP, UDP):
+        self.number = number
+        self.name = name
+        self.IP = IP
+        self.UDP = UDP
+        self.connection = 0
+        self.connecting = False                 # True while establish_connection runs
+        self.widgets = {}
 
-    while SEND_TELEMETRY:
-        # print("TARGET: " + str(TARGET_X_1)) #DEBUG
-
-        if drone1:
-            update_target_ned(drone1, float(TARGET_X_1), float(TARGET_Y_1), float(TARGET_Z_1), float(TARGET_YAW_1))
-            # print('TARGET: ' + str(TARGET_X_1) + ' ' + str(TARGET_Y_1) + ' ' + str(TARGET_Z_1))
-        if drone2:
-            update_target_ned(drone2, float(TARGET_X_2), float(TARGET_Y_2), float(TARGET_Z_2), float(TARGET_YAW_2))
-            # print('TARGET 2: ' + str(TARGET_X_2) + ' ' + str(TARGET_Y_2) + ' ' + str(TARGET_Z_2))
-        if drone3:
-            update_target_ned(drone3, float(TARGET_X_3), float(TARGET_Y_3), float(TARGET_Z_3), float(TARGET_YAW_3))
-            # print('TARGET 3: ' + str(TARGET_X_3) + ' ' + str(TARGET_Y_3) + ' ' + str(TARGET_Z_3))
+    def is_leader(self):
+        return self.number == 1
 
-    return 0
 
+class Fleet:
 
-# def telemetry_local_position_thread(the_connection_1, the_connection_2, the_connection_3):
-def telemetry_local_position_thread():
+    ############################################################
+    # SUMMARY: Fleet is the registry of every drone the ground #
+    #          station knows about, built from DRONES. Drones  #
+    #          are numbered from 1 in DRONES order. A shared   #
+    #          worker pool runs the slow per-drone jobs        #
+    #          (connecting, takeoff) for every vehicle at once #
+    #          instead of one after another.                   #
+    ############################################################
+
+    def __init__(self, definitions):
+
+        ################################################
+        # definitions: list of (name, IP, UDP) [input]
+        ################################################
+
+        self.drones = {}
+        for i, (name, IP, UDP) in enumerate(definitions):
+            self.drones[i + 1] = Drone(i + 1, name, IP, UDP)
+        self.pool = ThreadPoolExecutor(max_workers=max(FLEET_WORKERS, len(self.drones)))
+
+    def __iter__(self):
+        return iter(self.drones.values())
+
+    def __len__(self):
+        return len(self.drones)
+
+    def get(self, number):
+        return self.drones[number]
+
+    def numbers(self):
+        return list(self.drones)
+
+    def connection(self, number):
+
+        ################################################
+        # number: drone number [input]
+        # the_connection: mavlink connection, or 0 if
+        #                 not connected [output]
+        ################################################
+
+        drone = self.drones.get(number)
+        if drone is None:
+            return 0
+        return drone.connection
+
+
+class DroneState:
 
     ############################################################
-    # SUMMARY: telemetry_local_position_thread continually     #
-    #          updates the local position coordinates of up    #
-    #          to two drones.                                  #
-    #                                                          #
-    # the_connection_1: mavlink connection for drone 1 [input] #
+    # SUMMARY: DroneState holds the current and target state   #
+    #          of every drone in one NumPy array of shape      #
+    #          (drones, STATE_FIELDS); drone n is row n - 1.   #
+    #          Writers are serialised by a lock and bump a     #
+    #          sequence counter before and after each write    #
+    #          (a seqlock), so readers never block: they copy  #
+    #          the array and retry if a write overlapped. A    #
+    #          snapshot is therefore one consistent sample of  #
+    #          all vehicles.                                   #
     ############################################################
 
-    global CURRENT_X_1
-    global CURRENT_Y_1
-    global CURRENT_Z_1
-    global CURRENT_X_2
-    global CURRENT_Y_2
-    global CURRENT_Z_2
-    global CURRENT_X_3
-    global CURRENT_Y_3
-    global CURRENT_Z_3
-    
-    global CURRENT_VELOCITY_X_1
-    global CURRENT_VELOCITY_Y_1
-    global CURRENT_VELOCITY_Z_1
-    global CURRENT_VELOCITY_X_2
-    global CURRENT_VELOCITY_Y_2
-    global CURRENT_VELOCITY_Z_2
-
-    # request_local_NED(the_connection_1)
-    # request_target_pos_NED(the_connection_1)
-    
-    new_message = False
+    def __init__(self, count):
 
-    while 1:
-        #print('test')
-        if drone1:
-            try:
-                # msg = the_connection_1.messages['LOCAL_POSITION_NED']
-                msg = drone1.recv_match(type='LOCAL_POSITION_NED', blocking=True)
-                CURRENT_X_1 = msg.x
-                CURRENT_Y_1 = msg.y
-                CURRENT_Z_1 = msg.z
-                CURRENT_VELOCITY_X_1 = msg.vx
-                CURRENT_VELOCITY_Y_1 = msg.vy
-                CURRENT_VELOCITY_Z_1 = msg.vz
-                # print(str(msg.x) + " " + str(msg.y) + " " + str(msg.z))
-                new_message = True
-            except:
-                # print("Problem receiving LOCAL_POSITION_NED Mav message: 1.")
-                pass
-        if drone2:
-            try:
-                msg = drone2.recv_match(type='LOCAL_POSITION_NED', blocking=True)
-                CURRENT_X_2 = msg.x
-                CURRENT_Y_2 = msg.y
-                CURRENT_Z_2 = msg.z
-                CURRENT_VELOCITY_X_2 = msg.vx
-                CURRENT_VELOCITY_Y_2 = msg.vy
-                CURRENT_VELOCITY_Z_2 = msg.vz
-                # print(str(msg.x) + " " + str(msg.y) + " " + str(msg.z))
-                new_message = True
-            except:
-                print("Problem receiving LOCAL_POSITION_NED Mav message: 2.")
-        if drone3:
-            try:
-                msg = drone3.recv_match(type='LOCAL_POSITION_NED', blocking=True)
-                CURRENT_X_3 = msg.x
-                CURRENT_Y_3 = msg.y
-                CURRENT_Z_3 = msg.z
-                # CURRENT_VELOCITY_X_3 = msg.vx
-                # print(str(msg.x) + " " + str(msg.y) + " " + str(msg.z))
-                new_message = True
-            except:
-                print("Problem receiving LOCAL_POSITION_NED Mav message: 3.")
-
-        # Write coordinates to a text file
-        if new_message:
-            with open(coordinates_file_name, 'a') as f:
-                f.write(f"{CURRENT_X_1},{CURRENT_Y_1},{CURRENT_Z_1},")
-                f.write(f"{CURRENT_X_2},{CURRENT_Y_2},{CURRENT_Z_2},")
-                f.write(f"{CURRENT_VELOCITY_X_1},{CURRENT_VELOCITY_Y_1},{CURRENT_VELOCITY_Z_1},")#velocity drone 1 to file Amber added 2/4
-                f.write(f"{CURRENT_VELOCITY_X_2},{CURRENT_VELOCITY_Y_2},{CURRENT_VELOCITY_Z_2}\n")#velocity drone 2 to file Amber added 2/4
-            new_message = False
-    
-             
+        ################################################
+        # count: number of drones [input]
+        ################################################
 
-def flight_loop_thread():
-    ################################################
-    # [no inputs or outputs]
-    ################################################
+        self.data = np.zeros((count, STATE_FIELDS))
+        self.data[:, TARGET_Z] = DEFAULT_TARGET_Z
+        self.data[:, TARGET_VX:TARGET_AZ + 1] = np.nan
+        self.held = np.zeros(count, dtype=bool) # True while the watchdog holds a drone
+        self.sequence = 0                       # odd while a write is in progress
+        self.lock = threading.RLock()
 
-    global TARGET_X_1
-    global TARGET_Y_1
-    global TARGET_Z_1
-    global TARGET_X_2
-    global TARGET_Y_2
-    global TARGET_Z_2
-    global TARGET_X_3
-    global TARGET_Y_3
-    global TARGET_Z_3
-    global PREV_LEADER_X
-    global PREV_LEADER_Y
-    global PREV_LEADER_Z
-    global SEND_TELEMETRY
-    global waypoints
+    def write(self, number, first, values):
 
-    waypoint_location_2 = 0
-    waypoint_location_3 = 0
+        ################################################
+        # number: drone number [input]
+        # first: first column to write [input]
+        # values: sequence of values for consecutive
+        #         columns starting at first [input]
+        ################################################
 
-    # Note: In order for PX4 to remain in offboard mode, it needs to receive target commands
-    # at a rate of at least 2 Hz.
+        with self.lock:
+            self.sequence += 1
+            self.data[number - 1, first:first + len(values)] = values
+            self.sequence += 1
+
+    def set_position(self, number, x, y, z, vx, vy, vz, time_boot_ms, received):
+        self.write(number, X, (x, y, z, vx, vy, vz, time_boot_ms, received))
+
+    def set_target(self, number, x, y, z, yaw=None, velocity=None, acceleration=None):
+
+        ################################################
+        # yaw: None keeps the current target yaw [input]
+        # velocity, acceleration: (x, y, z) feed-forward
+        #     sent with this target; None sends none [input]
+        ################################################
+
+        velocity = (np.nan, np.nan, np.nan) if velocity is None else tuple(velocity)
+        acceleration = (np.nan, np.nan, np.nan) if acceleration is None else tuple(acceleration)
+
+        with self.lock:
+            # A held drone keeps its hold target (see hold)
+            if self.held[number - 1]:
+                return
+            if yaw is None:
+                yaw = self.data[number - 1, TARGET_YAW]
+            self.write(number, TARGET_X, (x, y, z, yaw) + velocity + acceleration)
+
+    def hold(self, number):
+
+        ################################################
+        # number: drone number [input]
+        #
+        # Targets the drone's last known position and
+        # ignores set_target until release().
+        ################################################
+
+        with self.lock:
+            self.held[number - 1] = False
+            row = self.data[number - 1]
+            self.set_target(number, row[X], row[Y], row[Z])
+            self.held[number - 1] = True
+
+    def release(self, number):
+
+        ################################################
+        # number: drone number [input]
+        ################################################
+
+        with self.lock:
+            self.held[number - 1] = False
+
+    def snapshot(self):
+
+        ################################################
+        # snapshot: np.ndarray copy of every drone's
+        #           row, consistent across drones [output]
+        ################################################
+
+        while True:
+            sequence = self.sequence
+            if sequence & 1:
+                # Writer mid-update; let it finish
+                time.sleep(0)
+                continue
+            snapshot = self.data.copy()
+            if self.sequence == sequence:
+                return snapshot
+
+    def get(self, number):
+
+        ################################################
+        # number: drone number [input]
+        # row: np.ndarray copy of that drone's row [output]
+        ################################################
+
+        return self.snapshot()[number - 1]
+
+
+class SetpointScheduler:
 
     ############################################################
-    # NAVIGATION                                               #
+    # SUMMARY: SetpointScheduler sends each drone's setpoint   #
+    #          at a fixed rate using absolute deadlines        #
+    #          (start + k * period), so timing errors never    #
+    #          accumulate. Jitter (how late each send was) and #
+    #          overruns (whole periods missed) are recorded    #
+    #          per drone so the rate can be tuned per link.    #
     ############################################################
 
-    while 1:
+    def __init__(self, numbers, send):
 
-        # TEST MODE
-        if (FLIGHT_MODE == 0):
-            # Test mode
-            TARGET_X_1 = TEST_MODE_X
-            TARGET_Y_1 = TEST_MODE_Y
-            TARGET_Z_1 = TEST_MODE_Z
+        ################################################
+        # numbers: list of drone numbers [input]
+        # send: function(number), sends one setpoint [input]
+        ################################################
 
-        # MANUAL MODE
-        elif (FLIGHT_MODE == 1):
-            pass
+        self.send = send
+        self.deadlines = []                     # heap of (deadline, number)
+        self.periods = {}                       # drone number -> period (s)
+        self.statistics = {}                    # drone number -> SetpointStatistics
 
-        # AUTONOMOUS MODE
-        elif (FLIGHT_MODE == 2):
+        now = time.monotonic()
+        for number in numbers:
+            self.periods[number] = 1.0 / self.rate_for(number)
+            self.statistics[number] = SetpointStatistics()
+            heapq.heappush(self.deadlines, (now, number))
 
-            # Set target to current waypoint
-            if (len(waypoints) > 6):
-                TARGET_X_2 = (waypoints[waypoint_location_2])[0]
-                TARGET_Y_2 = (waypoints[waypoint_location_2])[1]
-                TARGET_Z_2 = (waypoints[waypoint_location_2])[2]
-
-            # if (waypoint_location_2 > 0):
-            #     TARGET_X_3 = (waypoints[waypoint_location_3])[0]
-            #     TARGET_Y_3 = (waypoints[waypoint_location_3])[1]
-            #     TARGET_Z_3 = (waypoints[waypoint_location_3])[2]
-
-            # If follower has reached the waypoint, go to next waypoint
-            if ((float(CURRENT_X_2) - float(TARGET_X_2))**2 + (float(CURRENT_Y_2) - float(TARGET_Y_2))**2 + (float(CURRENT_Z_2) - float(TARGET_Z_2))**2)**.5 < .15:
-                if (len(waypoints) > waypoint_location_2+7):
-                    print("[2] Reached waypoint " + str(waypoint_location_2) + ": " + str(TARGET_X_2) + " " + str(TARGET_Y_2) + " " + str(TARGET_Z_2))
-                    waypoint_location_2 = waypoint_location_2 + 1
-            # if ((float(CURRENT_X_3) - float(TARGET_X_3))**2 + (float(CURRENT_Y_3) - float(TARGET_Y_3))**2 + (float(CURRENT_Z_3) - float(TARGET_Z_3))**2)**.5 < .3:
-            #     if (waypoint_location_2 > waypoint_location_3+2):
-            #         print("[3] Reached waypoint " + str(waypoint_location_3) + ": " + str(TARGET_X_3) + " " + str(TARGET_Y_3) + " " + str(TARGET_Z_3))
-            #         waypoint_location_3 = waypoint_location_3 + 1
-
-            # If leader has traveled more than 1 meter, add a new waypoint
-            if ((CURRENT_X_1 - PREV_LEADER_X)**2 + (CURRENT_Y_1 - PREV_LEADER_Y)**2 + (CURRENT_Z_1 - PREV_LEADER_Z)**2)**.5 > .35:
-                waypoints.append((CURRENT_X_1, CURRENT_Y_1, CURRENT_Z_1))
-                
-                # Record previous position
-                PREV_LEADER_X = CURRENT_X_1
-                PREV_LEADER_Y = CURRENT_Y_1
-                PREV_LEADER_Z = CURRENT_Z_1
+    def rate_for(self, number):
 
-                # Record new waypoint
-                print("New waypoint + " + str(len(waypoints)) + ": " + str(CURRENT_X_1) + " " + str(CURRENT_Y_1) + " " + str(CURRENT_Z_1))
-                f = open(waypoints_file_name, 'a')
-                f.write(str(CURRENT_X_1) + "," + str(CURRENT_Y_1) + "," + str(CURRENT_Z_1) + "\n")
-                f.close()
+        ################################################
+        # number: drone number [input]
+        # rate: float, setpoint rate in Hz [output]
+        ################################################
 
-                # Set follower to a new waypoint (DEBUG)
-                # if len(waypoints) > 4:
-                #     TARGET_X_2 = (waypoints[len(waypoints) - 4])[0]
-                #     TARGET_Y_2 = (waypoints[len(waypoints) - 4])[1]
-                #     TARGET_Z_2 = (waypoints[len(waypoints) - 4])[2]
+        rate = SETPOINT_RATES.get(number, SETPOINT_RATE)
+        if rate <= OFFBOARD_MIN_RATE:
+            print("Setpoint rate for drone " + str(number) + " must exceed " + str(OFFBOARD_MIN_RATE) + " Hz; using " + str(SETPOINT_RATE) + " Hz.")
+            rate = SETPOINT_RATE
+        return rate
 
+    def step(self):
 
-        # DEMO MODE
-        elif (FLIGHT_MODE == 3 and drone1 and drone2):
-
-            TARGET_X_1 = 0
-            TARGET_Y_1 = 0
-            TARGET_Z_1 = -1
-            time.sleep(15)
-
-            TARGET_X_1 = 1
-            TARGET_Y_1 = 1
-            TARGET_Z_1 = -1
-            time.sleep(8)
-            # while( (x - TARGET_X_1) > .1 and (y - TARGET_Y_1) > 0.1 ):
-                # msg = drone1.messages['LOCAL_POSITION_NED']
-                # x = msg.x
-                # y = msg.y
-                # z = msg.z
-            land(drone1)
-            time.sleep(5)
-            takeoff_CUSTOM(drone1, 1)
-            time.sleep(5)
-
-            TARGET_X_1 = -1
-            TARGET_Y_1 = 1
-            TARGET_Z_1 = -1
-            time.sleep(8)
-            # while( (x - TARGET_X_1) > .1 and (y - TARGET_Y_1) > 0.1 ):
-                # msg = drone1.messages['LOCAL_POSITION_NED']
-                # x = msg.x
-                # y = msg.y
-                # z = msg.z
-            land(drone1)
-            time.sleep(5)
-            takeoff_CUSTOM(drone1, 1)
-            time.sleep(5)
-
-            TARGET_X_1 = -1
-            TARGET_Y_1 = -1
-            TARGET_Z_1 = -1
-            time.sleep(8)
-            # while( (x - TARGET_X_1) > .1 and (y - TARGET_Y_1) > 0.1 ):
-                # msg = drone1.messages['LOCAL_POSITION_NED']
-                # x = msg.x
-                # y = msg.y
-                # z = msg.z
-            land(drone1)
-            time.sleep(5)
-            takeoff_CUSTOM(drone1, 1)
-            time.sleep(5)
-
-            TARGET_X_1 = 1
-            TARGET_Y_1 = -1
-            TARGET_Z_1 = -1
-            time.sleep(8)
-            # while( (x - TARGET_X_1) > .1 and (y - TARGET_Y_1) > 0.1 ):
-                # msg = drone1.messages['LOCAL_POSITION_NED']
-                # x = msg.x
-                # y = msg.y
-                # z = msg.z
-            land(drone1)
-            time.sleep(5)
-            takeoff_CUSTOM(drone1, 1)
-            time.sleep(5)
-
-            TARGET_X_1 = 0
-            TARGET_Y_1 = 0
-            TARGET_Z_1 = -1
-            time.sleep(8)
-            # while( (x - TARGET_X_1) > .1 and (y - TARGET_Y_1) > 0.1 ):
-                # msg = drone1.messages['LOCAL_POSITION_NED']
-                # x = msg.x
-                # y = msg.y
-                # z = msg.z
-            land(drone1)
+        ################################################
+        # Sleeps until the earliest deadline, sends that
+        # drone's setpoint and schedules its next one.
+        ################################################
 
-        # OFF
-        elif(FLIGHT_MODE == 4):
-            pass
+        deadline, number = heapq.heappop(self.deadlines)
 
-        else:
-            print("FLIGHT MODE NOT RECOGNIZED OR DRONES NOT CONNECTED.")
-            return
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        sent_at = time.monotonic()
+        self.send(number)
+
+        # Next deadline is absolute; skip any periods we have already missed
+        period = self.periods[number]
+        missed = int((sent_at - deadline) // period)
+        self.statistics[number].record(sent_at - deadline, missed)
+        heapq.heappush(self.deadlines, (deadline + (missed + 1) * period, number))
+
+    def get_statistics(self):
+
+        ################################################
+        # statistics: dict, drone number ->
+        #             SetpointStatistics [output]
+        ################################################
+
+        return dict(self.statistics)
+
+
+class SetpointStatistics:
+
+    ################################################
+    # Jitter and overrun counters for one drone.
+    ################################################
+
+    def __init__(self):
+        self.sends = 0                          # setpoints sent
+        self.overruns = 0                       # periods skipped because a send was late
+        self.jitter_total = 0.0                 # sum of lateness (s)
+        self.jitter_max = 0.0                   # worst lateness (s)
+
+    def record(self, lateness, missed):
+        self.sends += 1
+        self.overruns += missed
+        self.jitter_total += lateness
+        if lateness > self.jitter_max:
+            self.jitter_max = lateness
+
+    def mean_jitter(self):
+        if self.sends == 0:
+            return 0.0
+        return self.jitter_total / self.sends
+
+
+def send_setpoint(number):
+
+    ################################################
+    # number: drone number to send a setpoint to [input]
+    ################################################
+
+    the_connection = fleet.connection(number)
+    if the_connection:
+        row = state.get(number)
+        velocity = None if np.isnan(row[TARGET_VX]) else row[TARGET_VX:TARGET_VZ + 1]
+        acceleration = None if np.isnan(row[TARGET_AX]) else row[TARGET_AX:TARGET_AZ + 1]
+        update_target_ned(the_connection, row[TARGET_X], row[TARGET_Y], row[TARGET_Z], row[TARGET_YAW], velocity, acceleration)
+        target_monitor.sent(number, row[TARGET_X], row[TARGET_Y], row[TARGET_Z], time.monotonic())
+
+
+def telemetry_loop_thread():
+
+    ################################################
+    # SUMMARY: telemtry_loop_thread continually sends
+    #          target coordinates for the drones
+    #          to navigate towards in offboard mode,
+    #          at the rate set by SETPOINT_RATE.
+    ################################################
+
+    while SEND_TELEMETRY:
+        try:
+            scheduler.step()
+        except Exception as e:
+            print("Problem sending setpoint (" + str(e) + ")")
+
+    return 0
+
+
+class MavlinkRouter:
+
+    ############################################################
+    # SUMMARY: MavlinkRouter fans every decoded message out to #
+    #          the handlers registered for its type, so each   #
+    #          message is read and decoded exactly once no     #
+    #          matter how many consumers need it. Threads that #
+    #          need a specific message can block on wait_for() #
+    #          instead of reading the socket themselves.       #
+    ############################################################
+
+    def __init__(self):
+        self.handlers = {}                      # message type -> list of handler(number, msg)
+        self.last = {}                          # (number, message type) -> latest message
+        self.updated = {}                       # (number, message type) -> time.monotonic() it arrived
+        self.waiters = {}                       # (number, message type) -> list of [event, msg]
+        self.lock = threading.Lock()
+
+    def register(self, msg_type, handler):
+
+        ################################################
+        # msg_type: string, e.g. 'LOCAL_POSITION_NED' [input]
+        # handler: function(number, msg) [input]
+        ################################################
+
+        self.handlers.setdefault(msg_type, []).append(handler)
+
+    def dispatch(self, number, msg):
+
+        ################################################
+        # number: drone number the message came from [input]
+        # msg: decoded mavlink message [input]
+        ################################################
+
+        msg_type = msg.get_type()
+        key = (number, msg_type)
+
+        # Companion computers, MAVProxy and other GCSs heartbeat on the same link;
+        # only the autopilot's HEARTBEAT says whether the vehicle is armed and alive
+        if msg_type == 'HEARTBEAT' and not autopilot_heartbeat(number, msg):
+            key = (number, msg_type, msg.get_srcSystem(), msg.get_srcComponent())
+
+        self.last[key] = msg
+        self.updated[key] = time.monotonic()
+
+        for handler in self.handlers.get(msg_type, ()):
+            try:
+                handler(number, msg)
+            except Exception as e:
+                print("Problem handling " + msg_type + " from drone " + str(number) + " (" + str(e) + ")")
+
+        # Wake up anyone waiting for this message
+        if self.waiters:
+            with self.lock:
+                waiters = self.waiters.pop(key, ())
+            for waiter in waiters:
+                waiter[1] = msg
+                waiter[0].set()
+
+    def age(self, number, msg_type, now=None):
+
+        ################################################
+        # number: drone number [input]
+        # msg_type: string [input]
+        # now: float, time.monotonic() [input]
+        # age: float seconds since the last message of
+        #      that type, or None if none yet [output]
+        ################################################
+
+        updated = self.updated.get((number, msg_type))
+        if updated is None:
+            return None
+        return (time.monotonic() if now is None else now) - updated
+
+    def latest(self, number, msg_type):
+
+        ################################################
+        # number: drone number [input]
+        # msg_type: string [input]
+        # msg: latest message of that type or None [output]
+        ################################################
+
+        return self.last.get((number, msg_type))
+
+    def wait_for(self, number, msg_type, timeout=None):
+
+        ################################################
+        # number: drone number [input]
+        # msg_type: string [input]
+        # timeout: float seconds, None waits forever [input]
+        # msg: next message of that type or None [output]
+        ################################################
+
+        waiter = [threading.Event(), None]
+        with self.lock:
+            self.waiters.setdefault((number, msg_type), []).append(waiter)
+
+        if not waiter[0].wait(timeout):
+            with self.lock:
+                waiters = self.waiters.get((number, msg_type), [])
+                if waiter in waiters:
+                    waiters.remove(waiter)
+        return waiter[1]
+
+
+LOCAL_POSITION_NED_STRUCT = struct.Struct('<Iffffff')
+POSITION_TARGET_LOCAL_NED_STRUCT = struct.Struct('<IfffffffffffHB')
+HEARTBEAT_STRUCT = struct.Struct('<IBBBBB')
+COMMAND_ACK_STRUCT = struct.Struct('<HBBiBB')
+
+
+class FastMessage:
+
+    ################################################
+    # Preallocated, reusable stand-in for a pymavlink
+    # message. One exists per drone per message type
+    # and is overwritten in place by every new packet,
+    # so handlers must copy any values they keep.
+    ################################################
+
+    __slots__ = ('msgname', 'seq', 'srcSystem', 'srcComponent', 'size',
+                 'time_boot_ms', 'x', 'y', 'z', 'vx', 'vy', 'vz', 'afx', 'afy', 'afz', 'yaw', 'yaw_rate',
+                 'type_mask', 'coordinate_frame',
+                 'custom_mode', 'type', 'autopilot', 'base_mode', 'system_status', 'mavlink_version',
+                 'command', 'result', 'progress', 'result_param2', 'target_system', 'target_component')
+
+    def __init__(self, msgname):
+        self.msgname = msgname
+        self.seq = 0
+        self.srcSystem = 0
+        self.srcComponent = 0
+        self.size = 0                           # bytes in the whole frame
+
+    def get_type(self):
+        return self.msgname
+
+    def get_seq(self):
+        return self.seq
+
+    def get_srcSystem(self):
+        return self.srcSystem
+
+    def get_srcComponent(self):
+        return self.srcComponent
+
+
+def unpack_local_position(msg, payload):
+    (msg.time_boot_ms, msg.x, msg.y, msg.z, msg.vx, msg.vy, msg.vz) = LOCAL_POSITION_NED_STRUCT.unpack_from(payload)
+
+
+def unpack_position_target(msg, payload):
+    (msg.time_boot_ms, msg.x, msg.y, msg.z, msg.vx, msg.vy, msg.vz, msg.afx, msg.afy, msg.afz,
+     msg.yaw, msg.yaw_rate, msg.type_mask, msg.coordinate_frame) = POSITION_TARGET_LOCAL_NED_STRUCT.unpack_from(payload)
+
+
+def unpack_heartbeat(msg, payload):
+    (msg.custom_mode, msg.type, msg.autopilot, msg.base_mode, msg.system_status, msg.mavlink_version) = HEARTBEAT_STRUCT.unpack_from(payload)
+
+
+def unpack_command_ack(msg, payload):
+    (msg.command, msg.result, msg.progress, msg.result_param2, msg.target_system, msg.target_component) = COMMAND_ACK_STRUCT.unpack_from(payload)
+
+
+# message id: (name, payload struct, CRC extra byte, unpack function)
+FAST_MESSAGES = {
+    mavutil.mavlink.MAVLINK_MSG_ID_LOCAL_POSITION_NED: ('LOCAL_POSITION_NED', LOCAL_POSITION_NED_STRUCT, 185, unpack_local_position),
+    mavutil.mavlink.MAVLINK_MSG_ID_POSITION_TARGET_LOCAL_NED: ('POSITION_TARGET_LOCAL_NED', POSITION_TARGET_LOCAL_NED_STRUCT, 140, unpack_position_target),
+    mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT: ('HEARTBEAT', HEARTBEAT_STRUCT, 50, unpack_heartbeat),
+    mavutil.mavlink.MAVLINK_MSG_ID_COMMAND_ACK: ('COMMAND_ACK', COMMAND_ACK_STRUCT, 143, unpack_command_ack),
+}
+
+
+class FastMavlinkDecoder:
+
+    ############################################################
+    # SUMMARY: FastMavlinkDecoder splits a UDP datagram into   #
+    #          MAVLink v1/v2 frames, checks the header and CRC #
+    #          of the few messages the ground station consumes #
+    #          (FAST_MESSAGES) and unpacks their payload       #
+    #          straight into preallocated FastMessage records. #
+    #          Any other frame is handed to pymavlink.         #
+    ############################################################
+
+    def __init__(self):
+        self.records = {}                       # (number, message id, system, component) -> FastMessage
+        self.crc_errors = {}                    # drone number -> frames dropped for a bad CRC
+
+    def record_for(self, number, msgid, system, component):
+
+        ################################################
+        # number: drone number [input]
+        # msgid: MAVLink message id [input]
+        # system, component: sender of the frame [input]
+        # msg: FastMessage for that drone/type/sender [output]
+        #
+        # Senders get their own records so that e.g. a
+        # companion computer's HEARTBEAT can't overwrite
+        # the autopilot's one the router keeps.
+        ################################################
+
+        key = (number, msgid, system, component)
+        msg = self.records.get(key)
+        if msg is None:
+            msg = FastMessage(FAST_MESSAGES[msgid][0])
+            self.records[key] = msg
+        return msg
+
+    def decode(self, number, data, the_connection):
+
+        ################################################
+        # number: drone number the datagram came from [input]
+        # data: bytes, one UDP datagram [input]
+        # the_connection: mavlink connection, used for
+        #                 messages we do not fast-path [input]
+        # messages: list of decoded messages [output]
+        ################################################
+
+        messages = []
+        offset = 0
+        end = len(data)
+
+        while offset < end:
+            magic = data[offset]
+
+            if magic == 0xFD and offset + 10 <= end:
+                # MAVLink 2: magic, len, incompat, compat, seq, sys, comp, msgid (3 bytes)
+                length = data[offset + 1]
+                seq = data[offset + 4]
+                system = data[offset + 5]
+                component = data[offset + 6]
+                msgid = data[offset + 7] | (data[offset + 8] << 8) | (data[offset + 9] << 16)
+                header = 10
+                signature = 13 if data[offset + 2] & 0x01 else 0
+            elif magic == 0xFE and offset + 6 <= end:
+                # MAVLink 1: magic, len, seq, sys, comp, msgid
+                length = data[offset + 1]
+                seq = data[offset + 2]
+                system = data[offset + 3]
+                component = data[offset + 4]
+                msgid = data[offset + 5]
+                header = 6
+                signature = 0
+            else:
+                # Not at a frame boundary; let pymavlink resynchronise on the rest
+                messages.extend(self.fallback(data[offset:], the_connection))
+                break
+
+            frame_end = offset + header + length + 2 + signature
+            if frame_end > end:
+                messages.extend(self.fallback(data[offset:], the_connection))
+                break
+
+            fast = FAST_MESSAGES.get(msgid)
+            if fast is None:
+                messages.extend(self.fallback(data[offset:frame_end], the_connection))
+                offset = frame_end
+                continue
+
+            # CRC covers everything after the magic byte, plus the message's CRC extra
+            payload_end = offset + header + length
+            crc = x25crc(data[offset + 1:payload_end])
+            crc.accumulate(bytes((fast[2],)))
+            if crc.crc != data[payload_end] | (data[payload_end + 1] << 8):
+                self.crc_errors[number] = self.crc_errors.get(number, 0) + 1
+                offset = frame_end
+                continue
+
+            # MAVLink 2 trims trailing zero bytes from the payload
+            payload = data[offset + header:payload_end]
+            if length < fast[1].size:
+                payload = payload + bytes(fast[1].size - length)
+
+            msg = self.record_for(number, msgid, system, component)
+            fast[3](msg, payload)
+            msg.seq = seq
+            msg.srcSystem = system
+            msg.srcComponent = component
+            msg.size = frame_end - offset
+            messages.append(msg)
+
+            offset = frame_end
+
+        return messages
+
+    def fallback(self, data, the_connection):
+
+        ################################################
+        # data: bytes pymavlink should decode [input]
+        # the_connection: mavlink connection [input]
+        # messages: list of decoded messages [output]
+        ################################################
+
+        messages = the_connection.mav.parse_buffer(data) or []
+        for msg in messages:
+            the_connection.post_message(msg)
+        return messages
+
+
+class RollingCounter:
+
+    ################################################
+    # Sum of the values added over the last
+    # LINK_WINDOW seconds, kept in a fixed ring of
+    # LINK_BUCKETS buckets.
+    ################################################
+
+    def __init__(self):
+        self.buckets = [0.0] * LINK_BUCKETS
+        self.width = LINK_WINDOW / LINK_BUCKETS # seconds per bucket
+        self.current = None                     # index of the newest bucket
+        self.started = 0.0                      # time of the first value
+
+    def advance(self, now):
+        index = int(now / self.width)
+        if self.current is None:
+            self.current = index
+            self.started = now
+            return
+
+        # Empty the buckets that have fallen out of the window
+        steps = index - self.current
+        if steps <= 0:
+            return
+        for i in range(self.current + 1, self.current + 1 + min(steps, LINK_BUCKETS)):
+            self.buckets[i % LINK_BUCKETS] = 0.0
+        self.current = index
+
+    def add(self, now, value=1):
+        self.advance(now)
+        self.buckets[self.current % LINK_BUCKETS] += value
+
+    def total(self, now):
+        if self.current is None:
+            return 0.0
+        self.advance(now)
+        return sum(self.buckets)
+
+    def rate(self, now):
+        if self.current is None:
+            return 0.0
+        self.advance(now)
+
+        # Full older buckets plus the part of the newest one, or less if we only just started
+        span = min(LINK_WINDOW - self.width + now - self.current * self.width, now - self.started)
+        if span <= 0:
+            return 0.0
+        return sum(self.buckets) / span
+
+
+class StreamStatistics:
+
+    ################################################
+    # Rate, throughput and inter-arrival jitter of
+    # one message type from one drone.
+    ################################################
+
+    def __init__(self):
+        self.messages = RollingCounter()        # messages received
+        self.bytes = RollingCounter()           # bytes received
+        self.last_arrival = None                # time of the last message
+        self.last_interval = None               # gap (s) before the last message
+        self.jitter = 0.0                       # smoothed change in gap (s), as in RFC 3550
+
+    def record(self, now, size):
+        self.messages.add(now)
+        self.bytes.add(now, size)
+
+        if self.last_arrival is not None:
+            interval = now - self.last_arrival
+            if self.last_interval is not None:
+                self.jitter += (abs(interval - self.last_interval) - self.jitter) / 16
+            self.last_interval = interval
+        self.last_arrival = now
+
+
+def message_size(msg):
+
+    ################################################
+    # msg: decoded mavlink message [input]
+    # size: int, bytes of the frame on the wire [output]
+    ################################################
+
+    if isinstance(msg, FastMessage):
+        return msg.size
+
+    buffer = msg.get_msgbuf()
+    return len(buffer) if buffer is not None else 0
+
+
+class LinkStatistics:
+
+    ############################################################
+    # SUMMARY: LinkStatistics measures the quality of every    #
+    #          drone's link from the messages the receiver     #
+    #          handles. Packet loss comes from gaps in the     #
+    #          MAVLink sequence number, which each sender      #
+    #          (system/component) increments once per message  #
+    #          of any type, so loss is per link. Rate, bytes/s #
+    #          and inter-arrival jitter are kept per message   #
+    #          type. Everything is a rolling LINK_WINDOW made  #
+    #          of fixed-size counters, so memory does not grow #
+    #          with flight time.                               #
+    ############################################################
+
+    def __init__(self):
+        self.streams = {}                       # (number, message type) -> StreamStatistics
+        self.sequences = {}                     # (number, system, component) -> [last sequence number, its arrival,
+                                                #     large gaps in a row, the first of them]
+        self.received = {}                      # number -> RollingCounter of messages received
+        self.lost = {}                          # number -> RollingCounter of messages missed
+        self.lock = threading.Lock()
+
+    def record(self, number, msg, now):
+
+        ################################################
+        # number: drone number [input]
+        # msg: decoded mavlink message [input]
+        # now: float, time.monotonic() of arrival [input]
+        ################################################
+
+        msg_type = msg.get_type()
+        with self.lock:
+            stream = self.streams.get((number, msg_type))
+            if stream is None:
+                stream = self.streams[(number, msg_type)] = StreamStatistics()
+                self.received.setdefault(number, RollingCounter())
+                self.lost.setdefault(number, RollingCounter())
+            stream.record(now, message_size(msg))
+            self.received[number].add(now)
+
+            # Every sender counts 0..255 across all of its messages
+            link = (number, msg.get_srcSystem(), msg.get_srcComponent())
+            seq = msg.get_seq()
+            last = self.sequences.get(link)
+            if last is None:
+                self.sequences[link] = [seq, now, 0, 0]
+                return
+
+            gap = (seq - last[0] - 1) & 0xFF
+            if gap >= LINK_REORDER and now - last[1] < LINK_DROPOUT:
+                # Late or duplicate packet, unless the following ones are just as far out:
+                # then the sender really moved on and everything skipped was lost
+                last[2] += 1
+                if last[2] == 1:
+                    last[3] = gap
+                if last[2] < LINK_RESYNC:
+                    return
+                gap = last[3]
+
+            if gap:
+                self.lost[number].add(now, gap)
+            self.sequences[link] = [seq, now, 0, 0]
+
+    def remove(self, number):
+
+        ################################################
+        # number: drone number whose link was replaced
+        #         or dropped [input]
+        ################################################
+
+        with self.lock:
+            for key in [key for key in self.streams if key[0] == number]:
+                del self.streams[key]
+            for key in [key for key in self.sequences if key[0] == number]:
+                del self.sequences[key]
+            self.received.pop(number, None)
+            self.lost.pop(number, None)
+
+    def link(self, number, now):
+
+        ################################################
+        # number: drone number [input]
+        # now: float, time.monotonic() [input]
+        # rate: float, messages/s of every type [output]
+        # loss: float, fraction of messages missed [output]
+        # throughput: float, bytes/s [output]
+        ################################################
+
+        with self.lock:
+            if number not in self.received:
+                return 0.0, 0.0, 0.0
+            received = self.received[number].total(now)
+            lost = self.lost[number].total(now)
+            rate = self.received[number].rate(now)
+            throughput = sum(stream.bytes.rate(now) for key, stream in self.streams.items() if key[0] == number)
+
+        loss = lost / (received + lost) if received + lost else 0.0
+        return rate, loss, throughput
+
+    def stream(self, number, msg_type, now):
+
+        ################################################
+        # number: drone number [input]
+        # msg_type: string, e.g. 'LOCAL_POSITION_NED' [input]
+        # now: float, time.monotonic() [input]
+        # rate: float, messages/s [output]
+        # jitter: float, inter-arrival jitter (s) [output]
+        # throughput: float, bytes/s [output]
+        ################################################
+
+        with self.lock:
+            stream = self.streams.get((number, msg_type))
+            if stream is None:
+                return 0.0, 0.0, 0.0
+            return stream.messages.rate(now), stream.jitter, stream.bytes.rate(now)
+
+    def csv(self, t, now, crc_errors):
+
+        ################################################
+        # t: float, log time of the rows [input]
+        # now: float, time.monotonic() [input]
+        # crc_errors: function(number) giving the corrupt
+        #             frames received [input]
+        # text: string, one line per drone link and per
+        #       message type (time, drone, type, rate Hz,
+        #       loss, jitter ms, bytes/s, CRC errors) [output]
+        ################################################
+
+        with self.lock:
+            numbers = sorted(self.received)
+            streams = sorted(self.streams)
+
+        lines = []
+        for number in numbers:
+            rate, loss, throughput = self.link(number, now)
+            lines.append(f'{t:.3f},{number},ALL,{rate:.2f},{loss:.4f},,{throughput:.0f},{crc_errors(number)}\n')
+        for number, msg_type in streams:
+            rate, jitter, throughput = self.stream(number, msg_type, now)
+            lines.append(f'{t:.3f},{number},{msg_type},{rate:.2f},,{jitter * 1000:.2f},{throughput:.0f},\n')
+        return "".join(lines)
+
+
+class TelemetryReceiver:
+
+    ############################################################
+    # SUMMARY: TelemetryReceiver watches the UDP sockets of    #
+    #          every connected drone at once (epoll/select via #
+    #          the selectors module) and handles each datagram #
+    #          as soon as it arrives. A slow or silent drone   #
+    #          can therefore never stall the others. Decoded   #
+    #          messages are handed to the MavlinkRouter.       #
+    ############################################################
+
+    def __init__(self, router):
+        self.router = router
+        self.decoder = None                     # optional FastMavlinkDecoder
+        self.selector = selectors.DefaultSelector()
+        self.connections = {}                   # drone number -> mavlink connection
+        self.unselectable = {}                  # connections without a socket (polled instead)
+        self.pending = []                       # (number, connection) waiting to be registered
+        self.lock = threading.Lock()
+
+        self.update_counts = {}                 # LOCAL_POSITION_NED count in current window
+        self.update_rates = {}                  # LOCAL_POSITION_NED rate (Hz) per drone
+        self.window_start = time.monotonic()
+        self.links = LinkStatistics()           # loss, rate, jitter and bytes/s per drone
+        self.bad_data = {}                      # drone number -> BAD_DATA frames from pymavlink
+
+    def add(self, number, the_connection):
+
+        ################################################
+        # number: drone number [input]
+        # the_connection: mavlink connection [input]
+        ################################################
+
+        # Registration happens on the receiver thread to avoid racing select()
+        with self.lock:
+            self.pending.append((number, the_connection))
+
+    def remove(self, number):
+
+        ################################################
+        # number: drone number whose connection should
+        #         be dropped and closed [input]
+        ################################################
+
+        with self.lock:
+            self.pending.append((number, None))
+
+    def crc_errors(self, number):
+
+        ################################################
+        # number: drone number [input]
+        # errors: int, corrupt frames (pymavlink
+        #         BAD_DATA plus frames the fast decoder
+        #         dropped for a bad CRC) [output]
+        ################################################
+
+        errors = self.bad_data.get(number, 0)
+        if self.decoder is not None:
+            errors += self.decoder.crc_errors.get(number, 0)
+        return errors
+
+    def get_update_rates(self):
+
+        ################################################
+        # rates: dict, drone number -> Hz [output]
+        ################################################
+
+        return dict(self.update_rates)
+
+    def register_pending(self):
+
+        ################################################
+        # [no inputs or outputs]
+        ################################################
+
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+
+        for number, the_connection in pending:
+            # Replace (or remove) any previous connection for this drone
+            old = self.connections.pop(number, None)
+            self.unselectable.pop(number, None)
+            if old is not None:
+                if old.fd is not None:
+                    try:
+                        self.selector.unregister(old.fd)
+                    except (KeyError, ValueError):
+                        pass
+                old.close()
+
+            self.links.remove(number)
+            self.bad_data.pop(number, None)
+            if the_connection is None:
+                self.update_rates.pop(number, None)
+                continue
+
+            self.connections[number] = the_connection
+            self.update_counts[number] = 0
+            self.update_rates[number] = 0.0
+
+            if the_connection.fd is not None:
+                self.selector.register(the_connection.fd, selectors.EVENT_READ, number)
+            else:
+                self.unselectable[number] = the_connection
+
+    def drain(self, number):
+
+        ################################################
+        # number: drone number to read from [input]
+        # count: int, messages handled [output]
+        ################################################
+
+        the_connection = self.connections[number]
+
+        if self.decoder is not None and isinstance(the_connection, mavutil.mavudp):
+            return self.drain_fast(number, the_connection)
+
+        # Handle every message already waiting on this drone's socket
+        count = 0
+        while True:
+            try:
+                msg = the_connection.recv_msg()
+            except Exception as e:
+                print("Problem receiving Mav message: " + str(number) + " (" + str(e) + ")")
+                return count
+            if msg is None:
+                return count
+            self.handle(number, msg)
+            count += 1
+
+    def drain_fast(self, number, the_connection):
+
+        ################################################
+        # number: drone number to read from [input]
+        # the_connection: mavudp connection [input]
+        # count: int, messages handled [output]
+        ################################################
+
+        # Read whole datagrams and let the fast decoder pick out the
+        # messages it knows; everything else goes through pymavlink
+        count = 0
+        while True:
+            try:
+                data = the_connection.recv()
+                if not data:
+                    return count
+                for msg in self.decoder.decode(number, data, the_connection):
+                    self.handle(number, msg)
+                    count += 1
+            except Exception as e:
+                print("Problem receiving Mav message: " + str(number) + " (" + str(e) + ")")
+                return count
+
+    def handle(self, number, msg):
+
+        ################################################
+        # number: drone number [input]
+        # msg: decoded mavlink message [input]
+        ################################################
+
+        # With robust_parsing (the default) pymavlink hands corrupt frames back as
+        # BAD_DATA; they carry no real header, so keep them out of the loss accounting
+        if msg.get_type() == 'BAD_DATA':
+            self.bad_data[number] = self.bad_data.get(number, 0) + 1
+            return
+
+        if msg.get_type() == 'LOCAL_POSITION_NED':
+            self.update_counts[number] += 1
+        self.links.record(number, msg, time.monotonic())
+
+        self.router.dispatch(number, msg)
+
+    def update_statistics(self):
+
+        ################################################
+        # [no inputs or outputs]
+        ################################################
+
+        now = time.monotonic()
+        elapsed = now - self.window_start
+
+        if elapsed >= RATE_WINDOW:
+            for number in self.update_counts:
+                self.update_rates[number] = self.update_counts[number] / elapsed
+                self.update_counts[number] = 0
+            self.window_start = now
+
+            if link_file_name:
+                logger.write(link_file_name, self.links.csv(now - log_start, now, self.crc_errors))
+
+    def poll(self, timeout):
+
+        ################################################
+        # timeout: float, max seconds to wait [input]
+        ################################################
+
+        self.register_pending()
+
+        if self.connections and len(self.unselectable) < len(self.connections):
+            for key, _ in self.selector.select(timeout):
+                self.drain(key.data)
+        elif not self.unselectable:
+            # Nothing connected yet
+            time.sleep(timeout)
+
+        # Connections without a selectable socket are polled without blocking
+        count = 0
+        for number in self.unselectable:
+            count += self.drain(number)
+
+        # Nothing to select on (e.g. serial links on Windows) and nothing read: don't spin
+        if self.unselectable and len(self.unselectable) == len(self.connections) and count == 0:
+            time.sleep(timeout)
+
+        self.update_statistics()
+
+
+def handle_local_position(number, msg):
+
+    ################################################
+    # number: drone number [input]
+    # msg: LOCAL_POSITION_NED message [input]
+    ################################################
+
+    received = time.monotonic()
+    state.set_position(number, msg.x, msg.y, msg.z, msg.vx, msg.vy, msg.vz, msg.time_boot_ms, received)
+    estimator.update(number, (msg.x, msg.y, msg.z), (msg.vx, msg.vy, msg.vz), msg.time_boot_ms, received)
+    if number == 1:
+        leader_history.append(msg.time_boot_ms / 1000, (msg.x, msg.y, msg.z), (msg.vx, msg.vy, msg.vz))
+    flight_clock.notify()
+
+    # Write coordinates to a text file (in the background)
+    if coordinates_file_name or coordinates_log_name:
+        snapshot = state.snapshot()
+        positions = snapshot[:, X:Z + 1]
+        velocities = snapshot[:, VX:VZ + 1]
+
+    if coordinates_file_name:
+        # x1, y1, z1, x2, y2, z2, vx1, vy1, vz1, vx2, vy2, vz2 (velocities: Amber added 2/4)
+        values = positions[0:2].ravel().tolist() + velocities[0:2].ravel().tolist()
+        logger.write(coordinates_file_name, ",".join(map(str, values)) + "\n")
+
+    if coordinates_log_name:
+        logger.write(coordinates_log_name, coordinates_record.pack(time.monotonic() - log_start, *snapshot[:, X:VZ + 1].ravel().tolist()))
+
+
+def handle_command_ack(number, msg):
+
+    ################################################
+    # number: drone number [input]
+    # msg: COMMAND_ACK message [input]
+    ################################################
+
+    # Another GCS on the same link (e.g. QGC through MAVProxy) gets its own ACKs; those
+    # name it as the target (MAVLink 1 and old autopilots leave the target 0)
+    the_connection = fleet.connection(number)
+    target_system = getattr(msg, 'target_system', 0)
+    target_component = getattr(msg, 'target_component', 0)
+    if the_connection and target_system and target_system != the_connection.source_system:
+        return
+    if the_connection and target_component and target_component != the_connection.source_component:
+        return
+
+    # Acknowledgements nobody is waiting for (e.g. duplicates of a re-sent command)
+    if not commands.acknowledge(the_connection, msg.command, msg.result):
+        print("[" + str(number) + "] Command " + command_name(msg.command) + " acknowledged: " + result_name(msg.result))
+
+
+def handle_position_target(number, msg):
+
+    ################################################
+    # number: drone number [input]
+    # msg: POSITION_TARGET_LOCAL_NED message [input]
+    ################################################
+
+    target_monitor.echo(number, msg.x, msg.y, msg.z, time.monotonic())
+
+
+def command_name(command):
+
+    ################################################
+    # command: MAV_CMD id [input]
+    # name: string [output]
+    ################################################
+
+    try:
+        return mavutil.mavlink.enums['MAV_CMD'][command].name
+    except KeyError:
+        return str(command)
+
+
+def result_name(result):
+
+    ################################################
+    # result: MAV_RESULT id [input]
+    # name: string [output]
+    ################################################
+
+    try:
+        return mavutil.mavlink.enums['MAV_RESULT'][result].description
+    except KeyError:
+        return str(result)
+
+
+class CommandTracker:
+
+    ############################################################
+    # SUMMARY: CommandTracker sends COMMAND_LONGs and hands    #
+    #          back a Future for each. The matching            #
+    #          COMMAND_ACK (same drone and command; the oldest #
+    #          outstanding one first) resolves it with the     #
+    #          MAV_RESULT. Unacknowledged commands are re-sent #
+    #          every COMMAND_TIMEOUT, COMMAND_RETRIES times,   #
+    #          and then fail with TimeoutError. Nothing waits: #
+    #          check() runs on the telemetry receiver thread.  #
+    ############################################################
+
+    def __init__(self):
+        self.pending = {}                       # (connection, command) -> list of outstanding entries
+        self.lock = threading.Lock()
+
+    def send(self, the_connection, command, params):
+
+        ################################################
+        # the_connection: mavlink connection [input]
+        # command: MAV_CMD id [input]
+        # params: 7 float command parameters [input]
+        # future: Future resolved with the MAV_RESULT [output]
+        ################################################
+
+        future = Future()
+        future.set_running_or_notify_cancel()
+        entry = {'future': future, 'params': params, 'attempt': 0, 'deadline': time.monotonic() + COMMAND_TIMEOUT}
+
+        with self.lock:
+            self.pending.setdefault((the_connection, command), []).append(entry)
+        self.transmit(the_connection, command, entry)
+
+        return future
+
+    def transmit(self, the_connection, command, entry):
+
+        ################################################
+        # the_connection: mavlink connection [input]
+        # command: MAV_CMD id [input]
+        # entry: pending entry to (re-)send [input]
+        ################################################
+
+        # The confirmation field counts re-transmissions
+        try:
+            the_connection.mav.command_long_send(the_connection.target_system, the_connection.target_component, command, entry['attempt'], *entry['params'])
+        except OSError as e:
+            print("Problem sending command " + command_name(command) + " (" + str(e) + ")")
+
+    def acknowledge(self, the_connection, command, result):
+
+        ################################################
+        # the_connection: mavlink connection the ACK
+        #                 arrived on [input]
+        # command: MAV_CMD id [input]
+        # result: MAV_RESULT [input]
+        # matched: bool, True if a command was waiting
+        #          for this ACK [output]
+        ################################################
+
+        with self.lock:
+            entries = self.pending.get((the_connection, command))
+            if not entries:
+                return False
+
+            # Still working on it: don't re-send yet
+            if result == mavutil.mavlink.MAV_RESULT_IN_PROGRESS:
+                entries[0]['deadline'] = time.monotonic() + COMMAND_TIMEOUT
+                return True
+
+            entry = entries.pop(0)
+            if not entries:
+                del self.pending[(the_connection, command)]
+
+        entry['future'].set_result(result)
+        return True
+
+    def check(self):
+
+        ################################################
+        # Re-sends or fails commands whose ACK is late.
+        ################################################
+
+        now = time.monotonic()
+        resend = []
+        failed = []
+
+        with self.lock:
+            for key, entries in list(self.pending.items()):
+                for entry in list(entries):
+                    if now < entry['deadline']:
+                        continue
+                    if entry['attempt'] < COMMAND_RETRIES:
+                        entry['attempt'] += 1
+                        entry['deadline'] = now + COMMAND_TIMEOUT
+                        resend.append((key, entry))
+                    else:
+                        entries.remove(entry)
+                        failed.append((key, entry))
+                if not entries:
+                    del self.pending[key]
+
+        for (the_connection, command), entry in resend:
+            self.transmit(the_connection, command, entry)
+        for (the_connection, command), entry in failed:
+            entry['future'].set_exception(TimeoutError("no COMMAND_ACK for " + command_name(command)))
+
+
+def command_fleet(function, name):
+
+    ################################################
+    # function: command function taking a mavlink
+    #           connection and returning a Future
+    #           (arm, disarm, land, offboard) [input]
+    # name: string, for messages [input]
+    # futures: dict, drone number -> Future [output]
+    #
+    # Sends the command to every connected drone at
+    # once; results are printed as the ACKs arrive.
+    ################################################
+
+    futures = {}
+    for drone in fleet:
+        if drone.connection:
+            future = function(drone.connection)
+            future.add_done_callback(lambda future, number=drone.number: report_command(number, name, future))
+            futures[drone.number] = future
+    return futures
+
+
+def command_drone(number, function, name):
+
+    ################################################
+    # number: drone number [input]
+    # function: command function (see command_fleet) [input]
+    # name: string, for messages [input]
+    # future: Future, or None if not connected [output]
+    ################################################
+
+    future = function(fleet.connection(number))
+    if future is not None:
+        future.add_done_callback(lambda future: report_command(number, name, future))
+    return future
+
+
+def report_command(number, name, future):
+
+    ################################################
+    # number: drone number [input]
+    # name: string, command name [input]
+    # future: the command's finished Future [input]
+    ################################################
+
+    if future.cancelled():
+        return
+    if future.exception() is not None:
+        print("[" + str(number) + "] " + name + " failed: " + str(future.exception()))
+    else:
+        print("[" + str(number) + "] " + name + ": " + result_name(future.result()))
+
+
+def telemetry_local_position_thread():
+
+    ############################################################
+    # SUMMARY: telemetry_local_position_thread continually     #
+    #          updates the local position coordinates of all   #
+    #          connected drones. Each drone's socket is served #
+    #          as soon as it has data (see TelemetryReceiver). #
+    ############################################################
+
+    while 1:
+        receiver.poll(RECEIVER_TIMEOUT)
+        commands.check()
+
+
+class TargetMonitor:
+
+    ############################################################
+    # SUMMARY: TargetMonitor matches the targets the autopilot #
+    #          reports (POSITION_TARGET_LOCAL_NED) against the #
+    #          setpoints we sent. Setpoints carry no id and    #
+    #          are re-sent unchanged at SETPOINT_RATE, so only #
+    #          changes of target are tracked: the first echo   #
+    #          of a new target gives one latency sample (send  #
+    #          to echo, including up to one stream interval of #
+    #          sampling delay). A target that was held for     #
+    #          TARGET_OBSERVE but never echoed before a later  #
+    #          one was is counted as dropped. Echoes that stay #
+    #          DIVERGENCE_LIMIT away from everything we sent   #
+    #          flag the drone as diverged.                     #
+    ############################################################
+
+    def __init__(self, numbers):
+        self.lock = threading.Lock()
+        self.history = {}                       # number -> deque of [first send, last send, x, y, z, echoed]
+        self.latency_counts = {}                # number -> latency histogram (LATENCY_BINS, then over)
+        self.latency_total = {}                 # number -> sum of latency samples (s)
+        self.drop_counts = {}                   # number -> histogram of per-window drop rates (DROP_BINS, then over)
+        self.observed = {}                      # number -> setpoints judged in the current window
+        self.dropped = {}                       # number -> of which never echoed
+        self.observed_total = {}                # number -> setpoints judged since start
+        self.dropped_total = {}                 # number -> of which never echoed
+        self.window_start = {}                  # number -> time the current window began
+        self.diverged_since = {}                # number -> time the echoes first diverged, or None
+        self.diverged = {}                      # number -> 1 while flagged
+
+        for number in numbers:
+            self.history[number] = deque(maxlen=TARGET_HISTORY)
+            self.latency_counts[number] = np.zeros(len(LATENCY_BINS) + 1, dtype=int)
+            self.latency_total[number] = 0.0
+            self.drop_counts[number] = np.zeros(len(DROP_BINS) + 1, dtype=int)
+            self.observed[number] = 0
+            self.dropped[number] = 0
+            self.observed_total[number] = 0
+            self.dropped_total[number] = 0
+            self.window_start[number] = None
+            self.diverged_since[number] = None
+            self.diverged[number] = 0
+
+    def sent(self, number, x, y, z, now):
+
+        ################################################
+        # number: drone number [input]
+        # x, y, z: float, setpoint just sent [input]
+        # now: float, time.monotonic() of the send [input]
+        ################################################
+
+        with self.lock:
+            history = self.history[number]
+            if history:
+                newest = history[-1]
+                if abs(newest[2] - x) <= TARGET_MATCH and abs(newest[3] - y) <= TARGET_MATCH and abs(newest[4] - z) <= TARGET_MATCH:
+                    newest[1] = now
+                    return
+            history.append([now, now, x, y, z, False])
+
+    def echo(self, number, x, y, z, now):
+
+        ################################################
+        # number: drone number [input]
+        # x, y, z: float, target reported by the
+        #          autopilot [input]
+        # now: float, time.monotonic() of arrival [input]
+        ################################################
+
+        if np.isnan(x) or np.isnan(y) or np.isnan(z):
+            return
+
+        with self.lock:
+            history = self.history[number]
+            if not history:
+                return
+
+            # Newest setpoint this echo matches
+            match = None
+            for k in range(len(history) - 1, -1, -1):
+                entry = history[k]
+                if abs(entry[2] - x) <= TARGET_MATCH and abs(entry[3] - y) <= TARGET_MATCH and abs(entry[4] - z) <= TARGET_MATCH:
+                    match = k
+                    break
+
+            if match is not None:
+                entry = history[match]
+                if not entry[5]:
+                    entry[5] = True
+                    latency = now - entry[0]
+                    self.latency_counts[number][np.searchsorted(LATENCY_BINS, latency)] += 1
+                    self.latency_total[number] += latency
+
+                # Everything older has been superseded; judge it
+                for _ in range(match):
+                    older = history.popleft()
+                    if older[5]:
+                        self.observed[number] += 1
+                    elif history[0][0] - older[0] >= TARGET_OBSERVE:
+                        self.observed[number] += 1
+                        self.dropped[number] += 1
+
+            self.check_divergence(number, x, y, z, match is not None, now)
+            self.roll_window(number, now)
+
+    def check_divergence(self, number, x, y, z, matched, now):
+
+        ################################################
+        # number: drone number [input]
+        # x, y, z: float, echoed target [input]
+        # matched: bool, echo matched a sent setpoint [input]
+        # now: float, time.monotonic() [input]
+        ################################################
+
+        newest = self.history[number][-1]
+        distance = ((newest[2] - x) ** 2 + (newest[3] - y) ** 2 + (newest[4] - z) ** 2) ** .5
+
+        # Only while we are still sending; the autopilot keeps its own target otherwise
+        if matched or distance <= DIVERGENCE_LIMIT or now - newest[1] > TARGET_OBSERVE:
+            if self.diverged[number]:
+                print("[" + str(number) + "] Autopilot target matches the ground station again")
+            self.diverged_since[number] = None
+            self.diverged[number] = 0
+            return
+
+        if self.diverged_since[number] is None:
+            self.diverged_since[number] = now
+        elif not self.diverged[number] and now - self.diverged_since[number] >= DIVERGENCE_TIME:
+            self.diverged[number] = 1
+            print("[" + str(number) + "] Autopilot target " + f'({x:.2f}, {y:.2f}, {z:.2f})' + " diverges from ours by " + f'{distance:.2f}' + " m")
+
+    def roll_window(self, number, now):
+
+        ################################################
+        # number: drone number [input]
+        # now: float, time.monotonic() [input]
+        ################################################
+
+        if self.window_start[number] is None:
+            self.window_start[number] = now
+            return
+        if now - self.window_start[number] < RATE_WINDOW:
+            return
+
+        if self.observed[number]:
+            rate = self.dropped[number] / self.observed[number]
+            self.drop_counts[number][np.searchsorted(DROP_BINS, rate)] += 1
+        self.observed_total[number] += self.observed[number]
+        self.dropped_total[number] += self.dropped[number]
+        self.observed[number] = 0
+        self.dropped[number] = 0
+        self.window_start[number] = now
+
+        if targets_file_name:
+            logger.write(targets_file_name, self.csv_row(number, now - log_start))
+
+    def summary(self, number):
+
+        ################################################
+        # number: drone number [input]
+        # latency: float, mean setpoint latency (s), or
+        #          NaN before the first echo [output]
+        # drop_rate: float, fraction of the setpoints
+        #            judged so far that were dropped [output]
+        # diverged: 1 if the autopilot target diverges [output]
+        ################################################
+
+        with self.lock:
+            samples = self.latency_counts[number].sum()
+            latency = self.latency_total[number] / samples if samples else float('nan')
+            observed = self.observed_total[number] + self.observed[number]
+            dropped = self.dropped_total[number] + self.dropped[number]
+            drop_rate = dropped / observed if observed else 0.0
+            return latency, drop_rate, self.diverged[number]
+
+    def csv_header(self):
+
+        ################################################
+        # text: string, column names [output]
+        ################################################
+
+        latency = ["latency_le_" + str(edge) for edge in LATENCY_BINS] + ["latency_over_" + str(LATENCY_BINS[-1])]
+        drops = ["drop_le_" + str(edge) for edge in DROP_BINS] + ["drop_over_" + str(DROP_BINS[-1])]
+        return ",".join(["t", "drone", "latency_mean_ms", "diverged"] + latency + drops) + "\n"
+
+    def csv_row(self, number, t):
+
+        ################################################
+        # number: drone number [input]
+        # t: float, log time of the row [input]
+        # text: string, cumulative histograms [output]
+        ################################################
+
+        samples = self.latency_counts[number].sum()
+        latency = self.latency_total[number] / samples * 1000 if samples else float('nan')
+        values = [f'{t:.3f}', str(number), f'{latency:.1f}', str(self.diverged[number])]
+        values += [str(count) for count in self.latency_counts[number]]
+        values += [str(count) for count in self.drop_counts[number]]
+        return ",".join(values) + "\n"
+
+
+class StreamRateController:
+
+    ############################################################
+    # SUMMARY: StreamRateController sets, per drone, how often #
+    #          the autopilot streams LOCAL_POSITION_NED and    #
+    #          POSITION_TARGET_LOCAL_NED. The flight mode and  #
+    #          role pick the rates (STREAM_RATES, or           #
+    #          STREAM_IDLE while disarmed). A lossy link backs #
+    #          off: rates are halved while loss is above       #
+    #          STREAM_LOSS_HIGH and creep back once it falls   #
+    #          below STREAM_LOSS_LOW, so a drone deep in the   #
+    #          cave sends less instead of losing bursts. A     #
+    #          rate only counts as set once its                #
+    #          SET_MESSAGE_INTERVAL is acknowledged. As a      #
+    #          COMMAND_ACK does not name the message id, each  #
+    #          drone has at most one such request outstanding; #
+    #          the next goes out when it resolves.             #
+    ############################################################
+
+    STREAMS = (
+        ('LOCAL_POSITION_NED', request_local_NED),
+        ('POSITION_TARGET_LOCAL_NED', request_target_pos_NED),
+    )
+
+    def __init__(self):
+        self.scales = {}                        # drone number -> loss back-off (1 = full rate)
+        self.adapted = {}                       # drone number -> time the back-off last changed
+        self.confirmed = {}                     # (number, stream) -> acknowledged rate (Hz)
+        self.requested = {}                     # drone number -> (stream, rate) awaiting its COMMAND_ACK
+        self.retry_at = {}                      # (number, stream) -> no new request before this time
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+
+    def reset(self, number):
+
+        ################################################
+        # number: drone number that (re)connected [input]
+        ################################################
+
+        with self.lock:
+            self.scales[number] = 1.0
+            self.adapted[number] = time.monotonic()
+            self.requested.pop(number, None)
+            for stream, _ in self.STREAMS:
+                self.confirmed.pop((number, stream), None)
+                self.retry_at.pop((number, stream), None)
+
+    def wanted(self, number):
+
+        ################################################
+        # number: drone number [input]
+        # rates: tuple of rates (Hz), one per STREAMS
+        #        entry [output]
+        ################################################
+
+        if not is_armed(number):
+            rates = STREAM_IDLE
+        else:
+            leader, followers = STREAM_RATES.get(FLIGHT_MODE, STREAM_RATES[4])
+            rates = leader if fleet.get(number).is_leader() else followers
+
+        scale = self.scales.get(number, 1.0)
+        return tuple(max(round(rate * scale, 1), minimum) for rate, minimum in zip(rates, STREAM_MIN))
+
+    def adapt(self, number, now):
+
+        ################################################
+        # number: drone number [input]
+        # now: float, time.monotonic() [input]
+        ################################################
+
+        # Give every change a full LINK_WINDOW of loss measurements
+        if now - self.adapted.get(number, now) < LINK_WINDOW:
+            return
+
+        loss = receiver.links.link(number, now)[1]
+        scale = self.scales.get(number, 1.0)
+        if loss > STREAM_LOSS_HIGH:
+            # Nothing left to shed once every stream is at its minimum
+            if self.wanted(number) != tuple(STREAM_MIN):
+                scale = scale / 2
+        elif loss < STREAM_LOSS_LOW:
+            scale = min(scale + STREAM_RECOVERY, 1.0)
+
+        if scale != self.scales.get(number, 1.0):
+            print("[" + str(number) + "] Link loss " + f'{loss * 100:.0f}' + "%, telemetry at " + f'{scale * 100:.0f}' + "% of the flight mode rate")
+        self.scales[number] = scale
+        self.adapted[number] = now
+
+    def request(self, number, the_connection, now):
+
+        ################################################
+        # number: drone number [input]
+        # the_connection: mavlink connection [input]
+        # now: float, time.monotonic() [input]
+        ################################################
+
+        for (stream, function), rate in zip(self.STREAMS, self.wanted(number)):
+            key = (number, stream)
+            with self.lock:
+                # One SET_MESSAGE_INTERVAL in flight per drone
+                if number in self.requested:
+                    return
+                if self.confirmed.get(key) == rate or now < self.retry_at.get(key, 0):
+                    continue
+                self.requested[number] = (stream, rate)
+
+            future = function(the_connection, rate)
+            if future is None:
+                with self.lock:
+                    self.requested.pop(number, None)
+                return
+            future.add_done_callback(lambda future, stream=stream, rate=rate: self.acknowledged(number, stream, rate, future))
+            return
+
+    def acknowledged(self, number, stream, rate, future):
+
+        ################################################
+        # number: drone number [input]
+        # stream: string, message type [input]
+        # rate: float, rate (Hz) that was requested [input]
+        # future: the finished SET_MESSAGE_INTERVAL [input]
+        ################################################
+
+        key = (number, stream)
+        if future.cancelled():
+            problem = "cancelled"
+        elif future.exception() is not None:
+            problem = str(future.exception())
+        elif future.result() != mavutil.mavlink.MAV_RESULT_ACCEPTED:
+            problem = result_name(future.result())
+        else:
+            problem = None
+
+        with self.lock:
+            # A reconnect may have reset this stream in the meantime
+            if self.requested.get(number) != (stream, rate):
+                return
+            del self.requested[number]
+            if problem is None:
+                self.confirmed[key] = rate
+            else:
+                self.retry_at[key] = time.monotonic() + STREAM_RETRY
+
+        if problem is None:
+            print("[" + str(number) + "] " + stream + " at " + str(rate) + " Hz")
+        else:
+            print("[" + str(number) + "] " + stream + " at " + str(rate) + " Hz failed: " + problem)
+
+        # Send the next pending change straight away
+        the_connection = fleet.connection(number)
+        if the_connection:
+            self.request(number, the_connection, time.monotonic())
+
+    def check(self, now):
+
+        ################################################
+        # now: float, time.monotonic() [input]
+        ################################################
+
+        for drone in fleet:
+            the_connection = drone.connection
+            if not the_connection:
+                continue
+            self.adapt(drone.number, now)
+            self.request(drone.number, the_connection, now)
+
+    def run(self):
+
+        ################################################
+        # [no inputs or outputs]
+        ################################################
+
+        while not self.stop.wait(STREAM_INTERVAL):
+            try:
+                self.check(time.monotonic())
+            except Exception as e:
+                print("Problem setting telemetry rates (" + str(e) + ")")
+
+
+class TelemetryWatchdog:
+
+    ############################################################
+    # SUMMARY: TelemetryWatchdog checks, every                 #
+    #          WATCHDOG_INTERVAL on its own thread, how long   #
+    #          ago each connected drone's streams last arrived #
+    #          (STALE_LIMITS). A drone escalates from a        #
+    #          warning, to holding its last known position, to #
+    #          landing. While the leader is held its followers #
+    #          hold too, so they don't chase a frozen leader.  #
+    #          Holds are released when telemetry comes back.   #
+    ############################################################
+
+    WARN = 1
+    HOLD = 2
+    LAND = 3
+    NAMES = {0: 'OK', 1: 'STALE', 2: 'HOLDING', 3: 'LANDING'}
+
+    def __init__(self):
+        self.levels = {}                        # drone number -> escalation level (0 = OK)
+        self.ages = {}                          # drone number -> age (s) of its stalest stream
+        self.stop = threading.Event()
+
+    def level(self, number):
+
+        ################################################
+        # number: drone number [input]
+        # level: int, 0 (OK) to LAND [output]
+        ################################################
+
+        return self.levels.get(number, 0)
+
+    def status(self, number):
+
+        ################################################
+        # number: drone number [input]
+        # text: string for the GUI [output]
+        ################################################
+
+        age = self.ages.get(number)
+        if age is None:
+            return 'no data'
+        return f'age {age:.2f} s {self.NAMES[self.level(number)]}'
+
+    def check(self, now):
+
+        ################################################
+        # now: float, time.monotonic() [input]
+        ################################################
+
+        for drone in fleet:
+            number = drone.number
+            if not drone.connection:
+                continue
+
+            # Stalest stream decides the level
+            level = 0
+            oldest = None
+            for msg_type, limits in STALE_LIMITS.items():
+                age = router.age(number, msg_type, now)
+                if age is None:
+                    continue
+                oldest = age if oldest is None else max(oldest, age)
+                level = max(level, sum(age >= limit for limit in limits))
+            self.ages[number] = oldest
+
+            previous = self.level(number)
+            if level == previous:
+                continue
+
+            # The leader being held makes its followers hold as well
+            if level > previous:
+                print("[" + str(number) + "] Telemetry " + f'{oldest:.1f}' + " s old: " + self.NAMES[level])
+                if level >= self.HOLD > previous:
+                    state.hold(number)
+                    if drone.is_leader():
+                        for other in fleet:
+                            if not other.is_leader():
+                                state.hold(other.number)
+                if level >= self.LAND > previous:
+                    command_drone(number, land, "Failsafe land")
+            elif level == 0:
+                print("[" + str(number) + "] Telemetry recovered")
+                state.release(number)
+                if drone.is_leader():
+                    for other in fleet:
+                        if not other.is_leader() and self.level(other.number) < self.HOLD:
+                            state.release(other.number)
+
+            self.levels[number] = level
+
+    def run(self):
+
+        ################################################
+        # Thread body; runs until stop is set.
+        ################################################
+
+        while not self.stop.wait(WATCHDOG_INTERVAL):
+            try:
+                self.check(time.monotonic())
+            except Exception as e:
+                print("Problem checking telemetry (" + str(e) + ")")
+
+
+class LogWriter:
+
+    ############################################################
+    # SUMMARY: LogWriter owns every log file. Other threads    #
+    #          hand it lines through a bounded queue and never #
+    #          touch the disk; run() writes them out in        #
+    #          batches every LOG_FLUSH_INTERVAL, fsyncs every  #
+    #          LOG_FSYNC_INTERVAL and flushes everything on    #
+    #          close().                                        #
+    ############################################################
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.files = {}                         # file name -> open file
+        self.stop = threading.Event()
+        self.stopped = threading.Event()
+        self.dropped = 0                        # lines dropped because the queue was full
+
+    def write(self, file_name, text):
+
+        ################################################
+        # file_name: string, file to append to [input]
+        # text: string, or bytes for binary logs [input]
+        ################################################
+
+        try:
+            self.queue.put_nowait((file_name, text))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5.0):
+
+        ################################################
+        # timeout: float, max seconds to wait for the
+        #          final flush [input]
+        ################################################
+
+        self.stop.set()
+        self.stopped.wait(timeout)
+
+    def write_batch(self):
+
+        ################################################
+        # [no inputs or outputs]
+        ################################################
+
+        # Group everything queued so far by file
+        batches = {}
+        while True:
+            try:
+                file_name, text = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batches.setdefault(file_name, []).append(text)
+
+        for file_name, lines in batches.items():
+            binary = isinstance(lines[0], bytes)
+            f = self.files.get(file_name)
+            if f is None:
+                f = open(file_name, 'ab' if binary else 'a')
+                self.files[file_name] = f
+            f.write((b"" if binary else "").join(lines))
+            f.flush()
+
+    def sync(self):
+
+        ################################################
+        # [no inputs or outputs]
+        ################################################
+
+        for f in self.files.values():
+            os.fsync(f.fileno())
+
+    def run(self):
+
+        ################################################
+        # Thread body; returns once close() is called
+        # and everything has been written.
+        ################################################
+
+        last_sync = time.monotonic()
+
+        while not self.stop.is_set():
+            self.stop.wait(LOG_FLUSH_INTERVAL)
+
+            try:
+                self.write_batch()
+                if time.monotonic() - last_sync >= LOG_FSYNC_INTERVAL:
+                    self.sync()
+                    last_sync = time.monotonic()
+            except OSError as e:
+                print("Problem writing log files (" + str(e) + ")")
+
+        # Final flush on shutdown
+        try:
+            self.write_batch()
+            self.sync()
+        except OSError as e:
+            print("Problem writing log files (" + str(e) + ")")
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+        if self.dropped:
+            print("Log queue overflowed; " + str(self.dropped) + " lines were dropped.")
+        self.stopped.set()
+
+
+class StateEstimator:
+
+    ############################################################
+    # SUMMARY: StateEstimator runs a constant-velocity Kalman  #
+    #          filter per drone and axis, fed with the         #
+    #          LOCAL_POSITION_NED position, velocity and       #
+    #          time_boot_ms. A position has already aged on    #
+    #          its way here, so predict() extrapolates each    #
+    #          drone to a requested time: the time since it    #
+    #          was received, plus how much later than the      #
+    #          fastest-delivered sample it arrived (from       #
+    #          time_boot_ms), plus LINK_LATENCY.               #
+    ############################################################
+
+    def __init__(self, count):
+
+        ################################################
+        # count: number of drones [input]
+        ################################################
+
+        self.state = np.zeros((count, 3, 2))                    # [position, velocity] per axis
+        self.covariance = np.zeros((count, 3, 2, 2))
+        self.boot = np.full(count, np.nan)                      # autopilot time (s) of the last sample
+        self.received = np.zeros(count)                         # time.monotonic() of the last sample
+        self.offset = np.full(count, np.inf)                    # smallest (received - boot) seen
+        self.delay = np.zeros(count)                            # extra delay of the last sample (s)
+        self.noise = np.diag([POSITION_NOISE**2, VELOCITY_NOISE**2])
+        self.lock = threading.Lock()
+
+    def update(self, number, position, velocity, time_boot_ms, received):
+
+        ################################################
+        # number: drone number [input]
+        # position: (x, y, z) [input]
+        # velocity: (vx, vy, vz) [input]
+        # time_boot_ms: autopilot time of the sample [input]
+        # received: time.monotonic() on arrival [input]
+        ################################################
+
+        i = number - 1
+        boot = time_boot_ms / 1000
+        measured = np.stack((position, velocity), axis=1)      # (3 axes, 2)
+
+        with self.lock:
+            # First sample, or the autopilot rebooted: start again from the measurement
+            if np.isnan(self.boot[i]) or boot < self.boot[i] - 1:
+                self.state[i] = measured
+                self.covariance[i] = self.noise
+                self.offset[i] = np.inf
+
+            # Out of order or repeated
+            elif boot <= self.boot[i]:
+                return
+
+            else:
+                # Predict to the sample time
+                dt = boot - self.boot[i]
+                transition = np.array([[1, dt], [0, 1]])
+                process = ACCEL_NOISE * np.array([[dt**3 / 3, dt**2 / 2], [dt**2 / 2, dt]])
+                self.state[i] = self.state[i] @ transition.T
+                self.covariance[i] = transition @ self.covariance[i] @ transition.T + process
+
+                # Update with the measured position and velocity
+                gain = self.covariance[i] @ np.linalg.inv(self.covariance[i] + self.noise)
+                self.state[i] += np.einsum('aij,aj->ai', gain, measured - self.state[i])
+                self.covariance[i] = (np.eye(2) - gain) @ self.covariance[i]
+
+            # Delivery delay relative to the fastest sample (the floor creeps up to follow clock drift)
+            if np.isfinite(self.offset[i]):
+                self.offset[i] += 1e-4 * (received - self.received[i])
+            self.offset[i] = min(self.offset[i], received - boot)
+            self.delay[i] = received - boot - self.offset[i]
+
+            self.boot[i] = boot
+            self.received[i] = received
+
+    def predict(self, at):
+
+        ################################################
+        # at: float, time.monotonic() to predict for [input]
+        # predicted: np.array (drones, 6) of x, y, z,
+        #            vx, vy, vz (columns X to VZ); drones
+        #            with no samples yet are zero [output]
+        ################################################
+
+        with self.lock:
+            age = at - self.received + self.delay + LINK_LATENCY
+            age = np.where(np.isnan(self.boot), 0.0, age)
+            positions = self.state[:, :, 0] + self.state[:, :, 1] * age[:, None]
+            velocities = self.state[:, :, 1].copy()
+
+        return np.hstack((positions, velocities))
+
+
+class LeaderHistory:
+
+    ############################################################
+    # SUMMARY: LeaderHistory is a fixed-capacity ring of       #
+    #          leader samples: autopilot time, position,       #
+    #          velocity and the path length flown so far. Both #
+    #          time and path length only grow, so the sample   #
+    #          at any time or distance is found by bisection   #
+    #          (O(log n)) and interpolated.                    #
+    ############################################################
+
+    def __init__(self, capacity):
+
+        ################################################
+        # capacity: max samples kept [input]
+        ################################################
+
+        self.capacity = capacity
+        self.times = np.zeros(capacity)         # autopilot time (s)
+        self.points = np.zeros((capacity, 3))   # position
+        self.velocities = np.zeros((capacity, 3))
+        self.lengths = np.zeros(capacity)       # path length (m) since the first sample
+        self.start = 0                          # ring index of the oldest sample
+        self.count = 0
+        self.anchor = np.zeros(3)               # last position that counted towards path length
+        self.anchor_length = 0.0
+        self.lock = threading.Lock()
+
+    def append(self, time_s, point, velocity):
+
+        ################################################
+        # time_s: float, autopilot time (s) [input]
+        # point: (x, y, z) [input]
+        # velocity: (vx, vy, vz) [input]
+        ################################################
+
+        with self.lock:
+            if self.count:
+                last = (self.start + self.count - 1) % self.capacity
+                if time_s < self.times[last] - 1:
+                    # Autopilot rebooted; the old history means nothing now
+                    self.count = 0
+                elif time_s <= self.times[last]:
+                    return
+
+            # Path length grows only once the leader moves PATH_RESOLUTION from the anchor
+            if self.count:
+                step = np.linalg.norm(np.subtract(point, self.anchor))
+                length = max(self.lengths[last], self.anchor_length + step)
+                if step >= PATH_RESOLUTION:
+                    self.anchor = np.array(point, dtype=float)
+                    self.anchor_length = length
+            else:
+                length = 0.0
+                self.anchor = np.array(point, dtype=float)
+                self.anchor_length = 0.0
+
+            if self.count < self.capacity:
+                i = (self.start + self.count) % self.capacity
+                self.count += 1
+            else:
+                i = self.start
+                self.start = (self.start + 1) % self.capacity
+
+            self.times[i] = time_s
+            self.points[i] = point
+            self.velocities[i] = velocity
+            self.lengths[i] = length
+
+    def search(self, column, value):
+
+        ################################################
+        # column: self.times or self.lengths [input]
+        # value: float [input]
+        # k: int, number of samples (oldest first) whose
+        #    column is below value [output]
+        # Caller holds self.lock.
+        ################################################
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if column[(self.start + middle) % self.capacity] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def interpolate(self, column, value):
+
+        ################################################
+        # column: self.times or self.lengths [input]
+        # value: float [input]
+        # i, j, fraction: ring indices of the samples
+        #    either side of value and how far between
+        #    them it lies, or None if value is outside
+        #    the history [output]
+        # Caller holds self.lock.
+        ################################################
+
+        if self.count == 0:
+            return None
+        k = self.search(column, value)
+        last = (self.start + self.count - 1) % self.capacity
+        if k == self.count:
+            return (last, last, 0.0) if value == column[last] else None
+        j = (self.start + k) % self.capacity
+        if column[j] == value:
+            return j, j, 0.0
+        if k == 0:
+            return None
+        i = (self.start + k - 1) % self.capacity
+        return i, j, (value - column[i]) / (column[j] - column[i])
+
+    def latest_time(self):
+
+        ################################################
+        # time_s: float, time of the newest sample, or
+        #         None if there are none [output]
+        ################################################
+
+        with self.lock:
+            if self.count == 0:
+                return None
+            return self.times[(self.start + self.count - 1) % self.capacity]
+
+    def length_at(self, time_s):
+
+        ################################################
+        # time_s: float, autopilot time (s) [input]
+        # length: float, path length (m) flown by then,
+        #         or -inf if before the history [output]
+        ################################################
+
+        with self.lock:
+            found = self.interpolate(self.times, time_s)
+            if found is None:
+                return -np.inf
+            i, j, fraction = found
+            return self.lengths[i] + fraction * (self.lengths[j] - self.lengths[i])
+
+    def time_at_length(self, length):
+
+        ################################################
+        # length: float, path length (m) [input]
+        # time_s: float, first time the leader had flown
+        #         that far, or None if outside the
+        #         history [output]
+        ################################################
+
+        with self.lock:
+            found = self.interpolate(self.lengths, length)
+            if found is None:
+                return None
+            i, j, fraction = found
+            return self.times[i] + fraction * (self.times[j] - self.times[i])
+
+    def at_time(self, time_s):
+
+        ################################################
+        # time_s: float, autopilot time (s) [input]
+        # position, velocity: lists of 3, interpolated
+        #     leader state at time_s, or None if outside
+        #     the history [output]
+        ################################################
+
+        with self.lock:
+            found = self.interpolate(self.times, time_s)
+            if found is None:
+                return None
+            i, j, fraction = found
+            position = self.points[i] + fraction * (self.points[j] - self.points[i])
+            velocity = self.velocities[i] + fraction * (self.velocities[j] - self.velocities[i])
+            return position.tolist(), velocity.tolist()
+
+
+class PathSimplifier:
+
+    ############################################################
+    # SUMMARY: PathSimplifier turns the leader's positions     #
+    #          into as few breadcrumbs as possible. Positions  #
+    #          since the last breadcrumb are kept; while they  #
+    #          all lie within SIMPLIFY_TOLERANCE of the line   #
+    #          from that breadcrumb to the leader, nothing is  #
+    #          emitted. When the path bends out of that        #
+    #          corridor, the last position that still fitted   #
+    #          becomes a breadcrumb. Straight paths still get  #
+    #          a breadcrumb every SIMPLIFY_MAX_SPACING, and a  #
+    #          hovering leader's position is emitted after     #
+    #          SIMPLIFY_SETTLE.                                #
+    ############################################################
+
+    def __init__(self):
+        self.anchor = None                      # last breadcrumb emitted
+        self.pending = []                       # positions since then
+        self.moved = 0.0                        # time.monotonic() the leader last moved
+
+    def clear(self):
+
+        ################################################
+        # Forgets the path (see update_flight_mode).
+        ################################################
+
+        self.anchor = None
+        self.pending = []
+
+    def add(self, point, now):
+
+        ################################################
+        # point: (x, y, z) leader position [input]
+        # now: float, time.monotonic() [input]
+        # emitted: list of (x, y, z) new breadcrumbs [output]
+        ################################################
+
+        point = np.array(point, dtype=float)
+
+        if self.anchor is None:
+            self.anchor = point
+            self.moved = now
+            return [tuple(point.tolist())]
+
+        # Hovering: positions closer than PATH_RESOLUTION are noise
+        last = self.pending[-1] if self.pending else self.anchor
+        if np.linalg.norm(point - last) < PATH_RESOLUTION:
+            if self.pending and now - self.moved >= SIMPLIFY_SETTLE:
+                return [self.emit(len(self.pending) - 1)]
+            return []
+        self.moved = now
+        self.pending.append(point)
+
+        # Distance of every pending position from the line anchor -> point
+        positions = np.array(self.pending[:-1]).reshape(-1, 3)
+        segment = point - self.anchor
+        length = np.linalg.norm(segment)
+        if len(positions) and length > 0:
+            t = np.clip((positions - self.anchor) @ segment / length**2, 0, 1)
+            deviation = np.linalg.norm(self.anchor + t[:, None] * segment - positions, axis=1).max()
+        else:
+            deviation = 0.0
+
+        if deviation > SIMPLIFY_TOLERANCE:
+            return [self.emit(len(self.pending) - 2)]
+        if length > SIMPLIFY_MAX_SPACING:
+            return [self.emit(len(self.pending) - 1)]
+        return []
+
+    def emit(self, index):
+
+        ################################################
+        # index: int, pending position to make the next
+        #        breadcrumb [input]
+        # point: (x, y, z) breadcrumb [output]
+        ################################################
+
+        self.anchor = self.pending[index]
+        self.pending = self.pending[index + 1:]
+        return tuple(self.anchor.tolist())
+
+
+class SegmentGrid:
+
+    ############################################################
+    # SUMMARY: SegmentGrid is a uniform grid spatial index     #
+    #          over path segments. Each segment is listed in   #
+    #          every cell its bounding box touches. The        #
+    #          nearest segment to a point is found by checking #
+    #          rings of cells outwards from the point's cell,  #
+    #          stopping once no unchecked cell can be closer.  #
+    ############################################################
+
+    def __init__(self, cell):
+
+        ################################################
+        # cell: float, cell size (m) [input]
+        ################################################
+
+        self.cell = cell
+        self.cells = {}                         # (i, j, k) -> set of segment indices
+        self.low = None                         # smallest cell coordinate used
+        self.high = None                        # largest cell coordinate used
+
+    def cells_for(self, start, end):
+
+        ################################################
+        # start, end: (x, y, z) segment end points [input]
+        # cells: list of (i, j, k) cells the segment's
+        #        bounding box touches [output]
+        ################################################
+
+        low = np.floor(np.minimum(start, end) / self.cell).astype(int)
+        high = np.floor(np.maximum(start, end) / self.cell).astype(int)
+        return [(i, j, k) for i in range(low[0], high[0] + 1)
+                          for j in range(low[1], high[1] + 1)
+                          for k in range(low[2], high[2] + 1)]
+
+    def add(self, index, start, end):
+
+        ################################################
+        # index: int, segment index [input]
+        # start, end: (x, y, z) segment end points [input]
+        ################################################
+
+        cells = self.cells_for(start, end)
+        for key in cells:
+            self.cells.setdefault(key, set()).add(index)
+
+        corners = np.array(cells)
+        if self.low is None:
+            self.low = corners.min(axis=0)
+            self.high = corners.max(axis=0)
+        else:
+            self.low = np.minimum(self.low, corners.min(axis=0))
+            self.high = np.maximum(self.high, corners.max(axis=0))
+
+    def remove(self, index, start, end):
+
+        ################################################
+        # index: int, segment index [input]
+        # start, end: (x, y, z) segment end points [input]
+        ################################################
+
+        for key in self.cells_for(start, end):
+            members = self.cells.get(key)
+            if members is not None:
+                members.discard(index)
+                if not members:
+                    del self.cells[key]
+
+    def nearest(self, position, segment_points, first):
+
+        ################################################
+        # position: (x, y, z) [input]
+        # segment_points: function(indices) returning
+        #                 the segments' start and end
+        #                 points [input]
+        # first: int, ignore segments before this [input]
+        # segment, point, distance: closest segment,
+        #     the closest point on it and the distance,
+        #     or (None, None, inf) [output]
+        ################################################
+
+        if self.low is None:
+            return None, None, np.inf
+
+        position = np.asarray(position, dtype=float)
+        centre = np.floor(position / self.cell).astype(int)
+        rings = int(np.max(np.maximum(np.abs(self.low - centre), np.abs(self.high - centre))))
+        best = (None, None, np.inf)
+
+        for ring in range(rings + 1):
+            # Every unchecked cell is at least (ring - 1) cells away
+            if best[2] <= (ring - 1) * self.cell:
+                break
+
+            # Segments in the cells on the surface of this ring
+            candidates = set()
+            for i in range(-ring, ring + 1):
+                for j in range(-ring, ring + 1):
+                    for k in range(-ring, ring + 1):
+                        if max(abs(i), abs(j), abs(k)) == ring:
+                            candidates |= self.cells.get((centre[0] + i, centre[1] + j, centre[2] + k), set())
+            candidates = np.array([index for index in candidates if index >= first], dtype=np.int64)
+            if len(candidates) == 0:
+                continue
+
+            # Closest point on each candidate segment
+            starts, ends = segment_points(candidates)
+            steps = ends - starts
+            squared = (steps**2).sum(axis=1)
+            t = np.clip(((position - starts) * steps).sum(axis=1) / np.where(squared > 0, squared, 1), 0, 1)
+            closest = starts + steps * t[:, None]
+            distances = np.sqrt(((closest - position)**2).sum(axis=1))
+
+            # Ties go to the earliest segment
+            order = np.lexsort((candidates, distances))[0]
+            if distances[order] < best[2] or (distances[order] == best[2] and candidates[order] < best[0]):
+                best = (int(candidates[order]), closest[order], float(distances[order]))
+
+        return best
+
+
+class BreadcrumbBuffer:
+
+    ############################################################
+    # SUMMARY: BreadcrumbBuffer holds the leader's path. The   #
+    #          leader appends breadcrumbs; every follower has  #
+    #          its own cursor (absolute breadcrumb index) and  #
+    #          walks the path independently. Breadcrumbs that  #
+    #          every follower has passed are dropped, so the   #
+    #          memory used is bounded by how far the slowest   #
+    #          follower trails the leader (and never exceeds   #
+    #          BREADCRUMB_LIMIT).                              #
+    ############################################################
+
+    def __init__(self, followers, capacity=None):
+        self.points = deque()                   # (x, y, z) breadcrumbs still needed
+        self.lengths = deque()                  # path length (m) from the first breadcrumb to each one
+        self.base = 0                           # absolute index of points[0]
+        self.cursors = {number: 0 for number in followers}
+        self.capacity = capacity if capacity is not None else BREADCRUMB_LIMIT
+        self.grid = SegmentGrid(GRID_CELL)      # segment i joins breadcrumbs i and i + 1
+        self.lock = threading.Lock()
+
+    def __len__(self):
+
+        ################################################
+        # count: int, breadcrumbs appended since the
+        #        last clear() [output]
+        ################################################
+
+        return self.base + len(self.points)
+
+    def append(self, point):
+
+        ################################################
+        # point: (x, y, z) tuple [input]
+        # index: int, absolute index of the new
+        #        breadcrumb [output]
+        ################################################
+
+        with self.lock:
+            if self.points:
+                last = self.points[-1]
+                step = ((point[0] - last[0])**2 + (point[1] - last[1])**2 + (point[2] - last[2])**2)**.5
+                self.lengths.append(self.lengths[-1] + step)
+                self.grid.add(self.base + len(self.points) - 1, last, point)
+            else:
+                self.lengths.append(0.0)
+            self.points.append(point)
+
+            # Ring: past capacity the oldest breadcrumb goes, even if a follower still needs it
+            if len(self.points) > self.capacity:
+                self.drop_oldest()
+                for number in self.cursors:
+                    self.cursors[number] = max(self.cursors[number], self.base)
+
+            return self.base + len(self.points) - 1
+
+    def cursor(self, number):
+
+        ################################################
+        # number: follower drone number [input]
+        # index: int, absolute index of the follower's
+        #        current breadcrumb [output]
+        ################################################
+
+        return self.cursors[number]
+
+    def ahead(self, number):
+
+        ################################################
+        # number: follower drone number [input]
+        # count: int, breadcrumbs from the follower's
+        #        cursor to the leader's latest [output]
+        ################################################
+
+        with self.lock:
+            return self.base + len(self.points) - self.cursors[number]
+
+    def current(self, number):
+
+        ################################################
+        # number: follower drone number [input]
+        # point: (x, y, z) at the follower's cursor, or
+        #        None if it has caught up [output]
+        ################################################
+
+        with self.lock:
+            position = self.cursors[number] - self.base
+            if position >= len(self.points):
+                return None
+            return self.points[position]
+
+    def follow_state(self, numbers):
+
+        ################################################
+        # numbers: follower drone numbers [input]
+        # cursors: np.array of absolute cursor indices [output]
+        # targets: np.array (n, 3) of the breadcrumb at
+        #          each cursor; NaN where a follower has
+        #          caught up [output]
+        # lengths: np.array of path length (m) at each
+        #          cursor [output]
+        # end: int, len(self) [output]
+        # end_length: float, path length (m) at the
+        #             latest breadcrumb [output]
+        ################################################
+
+        cursors = np.zeros(len(numbers), dtype=np.int64)
+        targets = np.full((len(numbers), 3), np.nan)
+        lengths = np.zeros(len(numbers))
+
+        with self.lock:
+            end = self.base + len(self.points)
+            end_length = self.lengths[-1] if self.lengths else 0.0
+            for i, number in enumerate(numbers):
+                cursors[i] = self.cursors[number]
+                position = cursors[i] - self.base
+                if position < len(self.points):
+                    targets[i] = self.points[position]
+                    lengths[i] = self.lengths[position]
+                else:
+                    lengths[i] = end_length
+
+        return cursors, targets, lengths, end, end_length
+
+    def path(self, number):
+
+        ################################################
+        # number: follower drone number [input]
+        # cursor: int, the follower's cursor [output]
+        # points: np.array (k, 3), breadcrumbs from the
+        #         cursor to the latest one [output]
+        # lengths: np.array (k,), path length (m) at
+        #          each of those breadcrumbs [output]
+        ################################################
+
+        with self.lock:
+            cursor = self.cursors[number]
+            position = cursor - self.base
+            points = np.array(list(self.points)[position:], dtype=float).reshape(-1, 3)
+            lengths = np.array(list(self.lengths)[position:], dtype=float)
+        return cursor, points, lengths
+
+    def length_at(self, index):
+
+        ################################################
+        # index: int, absolute breadcrumb index [input]
+        # length: float, path length (m) at that
+        #         breadcrumb, clamped to the breadcrumbs
+        #         still held [output]
+        ################################################
+
+        with self.lock:
+            if not self.lengths:
+                return 0.0
+            position = min(max(index - self.base, 0), len(self.lengths) - 1)
+            return self.lengths[position]
+
+    def seek(self, number, index):
+
+        ################################################
+        # number: follower drone number [input]
+        # index: int, absolute breadcrumb index to move
+        #        the cursor forward to [input]
+        ################################################
+
+        with self.lock:
+            index = min(index, self.base + len(self.points))
+            if index > self.cursors[number]:
+                self.cursors[number] = index
+                self.compact()
+
+    def advance(self, number):
+
+        ################################################
+        # number: follower drone number [input]
+        ################################################
+
+        with self.lock:
+            if self.cursors[number] < self.base + len(self.points):
+                self.cursors[number] += 1
+                self.compact()
+
+    def compact(self):
+
+        ################################################
+        # Drops breadcrumbs every follower has passed.
+        # Caller holds self.lock.
+        ################################################
+
+        oldest = min(self.cursors.values(), default=self.base + len(self.points))
+        while self.base < oldest and self.points:
+            self.drop_oldest()
+
+    def drop_oldest(self):
+
+        ################################################
+        # Drops the oldest breadcrumb and its segment.
+        # Caller holds self.lock.
+        ################################################
+
+        if len(self.points) > 1:
+            self.grid.remove(self.base, self.points[0], self.points[1])
+        self.points.popleft()
+        self.lengths.popleft()
+        self.base += 1
+
+    def nearest_segment(self, position, first):
+
+        ################################################
+        # position: (x, y, z) [input]
+        # first: int, absolute index of the first
+        #        segment to consider [input]
+        # segment: int, absolute index of the closest
+        #          segment, or None if there is none [output]
+        # point: np.array (3,), closest point on it [output]
+        # distance: float, distance to it (m) [output]
+        ################################################
+
+        with self.lock:
+            return self.grid.nearest(position, self.segment_points, max(first, self.base))
+
+    def segment_points(self, indices):
+
+        ################################################
+        # indices: np.array of absolute segment indices [input]
+        # starts, ends: np.array (n, 3) segment end
+        #               points [output]
+        # Caller holds self.lock.
+        ################################################
+
+        positions = indices - self.base
+        starts = np.array([self.points[i] for i in positions], dtype=float).reshape(-1, 3)
+        ends = np.array([self.points[i + 1] for i in positions], dtype=float).reshape(-1, 3)
+        return starts, ends
+
+    def rejoin(self, number, position, pursuit):
+
+        ################################################
+        # number: follower drone number [input]
+        # position: (x, y, z) follower position [input]
+        # pursuit: bool, PURE_PURSUIT (the cursor is the
+        #          start of the follower's segment rather
+        #          than the breadcrumb it heads for) [input]
+        # segment: int, segment rejoined, or None [output]
+        #
+        # Moves the follower's cursor to the closest
+        # path segment it has not passed yet.
+        ################################################
+
+        if pursuit:
+            segment, point, distance = self.nearest_segment(position, self.cursors[number])
+            if segment is None:
+                return None
+            self.seek(number, segment)
+            return segment
+
+        # A follower heading for breadcrumb `cursor` is on the segment that ends there
+        current = self.cursors[number] - 1
+        segment, point, distance = self.nearest_segment(position, current)
+        if segment is None or segment <= current:
+            return None
+
+        # Only skip ahead when the follower is really beside a later segment, not
+        # just nearest to its first breadcrumb (that is still the one to fly to)
+        with self.lock:
+            if segment < self.base:
+                return None
+            starts, ends = self.segment_points(np.array([segment]))
+        if np.allclose(point, starts[0]) or np.allclose(point, ends[0]):
+            return None
+
+        self.seek(number, segment + 1)
+        return segment
+
+    def clear(self):
+
+        ################################################
+        # Forgets the path and rewinds every follower.
+        ################################################
+
+        with self.lock:
+            self.points.clear()
+            self.lengths.clear()
+            self.grid = SegmentGrid(GRID_CELL)
+            self.base = 0
+            for number in self.cursors:
+                self.cursors[number] = 0
+
+
+class FlightClock:
+
+    ############################################################
+    # SUMMARY: FlightClock paces the flight loop. The receiver #
+    #          calls notify() for every new position and the   #
+    #          flight loop sleeps in wait() until one arrives  #
+    #          (or FLIGHT_TICK passes), so it runs once per    #
+    #          sample instead of spinning. It also measures    #
+    #          how often the flight loop runs.                 #
+    ############################################################
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.generation = 0                     # number of samples notified so far
+        self.seen = 0                           # generation the flight loop last ran for
+        self.iterations = 0                     # flight loop iterations in this rate window
+        self.rate = 0.0                         # flight loop iterations per second
+        self.window_start = time.monotonic()
+
+    def notify(self):
+
+        ################################################
+        # [no inputs or outputs]
+        ################################################
+
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+
+        ################################################
+        # timeout: float, max seconds to wait; None
+        #          waits for new telemetry [input]
+        # fresh: bool, True if new telemetry arrived
+        #        since the last call [output]
+        ################################################
+
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != self.seen, timeout)
+            fresh = self.generation != self.seen
+            self.seen = self.generation
+
+        # Loop rate
+        self.iterations += 1
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed >= RATE_WINDOW:
+            self.rate = self.iterations / elapsed
+            self.iterations = 0
+            self.window_start = now
+
+        return fresh
+
+    def get_rate(self):
+
+        ################################################
+        # rate: float, flight loop iterations per
+        #       second [output]
+        ################################################
+
+        return self.rate
+
+
+def add_waypoint(x, y, z):
+
+    ################################################
+    # x, y, z: float, leader breadcrumb [input]
+    ################################################
+
+    waypoints.append((x, y, z))
+
+    # Record new waypoint
+    print("New waypoint + " + str(len(waypoints)) + ": " + str(x) + " " + str(y) + " " + str(z))
+    logger.write(waypoints_file_name, str(x) + "," + str(y) + "," + str(z) + "\n")
+    if waypoints_log_name:
+        logger.write(waypoints_log_name, waypoints_record.pack(time.monotonic() - log_start, x, y, z))
+
+
+def follow_train(snapshot):
+
+    ################################################
+    # snapshot: state.snapshot() for this iteration [input]
+    #
+    # Every follower walks the leader's breadcrumbs,
+    # keeping its spacing to the drone ahead of it in
+    # the train (the leader, then followers in fleet
+    # order). All followers are checked together.
+    ################################################
+
+    followers = [drone.number for drone in fleet if not drone.is_leader()]
+    if not followers:
+        return
+
+    # Spacing to the drone ahead, in breadcrumbs or metres along the path (or seconds, HISTORY_FOLLOW)
+    spacing = train_spacing(followers)
+
+    if HISTORY_FOLLOW:
+        follow_history(snapshot, followers, spacing)
+        return
+
+    # Followers far from their breadcrumb (drifted, moved by hand, reconnected) rejoin the path
+    cursors, targets, lengths, end, end_length = waypoints.follow_state(followers)
+    positions = snapshot[np.array(followers) - 1, X:Z + 1]
+    far = np.sqrt(((positions - targets)**2).sum(axis=1)) > REJOIN_DISTANCE
+    far &= snapshot[np.array(followers) - 1, RECEIVED] > 0
+    for i in np.flatnonzero(far):
+        segment = waypoints.rejoin(followers[i], positions[i], PURE_PURSUIT)
+        if segment is not None and waypoints.cursor(followers[i]) != cursors[i]:
+            print("[" + str(followers[i]) + "] Rejoined the path at segment " + str(segment))
+
+    if PURE_PURSUIT:
+        follow_lookahead(snapshot, followers, spacing)
+        return
+
+    cursors, targets, lengths, end, end_length = waypoints.follow_state(followers)
+    gaps = np.array([value for value, unit in spacing], dtype=float)
+    metres = np.array([unit == 'm' for value, unit in spacing])
+
+    ahead_cursors = np.concatenate(([end], cursors[:-1]))
+    ahead_lengths = np.concatenate(([end_length], lengths[:-1]))
+    gap = np.where(metres, ahead_lengths - lengths, ahead_cursors - cursors)
+
+    # Distance from each follower to its breadcrumb (NaN compares False)
+    positions = snapshot[np.array(followers) - 1, X:Z + 1]
+    distances = np.sqrt(((positions - targets)**2).sum(axis=1))
+
+    has_target = ~np.isnan(targets[:, 0])
+    moving = has_target & (gap >= gaps)
+    reached = moving & (distances < WAYPOINT_RADIUS) & (gap > gaps)
+
+    # Set target to current waypoint
+    for i in np.flatnonzero(moving):
+        velocity, acceleration = feed_forward(snapshot, followers[i], lengths[i])
+        state.set_target(followers[i], *targets[i].tolist(), velocity=velocity, acceleration=acceleration)
+
+    # Followers waiting on their spacing (or caught up) stop where they are aiming
+    hold_without_feed_forward(snapshot, [followers[i] for i in np.flatnonzero(~moving)])
+
+    # If a follower has reached its waypoint, go to the next one
+    for i in np.flatnonzero(reached):
+        x, y, z = targets[i].tolist()
+        print("[" + str(followers[i]) + "] Reached waypoint " + str(cursors[i]) + ": " + str(x) + " " + str(y) + " " + str(z))
+        waypoints.advance(followers[i])
+
+
+def hold_without_feed_forward(snapshot, numbers):
+
+    ################################################
+    # snapshot: state.snapshot() for this iteration [input]
+    # numbers: drone numbers that are not moving on [input]
+    #
+    # Keeps each drone's current target but drops its
+    # feed-forward. Otherwise the last velocity keeps
+    # being sent and PX4 creeps past the target.
+    ################################################
+
+    for number in numbers:
+        row = snapshot[number - 1]
+        if np.isnan(row[TARGET_VX]) and np.isnan(row[TARGET_AX]):
+            continue
+        state.set_target(number, row[TARGET_X], row[TARGET_Y], row[TARGET_Z])
+
+
+def train_spacing(followers):
+
+    ################################################
+    # followers: follower drone numbers [input]
+    # spacing: (value, unit) per follower [output]
+    #
+    # Raises ValueError for a unit the current follow
+    # mode can't keep: seconds need HISTORY_FOLLOW.
+    ################################################
+
+    spacing = [FOLLOWER_SPACING.get(number, TRAIN_SPACING) for number in followers]
+    units = ('waypoints', 'm', 's') if HISTORY_FOLLOW else ('waypoints', 'm')
+    for number, (value, unit) in zip(followers, spacing):
+        if unit not in units:
+            raise ValueError("Follower " + str(number) + " spacing (" + str(value) + ", '" + str(unit) + "') must be in " + ", ".join(units)
+                             + (" ('s' needs HISTORY_FOLLOW)" if unit == 's' else ""))
+    return spacing
+
+
+def follow_history(snapshot, followers, spacing):
+
+    ################################################
+    # snapshot: state.snapshot() for this iteration [input]
+    # followers: follower drone numbers, in train order [input]
+    # spacing: (value, unit) per follower [input]
+    #
+    # Each follower targets the leader's position
+    # from some time ago: its spacing behind the
+    # drone ahead, in seconds ('s') or metres along
+    # the leader's path ('m'; 'waypoints' count as
+    # BREADCRUMB_SPACING metres each). Targets are
+    # interpolated, so they move smoothly at the
+    # telemetry rate. A follower holds until the
+    # history reaches back far enough.
+    ################################################
+
+    # Leader history time the drone ahead is at
+    ahead = leader_history.latest_time()
+    if ahead is None:
+        hold_without_feed_forward(snapshot, followers)
+        return
+
+    for i, (number, (gap, unit)) in enumerate(zip(followers, spacing)):
+        if unit == 's':
+            ahead = ahead - gap
+        else:
+            metres = gap if unit == 'm' else gap * BREADCRUMB_SPACING
+            ahead = leader_history.time_at_length(leader_history.length_at(ahead) - metres)
+
+        sample = leader_history.at_time(ahead) if ahead is not None else None
+        if sample is None:
+            # The leader hasn't flown that far yet; this and every later follower hold
+            hold_without_feed_forward(snapshot, followers[i:])
+            return
+
+        position, velocity = sample
+        state.set_target(number, *position, velocity=velocity if FEED_FORWARD else None)
+
+
+def follow_lookahead(snapshot, followers, spacing):
+
+    ################################################
+    # snapshot: state.snapshot() for this iteration [input]
+    # followers: follower drone numbers, in train order [input]
+    # spacing: (value, unit) per follower [input]
+    #
+    # Pure pursuit: each follower is projected onto
+    # the breadcrumb path and targets the point
+    # LOOKAHEAD metres further along it, so it never
+    # has to stop at a breadcrumb. The target never
+    # passes the follower's spacing limit behind the
+    # drone ahead; a follower that is too close holds.
+    ################################################
+
+    # Position of the drone ahead: breadcrumb index and path length (m)
+    ahead_index = len(waypoints)
+    ahead_length = waypoints.length_at(ahead_index - 1)
+
+    for number, (gap, unit) in zip(followers, spacing):
+        cursor, points, lengths = waypoints.path(number)
+        if len(points) == 0:
+            ahead_index = cursor
+            ahead_length = waypoints.length_at(cursor - 1)
+            continue
+
+        # Furthest the follower may go along the path
+        if unit == 'm':
+            limit = ahead_length - gap
+        elif ahead_index - gap >= cursor:
+            limit = waypoints.length_at(ahead_index - gap)
+        else:
+            limit = -np.inf
+
+        segment, progress, carrot = pursuit_target(points, lengths, snapshot[number - 1, X:Z + 1], LOOKAHEAD, limit)
+
+        # Too close to the drone ahead: keep the current target, without feed-forward
+        if carrot is not None:
+            velocity, acceleration = feed_forward(snapshot, number, min(progress + LOOKAHEAD, limit), points, lengths)
+            state.set_target(number, *carrot.tolist(), velocity=velocity, acceleration=acceleration)
+        else:
+            row = snapshot[number - 1]
+            state.set_target(number, row[TARGET_X], row[TARGET_Y], row[TARGET_Z])
+        waypoints.seek(number, cursor + segment)
+
+        ahead_index = cursor + segment
+        ahead_length = progress
+
+
+def feed_forward(snapshot, number, goal, points=None, lengths=None):
+
+    ################################################
+    # snapshot: state.snapshot() for this iteration [input]
+    # number: follower drone number [input]
+    # goal: float, path length (m) of the follower's
+    #       target [input]
+    # points, lengths: the follower's path, if already
+    #       read (see BreadcrumbBuffer.path) [input]
+    # velocity, acceleration: feed-forward to send
+    #       with the target, or None (FEED_FORWARD) [output]
+    ################################################
+
+    if FEED_FORWARD == 2:
+        # Leader's velocity; its acceleration is not measured
+        return snapshot[0, VX:VZ + 1].tolist(), None
+
+    if FEED_FORWARD != 1:
+        return None, None
+
+    # Move along the path at the leader's speed
+    if points is None:
+        cursor, points, lengths = waypoints.path(number)
+    speed = float(np.linalg.norm(snapshot[0, VX:VZ + 1]))
+    return path_feed_forward(points, lengths, goal, speed)
+
+
+def path_feed_forward(points, lengths, goal, speed):
+
+    ################################################
+    # points: np.array (k, 3), path breadcrumbs [input]
+    # lengths: np.array (k,), path length at each [input]
+    # goal: float, path length (m) of the target [input]
+    # speed: float, speed (m/s) along the path [input]
+    # velocity: (3,) tangent to the path at goal [output]
+    # acceleration: (3,) centripetal acceleration
+    #               from the path's curvature [output]
+    ################################################
+
+    velocity = np.zeros(3)
+    acceleration = np.zeros(3)
+    if len(points) < 2:
+        return velocity.tolist(), acceleration.tolist()
+
+    steps = points[1:] - points[:-1]
+    norms = np.linalg.norm(steps, axis=1)
+    tangents = steps / np.where(norms > 0, norms, 1)[:, None]
+
+    # Segment containing goal
+    j = int(np.searchsorted(lengths, goal, side='right')) - 1
+    j = min(max(j, 0), len(steps) - 1)
+    velocity = speed * tangents[j]
+
+    # Turning into the next segment: a = v^2 * dT/ds
+    if j + 1 < len(steps) and norms[j] + norms[j + 1] > 0:
+        acceleration = speed**2 * (tangents[j + 1] - tangents[j]) / ((norms[j] + norms[j + 1]) / 2)
+
+    return velocity.tolist(), acceleration.tolist()
+
+
+def pursuit_target(points, lengths, position, lookahead, limit):
+
+    ################################################
+    # points: np.array (k, 3), path breadcrumbs [input]
+    # lengths: np.array (k,), path length at each [input]
+    # position: np.array (3,), follower position [input]
+    # lookahead: float, lookahead distance (m) [input]
+    # limit: float, furthest path length the target
+    #        may reach [input]
+    # segment: int, index into points of the start of
+    #          the segment the follower is on [output]
+    # progress: float, path length at the follower's
+    #           closest point [output]
+    # carrot: np.array (3,) target, or None if the
+    #         follower should hold [output]
+    ################################################
+
+    if len(points) == 1:
+        segment, progress = 0, lengths[0]
+    else:
+        # Closest point on each of the next PURSUIT_WINDOW segments
+        starts = points[:-1][:PURSUIT_WINDOW]
+        steps = (points[1:] - points[:-1])[:PURSUIT_WINDOW]
+        squared = (steps**2).sum(axis=1)
+        t = ((position - starts) * steps).sum(axis=1) / np.where(squared > 0, squared, 1)
+        t = np.clip(t, 0, 1)
+        closest = starts + steps * t[:, None]
+        segment = int(np.argmin(((closest - position)**2).sum(axis=1)))
+        progress = lengths[segment] + t[segment] * (lengths[segment + 1] - lengths[segment])
+
+    goal = min(progress + lookahead, limit, lengths[-1])
+    if goal < progress:
+        return segment, progress, None
+
+    # Point on the path at path length goal
+    j = int(np.searchsorted(lengths, goal, side='right')) - 1
+    j = min(max(j, 0), len(points) - 1)
+    if j == len(points) - 1:
+        return segment, progress, points[j]
+    fraction = (goal - lengths[j]) / (lengths[j + 1] - lengths[j]) if lengths[j + 1] > lengths[j] else 0.0
+    return segment, progress, points[j] + fraction * (points[j + 1] - points[j])
+
+
+def load_mission(path):
+
+    ################################################
+    # path: string, mission file [input]
+    # steps: dict, drone number -> list of
+    #        (command, arguments) [output]
+    #
+    # One step per line: <drone> <command> [args];
+    # '#' starts a comment (see Missions/demo.txt).
+    ################################################
+
+    arguments = {'goto': (3, 5), 'hold': (1, 1), 'land': (0, 1), 'takeoff': (1, 2)}
+    steps = {}
+
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            words = line.split('#')[0].split()
+            if not words:
+                continue
+
+            where = path + ":" + str(line_number)
+            if len(words) < 2 or words[1] not in arguments:
+                raise ValueError(where + ": expected '<drone> <" + "|".join(arguments) + "> [arguments]'")
+            low, high = arguments[words[1]]
+            if not low <= len(words) - 2 <= high:
+                raise ValueError(where + ": " + words[1] + " takes " + str(low) + " to " + str(high) + " arguments")
+            try:
+                number = int(words[0])
+                values = [float(word) for word in words[2:]]
+            except ValueError:
+                raise ValueError(where + ": drone and arguments must be numbers")
+            if number not in fleet.numbers():
+                raise ValueError(where + ": no drone " + str(number))
+
+            steps.setdefault(number, []).append((words[1], values))
+
+    return steps
+
+
+class MissionEngine:
+
+    ############################################################
+    # SUMMARY: MissionEngine runs one mission (a list of steps)#
+    #          per drone, all at the same time. step() is      #
+    #          called every flight loop iteration; it starts a #
+    #          drone's next step once the current one is done  #
+    #          (within MISSION_TOLERANCE of its goal, or its   #
+    #          time is up) and never blocks. Commands that     #
+    #          wait on the drone run on the fleet pool.        #
+    ############################################################
+
+    def __init__(self):
+        self.missions = {}                      # drone number -> list of (command, arguments)
+        self.progress = {}                      # drone number -> [step index, start time or None]
+        self.lock = threading.Lock()
+
+    def load(self, missions):
+
+        ################################################
+        # missions: dict from load_mission [input]
+        ################################################
+
+        with self.lock:
+            self.missions = missions
+            self.progress = {number: [0, None] for number in missions}
+
+    def step(self, snapshot, now):
+
+        ################################################
+        # snapshot: state.snapshot() for this iteration [input]
+        # now: float, time.monotonic() [input]
+        ################################################
+
+        with self.lock:
+            for number, steps in self.missions.items():
+                progress = self.progress[number]
+                if progress[0] >= len(steps) or not fleet.connection(number):
+                    continue
+
+                command, values = steps[progress[0]]
+                row = snapshot[number - 1]
+
+                # Start the step
+                if progress[1] is None:
+                    progress[1] = now
+                    print("[" + str(number) + "] Mission step " + str(progress[0] + 1) + ": " + command + " " + " ".join(map(str, values)))
+                    self.begin(number, command, values)
+                    continue
+
+                # Move on once it is done
+                if self.done(row, command, values, now - progress[1]):
+                    progress[0] += 1
+                    progress[1] = None
+                    if progress[0] == len(steps):
+                        print("[" + str(number) + "] Mission complete")
+
+    def begin(self, number, command, values):
+
+        ################################################
+        # number: drone number [input]
+        # command: string, step command [input]
+        # values: list of float arguments [input]
+        ################################################
+
+        if command == 'goto':
+            state.set_target(number, values[0], values[1], values[2])
+        elif command == 'land':
+            # Only sends the command; the acknowledgement is reported when it arrives
+            command_drone(number, land, "Mission land")
+        elif command == 'takeoff':
+            takeoff_drone(number, values[0])
+
+    def done(self, row, command, values, elapsed):
+
+        ################################################
+        # row: the drone's snapshot row [input]
+        # command: string, step command [input]
+        # values: list of float arguments [input]
+        # elapsed: float, seconds since the step began [input]
+        # done: bool [output]
+        ################################################
+
+        if command == 'hold':
+            return elapsed >= values[0]
+
+        if command == 'goto':
+            tolerance = values[3] if len(values) > 3 else MISSION_TOLERANCE
+            timeout = values[4] if len(values) > 4 else MISSION_TIMEOUT
+            reached = np.linalg.norm(row[X:Z + 1] - values[0:3]) < tolerance
+        elif command == 'land':
+            timeout = values[0] if values else MISSION_TIMEOUT
+            reached = row[Z] > -MISSION_TOLERANCE
+        else:
+            timeout = values[1] if len(values) > 1 else MISSION_TIMEOUT
+            reached = abs(row[Z] + abs(values[0])) < MISSION_TOLERANCE
+
+        if not reached and elapsed >= timeout:
+            print("Mission " + command + " timed out after " + str(round(elapsed, 1)) + " s")
+            return True
+        return reached
+
+
+def separate(snapshot):
+
+    ################################################
+    # snapshot: state.snapshot() for this iteration [input]
+    #
+    # For every pair of drones closer than
+    # SEPARATION_RADIUS, the trailing one (later in
+    # the train) holds or backs off horizontally at
+    # its commanded altitude, if it is airborne. Its
+    # previous target is restored once the breach
+    # clears (unless something else set a new one).
+    ################################################
+
+    overrides = separation.overrides
+    backoff = {}
+
+    connected = np.flatnonzero(snapshot[:, RECEIVED] > 0)
+    if len(connected) >= 2:
+        positions = snapshot[connected, X:Z + 1]
+        pairs, distances = separation.check(positions)
+
+        # Horizontal back-off per trailing drone, summed over its breaches
+        for (i, j), distance in zip(pairs.tolist(), distances.tolist()):
+            trailing, other = max(i, j), min(i, j)
+            number = int(connected[trailing]) + 1
+            if not is_armed(number) or -positions[trailing, 2] < SEPARATION_GROUND:
+                continue
+            away = positions[trailing] - positions[other]
+            away[2] = 0
+            horizontal = np.linalg.norm(away)
+            away = away / horizontal if horizontal > 0 else np.array([1.0, 0.0, 0.0])
+            backoff[number] = backoff.get(number, 0) + away * (SEPARATION_RADIUS - distance)
+
+    for number, away in backoff.items():
+        row = snapshot[number - 1]
+        current = row[TARGET_X:TARGET_AZ + 1]
+
+        # Remember the target we are overriding; a new one set during the breach replaces it
+        override = overrides.get(number)
+        saved = override[0] if override is not None and np.array_equal(current, override[1], equal_nan=True) else current.copy()
+
+        target = row[X:Z + 1] + away if SEPARATION_BACKOFF else row[X:Z + 1].copy()
+        target[2] = saved[2] if not np.isnan(saved[2]) else row[Z]
+        state.set_target(number, *target.tolist())
+        overrides[number] = (saved, state.get(number)[TARGET_X:TARGET_AZ + 1])
+
+    # Breaches that cleared give the drone its previous target back
+    for number in [number for number in overrides if number not in backoff]:
+        saved, written = overrides.pop(number)
+        if np.array_equal(state.get(number)[TARGET_X:TARGET_AZ + 1], written, equal_nan=True):
+            velocity = None if np.isnan(saved[4]) else saved[4:7]
+            acceleration = None if np.isnan(saved[7]) else saved[7:10]
+            state.set_target(number, *saved[0:3].tolist(), yaw=saved[3], velocity=velocity, acceleration=acceleration)
+
+
+def autopilot_heartbeat(number, msg):
+
+    ################################################
+    # number: drone number [input]
+    # msg: HEARTBEAT message [input]
+    # autopilot: bool, sent by the autopilot the
+    #            drone's connection targets [output]
+    ################################################
+
+    the_connection = fleet.connection(number)
+    if not the_connection:
+        return True
+    if msg.get_srcSystem() != the_connection.target_system:
+        return False
+    if the_connection.target_component:
+        return msg.get_srcComponent() == the_connection.target_component
+
+    # pymavlink leaves target_component 0 (every component); like pymavlink, tell the
+    # autopilot from gimbals, companion computers and GCSs by its heartbeat
+    return the_connection.probably_vehicle_heartbeat(msg)
+
+
+def is_armed(number):
+
+    ################################################
+    # number: drone number [input]
+    # armed: bool, the drone's last HEARTBEAT says it
+    #        is armed [output]
+    ################################################
+
+    heartbeat = router.latest(number, 'HEARTBEAT')
+    return heartbeat is not None and bool(heartbeat.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED)
+
+
+class SeparationMonitor:
+
+    ############################################################
+    # SUMMARY: SeparationMonitor finds every pair of drones    #
+    #          closer than SEPARATION_RADIUS. Small fleets are #
+    #          checked all at once with one pairwise distance  #
+    #          matrix; beyond SEPARATION_HASH_SIZE drones a    #
+    #          spatial hash with SEPARATION_RADIUS cells keeps #
+    #          the check close to O(n). New breaches are       #
+    #          printed once, when they start.                  #
+    ############################################################
+
+    def __init__(self):
+        self.active = set()                     # pairs currently too close
+        self.overrides = {}                     # drone number -> (target before the breach, target we set)
+        self.breaches = 0                       # breaches started so far
+
+    def check(self, positions):
+
+        ################################################
+        # positions: np.array (n, 3) [input]
+        # pairs: np.array (m, 2) of row indices i < j
+        #        that are too close [output]
+        # distances: np.array (m,) of their distances [output]
+        ################################################
+
+        if len(positions) <= SEPARATION_HASH_SIZE:
+            pairs = np.array(np.triu_indices(len(positions), 1)).T
+        else:
+            pairs = self.candidates(positions)
+
+        if len(pairs) == 0:
+            pairs = np.zeros((0, 2), dtype=np.int64)
+            distances = np.zeros(0)
+        else:
+            distances = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+            close = distances < SEPARATION_RADIUS
+            pairs = pairs[close]
+            distances = distances[close]
+
+        # Report breaches as they start
+        active = set(map(tuple, pairs.tolist()))
+        for i, j in sorted(active - self.active):
+            self.breaches += 1
+            print("Separation breach: drones " + str(i + 1) + " and " + str(j + 1))
+        self.active = active
+
+        return pairs, distances
+
+    def candidates(self, positions):
+
+        ################################################
+        # positions: np.array (n, 3) [input]
+        # pairs: np.array (m, 2) of row indices i < j in
+        #        the same or neighbouring hash cells [output]
+        ################################################
+
+        # One integer key per cell; drones sorted by key share a run per cell
+        cells = np.floor(positions / SEPARATION_RADIUS).astype(np.int64)
+        cells = cells - cells.min(axis=0) + 1
+        size = cells.max(axis=0) + 2
+        keys = (cells[:, 0] * size[1] + cells[:, 1]) * size[2] + cells[:, 2]
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        # The 27 cells around every drone, all at once
+        offsets = np.array([(a, b, c) for a in (-1, 0, 1) for b in (-1, 0, 1) for c in (-1, 0, 1)])
+        neighbours = (cells[None, :, :] + offsets[:, None, :]).reshape(-1, 3)
+        owners = np.tile(np.arange(len(cells)), len(offsets))
+        neighbour_keys = (neighbours[:, 0] * size[1] + neighbours[:, 1]) * size[2] + neighbours[:, 2]
+        first = np.searchsorted(sorted_keys, neighbour_keys, side='left')
+        counts = np.searchsorted(sorted_keys, neighbour_keys, side='right') - first
+
+        # Every (drone, drone in a neighbouring cell) pair
+        i = np.repeat(owners, counts)
+        runs = np.repeat(first - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        j = order[np.arange(len(i)) + runs]
+        keep = j > i
+        return np.stack((i[keep], j[keep]), axis=1)
+
+
+def flight_loop_thread():
+    ################################################
+    # [no inputs or outputs]
+    ################################################
+
+    global PREV_LEADER_X
+    global PREV_LEADER_Y
+    global PREV_LEADER_Z
+    global SEND_TELEMETRY
+
+    # Note: In order for PX4 to remain in offboard mode, it needs to receive target commands
+    # at a rate of at least 2 Hz.
+
+    ############################################################
+    # NAVIGATION                                               #
+    ############################################################
+
+    while 1:
+
+        # Sleep until a drone reports a new position (or the tick passes)
+        flight_clock.wait(FLIGHT_TICK)
+
+        # One consistent copy of every drone for this iteration
+        snapshot = state.snapshot()
+        if PREDICT:
+            # Act on where the drones will be when the next setpoint goes out
+            snapshot[:, X:VZ + 1] = estimator.predict(time.monotonic() + 0.5 / SETPOINT_RATE)
+        leader = snapshot[0]
+
+        # TEST MODE
+        if (FLIGHT_MODE == 0):
+            # Test mode
+            state.set_target(1, TEST_MODE_X, TEST_MODE_Y, TEST_MODE_Z)
+
+        # MANUAL MODE
+        elif (FLIGHT_MODE == 1):
+            pass
+
+        # AUTONOMOUS MODE
+        elif (FLIGHT_MODE == 2):
+
+            # Move the followers along the leader's path
+            follow_train(snapshot)
+
+            # Drop breadcrumbs where the leader's path bends
+            leader_x, leader_y, leader_z = leader[X:Z + 1].tolist()
+            if SIMPLIFY_PATH:
+                for point in simplifier.add((leader_x, leader_y, leader_z), time.monotonic()):
+                    add_waypoint(*point)
+
+            # If leader has traveled more than BREADCRUMB_SPACING, add a new waypoint
+            elif ((leader_x - PREV_LEADER_X)**2 + (leader_y - PREV_LEADER_Y)**2 + (leader_z - PREV_LEADER_Z)**2)**.5 > BREADCRUMB_SPACING:
+                add_waypoint(leader_x, leader_y, leader_z)
+                
+                # Record previous position
+                PREV_LEADER_X = leader_x
+                PREV_LEADER_Y = leader_y
+                PREV_LEADER_Z = leader_z
+
+                # Set follower to a new waypoint (DEBUG)
+                # if len(waypoints) > 4:
+                #     TARGET_X_2 = (waypoints[len(waypoints) - 4])[0]
+                #     TARGET_Y_2 = (waypoints[len(waypoints) - 4])[1]
+                #     TARGET_Z_2 = (waypoints[len(waypoints) - 4])[2]
+
+
+        # DEMO MODE
+        elif (FLIGHT_MODE == 3):
+            # Every drone's mission moves on by at most one step; nothing here waits
+            missions.step(snapshot, time.monotonic())
+
+        # OFF
+        elif(FLIGHT_MODE == 4):
+            pass
+
+        else:
+            print("FLIGHT MODE NOT RECOGNIZED OR DRONES NOT CONNECTED.")
+            return
+
+        # Keep the drones apart (except while landing)
+        if FLIGHT_MODE != 4:
+            separate(snapshot)
         
         # DEBUG
         # print("CURRENT POSITION: " + str(CURRENT_X_1) + " " + str(CURRENT_Y_1) + " " + str(CURRENT_Z_1))